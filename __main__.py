@@ -0,0 +1,143 @@
+""" Command line interface of main.main. 
+
+Usage: python -m convert_annotation MAP QUERY_VERSION REF_VERSION QUERY OUT
+
+With --annotation gff/gtf/bed/vcf, QUERY is an annotation file that is lifted 
+over record by record (see annotation.py).
+
+pandas is not imported when the map is a compiled or partitioned map (a 
+directory written by read.compile_map or partition.partition_map, or 
+--map-cache) and the output is CSV or TSV. (pyarrow 
+may import pandas by itself for Parquet and Arrow output.)
+"""
+import argparse
+import logging
+import sys
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='convert_annotation', 
+        description='Convert genomic coordinates in a query file to another '\
+            'version of the genome.')
+    parser.add_argument(
+        'map', help='CSV file of the mapping table, or a compiled or '\
+            'partitioned map directory')
+    parser.add_argument('query_version', help='version of the queries')
+    parser.add_argument('ref_version', help='version to convert to')
+    parser.add_argument('query', help='query file')
+    parser.add_argument('out', help='output file')
+    parser.add_argument(
+        '--via', action='append', default=[], metavar='VERSION',
+        help='intermediate version (repeat in order from QUERY_VERSION); '\
+            'one --map is needed for each')
+    parser.add_argument(
+        '--map', dest='next_maps', action='append', default=[], 
+        metavar='PATH', help='CSV file of the next map in a chain')
+    parser.add_argument(
+        '--map-cache', metavar='PATH', 
+        help='compiled map used instead of MAP while it is up to date')
+    parser.add_argument(
+        '--memory-budget', type=int, metavar='BYTES', 
+        help='maximum size of chromosomes loaded at a time from a '\
+            'partitioned map (see partition.py)')
+    parser.add_argument(
+        '--workers', type=int, default=1, help='number of processes')
+    parser.add_argument(
+        '--chunksize', type=int, default=100000, 
+        help='number of queries converted at a time')
+    parser.add_argument(
+        '--sep', default=',', help='output delimiter (use "\\t" for TSV)')
+    parser.add_argument(
+        '--format', dest='out_format', 
+        choices=['csv', 'tsv', 'parquet', 'feather', 'arrow'], 
+        help='output format (inferred from the extension of OUT by default; '\
+            'parquet, feather and arrow need pyarrow)')
+    parser.add_argument(
+        '--server', metavar='ADDRESS', 
+        help='Unix socket path or HOST:PORT of a conversion server '\
+            '(see server.py); the map is loaded by the server, which '\
+            'also owns map caches and memory budgets')
+    parser.add_argument(
+        '--annotation', choices=['gff', 'gtf', 'bed', 'vcf'], 
+        help='QUERY is an annotation file of this format; OUT is the '\
+            'converted annotation file')
+    parser.add_argument(
+        '--reject', metavar='PATH', 
+        help='file for annotation records that cannot be converted')
+    parser.add_argument(
+        '--stats-json', metavar='PATH', 
+        help='write timing and conversion code counts to a JSON file')
+    parser.add_argument(
+        '--log-stats', action='store_true', 
+        help='print timing and conversion code counts to stderr')
+    return parser
+
+def parse_address(address):
+    """ Returns (host, port) for "HOST:PORT", otherwise address as it is 
+    (a Unix socket path). """
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+def run(argv=None):
+    args = get_parser().parse_args(argv)
+    sep = '\t' if args.sep in ('\\t', 'tab') else args.sep
+    if len(args.via) != len(args.next_maps):
+        raise SystemExit(
+            f'{len(args.via)} --via versions need {len(args.via)} --map files '\
+            f'but {len(args.next_maps)} were given.')
+
+    stats = None
+    if args.stats_json or args.log_stats:
+        from .instrument import RunStats, LogSink, JSONSink
+        stats = RunStats()
+        if args.log_stats:
+            logging.basicConfig(level=logging.INFO, format='%(message)s')
+            stats.sinks.append(LogSink())
+        if args.stats_json:
+            stats.sinks.append(JSONSink(args.stats_json))
+
+    if args.server:
+        if args.annotation or args.map_cache or args.workers != 1 \
+                or args.memory_budget is not None:
+            raise SystemExit(
+                '--annotation, --map-cache, --workers and --memory-budget '\
+                'cannot be used with --server.')
+        from .server import main
+        return main(
+            [args.map] + args.next_maps if args.via else args.map,
+            args.query_version, args.ref_version, args.query, args.out, 
+            address=parse_address(args.server), via=args.via or None, 
+            sep=sep, out_format=args.out_format, stats=stats, 
+            chunksize=args.chunksize)
+
+    if args.annotation:
+        from .main import load_map
+        from . import annotation
+        cc = load_map(
+            [args.map] + args.next_maps if args.via else args.map,
+            args.query_version, args.ref_version, args.map_cache, 
+            args.via or None, args.memory_budget)
+        convert = {
+            'gff': annotation.convert_gff, 'gtf': annotation.convert_gff, 
+            'bed': annotation.convert_bed, 'vcf': annotation.convert_vcf,
+        }[args.annotation]
+        convert(
+            cc, args.query_version, args.query, args.out, args.reject, 
+            chunksize=args.chunksize, stats=stats)
+        if stats is not None:
+            stats.emit()
+        return
+
+    from .main import main
+    main(
+        [args.map] + args.next_maps if args.via else args.map,
+        args.query_version, args.ref_version, args.query, args.out, 
+        workers=args.workers, map_cache_path=args.map_cache, 
+        via=args.via or None, sep=sep, out_format=args.out_format, 
+        stats=stats, memory_budget=args.memory_budget, 
+        chunksize=args.chunksize)
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,276 @@
+""" Streaming liftover of annotation files (GFF3, GTF, BED and VCF). Records are 
+read in chunks, their coordinates are converted in a batch by 
+ConvertCoordinates.convert_arrays and converted records are written before 
+the next chunk is read, so memory usage does not depend on the file size.
+
+A record is converted if its whole range lies within one segment of the 
+map. Records that are not found or that overlap multiple segments are 
+written unchanged to a reject file. On inverted segments, start and end are 
+swapped into the reference orientation and the strand is flipped.
+
+Files whose names end with ".gz" are read and written with gzip.
+"""
+from contextlib import nullcontext
+import numpy as np
+from .read import open_text
+from .instrument import NULL_STATS
+
+STRAND_SWAP = {'+': '-', '-': '+'}
+COMPLEMENT = {
+    'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A', 'N': 'N', 
+    'a': 't', 'c': 'g', 'g': 'c', 't': 'a', 'n': 'n', '*': '*', '.': '.'
+}
+
+def swap_strand(strand):
+    """ Returns the opposite strand. "." and "?" are returned as they are. """
+    return STRAND_SWAP.get(strand, strand)
+
+def iter_line_chunks(f, chunksize):
+    """ Yields lists of at most chunksize lines of a file object. """
+    chunk = []
+    for line in f:
+        chunk.append(line)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def parse_gff_record(fields):
+    """ Returns chromosome, start and end (1-based, inclusive) of a GFF3 or 
+    GTF record. """
+    return fields[0], int(fields[3]), int(fields[4])
+
+def rewrite_gff_record(fields, chromosome, start, end, is_inversion):
+    fields[0], fields[3], fields[4] = chromosome, str(start), str(end)
+    if is_inversion:
+        fields[6] = swap_strand(fields[6])
+    return fields
+
+def parse_bed_record(fields):
+    """ Returns chromosome, start and end (1-based, inclusive) of a BED 
+    record. A zero-length record is converted as the base after it. """
+    start = int(fields[1]) + 1
+    return fields[0], start, max(int(fields[2]), start)
+
+def rewrite_bed_record(fields, chromosome, start, end, is_inversion):
+    query_start = int(fields[1]) + 1
+    if int(fields[2]) < query_start: # zero-length record
+        end = start - 1 if not is_inversion else end
+        start = end + 1
+
+    # Half-open 0-based range [s, e) of the query is mapped to 
+    # [s + shift, e + shift) or, on inversions, to [c - e - 1, c - s - 1)
+    shift = start - query_start
+    c = end + query_start
+    def convert(s, e):
+        return (c - e - 1, c - s - 1) if is_inversion else (s + shift, e + shift)
+
+    fields[0], fields[1], fields[2] = chromosome, str(start - 1), str(end)
+    if len(fields) > 5 and is_inversion:
+        fields[5] = swap_strand(fields[5])
+    if len(fields) > 7:
+        fields[6], fields[7] = map(str, convert(int(fields[6]), int(fields[7])))
+    if len(fields) > 11 and is_inversion:
+        # Blocks are relative to chromStart and listed in reference order
+        chrom_start = int(fields[1])
+        old_start = query_start - 1
+        sizes = [int(x) for x in fields[10].rstrip(',').split(',')]
+        starts = [int(x) for x in fields[11].rstrip(',').split(',')]
+        blocks = sorted(
+            (convert(old_start + s, old_start + s + size)[0] - chrom_start, 
+             size)
+            for s, size in zip(starts, sizes)
+        )
+        fields[10] = ','.join(str(size) for _, size in blocks) + ','
+        fields[11] = ','.join(str(s) for s, _ in blocks) + ','
+    return fields
+
+def convert_records(cc, query_version, in_path, out_path, reject_path=None, 
+                    parse=parse_gff_record, rewrite=rewrite_gff_record, 
+                    skip=('#',), stop_at=None, chunksize=100000, stats=None):
+    """ Converts tab-delimited annotation records. Lines starting with skip 
+    prefixes and blank lines are copied as they are. If a line starts with 
+    stop_at, it and all following lines are copied as they are.
+
+    Parameters
+    ----------
+    cc: ConvertCoordinates
+    query_version: str, int or tuple
+        Version of the coordinates in in_path.
+    in_path, out_path: str
+    reject_path: str
+        A path to a file where records that cannot be converted are written 
+        unchanged. Rejected records are discarded if None.
+    parse: function
+        Returns chromosome, start and end (1-based, inclusive) for a list 
+        of fields.
+    rewrite: function
+        Returns fields with converted chromosome, start, end (1-based, 
+        inclusive) and inversion.
+    chunksize: int
+        Number of lines converted at a time.
+    stats: instrument.RunStats
+
+    Return
+    ------
+    dict with numbers of "records", "converted" and "rejected" records
+    """
+    if stats is None:
+        stats = NULL_STATS
+    counts = {'records': 0, 'converted': 0, 'rejected': 0}
+    stopped = False
+
+    with open_text(in_path) as fin, open_text(out_path, 'w') as fout, \
+            (open_text(reject_path, 'w') if reject_path else 
+             nullcontext()) as frej:
+        line_chunks = stats.iter_stage(
+            'parse_queries', iter_line_chunks(fin, chunksize))
+        for lines in line_chunks:
+            if stopped:
+                fout.writelines(lines)
+                continue
+
+            records = {}
+            for i, line in enumerate(lines):
+                if stop_at and line.startswith(stop_at):
+                    stopped = True
+                    break
+                if not line.strip() or line.startswith(skip):
+                    continue
+                records[i] = line.rstrip('\n').split('\t')
+
+            with stats.stage('convert'):
+                coords = [parse(fields) for fields in records.values()]
+                chromosomes, starts, ends = zip(*coords) if coords else \
+                    ((), (), ())
+                result = cc.convert_arrays(
+                    query_version, np.array(chromosomes, dtype=object), 
+                    np.array(starts, dtype=np.int64), 
+                    np.array(ends, dtype=np.int64))
+            stats.count_result(result)
+
+            with stats.stage('write'):
+                ref_chr = result['ref_chromosome'].tolist()
+                ref_start = result['ref_start'].tolist()
+                ref_end = result['ref_end'].tolist()
+                inversion = result['is_inversion'].tolist()
+                rows = dict(zip(records, range(len(records))))
+                for i, line in enumerate(lines):
+                    if i not in rows:
+                        fout.write(line)
+                        continue
+                    j = rows[i]
+                    counts['records'] += 1
+                    if inversion[j] < 0:
+                        counts['rejected'] += 1
+                        if frej is not None:
+                            frej.write(line)
+                        continue
+                    counts['converted'] += 1
+                    fout.write('\t'.join(rewrite(
+                        records[i], ref_chr[j], ref_start[j], ref_end[j], 
+                        inversion[j] == 1)) + '\n')
+
+    return counts
+
+def convert_gff(cc, query_version, in_path, out_path, reject_path=None, 
+                chunksize=100000, stats=None):
+    """ Converts a GFF3 or GTF file (see convert_records). Comment and 
+    directive lines are copied as they are, and the FASTA section of GFF3 
+    is copied without conversion. """
+    return convert_records(
+        cc, query_version, in_path, out_path, reject_path, 
+        parse_gff_record, rewrite_gff_record, skip=('#',), stop_at='##FASTA', 
+        chunksize=chunksize, stats=stats)
+
+def convert_bed(cc, query_version, in_path, out_path, reject_path=None, 
+                chunksize=100000, stats=None):
+    """ Converts a BED file (see convert_records). thickStart, thickEnd and 
+    blocks of BED12 records are converted together with the record. Header 
+    lines ("#", "track" and "browser") are copied as they are. """
+    return convert_records(
+        cc, query_version, in_path, out_path, reject_path, 
+        parse_bed_record, rewrite_bed_record, 
+        skip=('#', 'track', 'browser'), chunksize=chunksize, stats=stats)
+
+def complement_alleles(ref, alt):
+    """ Returns complemented REF and ALT of a VCF record on an inverted 
+    segment, or None if an allele is longer than one base (the anchor base 
+    of indels cannot be placed without the reference sequence). """
+    alts = alt.split(',')
+    if len(ref) != 1 or any(len(a) != 1 for a in alts):
+        return None
+    try:
+        return COMPLEMENT[ref], ','.join(COMPLEMENT[a] for a in alts)
+    except KeyError:
+        return None
+
+def convert_vcf(cc, query_version, in_path, out_path, reject_path=None, 
+                chunksize=100000, stats=None):
+    """ Converts CHROM and POS of a VCF file with 
+    ConvertCoordinates.convert_positions. Header lines are copied as they 
+    are. On inverted segments REF and ALT of single-base variants are 
+    complemented; other variants on inverted segments are rejected. See 
+    convert_records for parameters.
+
+    Return
+    ------
+    dict with numbers of "records", "converted" and "rejected" records
+    """
+    if stats is None:
+        stats = NULL_STATS
+    counts = {'records': 0, 'converted': 0, 'rejected': 0}
+
+    with open_text(in_path) as fin, open_text(out_path, 'w') as fout, \
+            (open_text(reject_path, 'w') if reject_path else 
+             nullcontext()) as frej:
+        line_chunks = stats.iter_stage(
+            'parse_queries', iter_line_chunks(fin, chunksize))
+        for lines in line_chunks:
+            records = {}
+            for i, line in enumerate(lines):
+                if line.startswith('#') or not line.strip():
+                    continue
+                # Only CHROM, POS, ID, REF and ALT are split. The line 
+                # ending is added back when the record is written, so ALT 
+                # of lines without INFO and later columns has no newline.
+                records[i] = line.rstrip('\r\n').split('\t', 5)
+
+            with stats.stage('convert'):
+                fields = list(records.values())
+                result = cc.convert_positions(
+                    query_version, [f[0] for f in fields], 
+                    np.fromiter((f[1] for f in fields), dtype=np.int64, 
+                                count=len(fields)))
+            stats.count_result({'conversion_code': result.conversion_code})
+
+            with stats.stage('write'):
+                ref_chr = result.chromosome.tolist()
+                ref_pos = result.position.tolist()
+                inversion = result.is_inversion.tolist()
+                j = 0
+                for i, line in enumerate(lines):
+                    if i not in records:
+                        fout.write(line)
+                        continue
+                    record = records[i]
+                    counts['records'] += 1
+                    if inversion[j] == 1:
+                        alleles = complement_alleles(record[3], record[4])
+                    if inversion[j] < 0 or \
+                            (inversion[j] == 1 and alleles is None):
+                        counts['rejected'] += 1
+                        if frej is not None:
+                            frej.write(line)
+                        j += 1
+                        continue
+                    counts['converted'] += 1
+                    record[0], record[1] = ref_chr[j], str(ref_pos[j])
+                    if inversion[j] == 1:
+                        record[3], record[4] = alleles
+                    fout.write('\t'.join(record) + 
+                               line[len(line.rstrip('\r\n')):])
+                    j += 1
+
+    return counts
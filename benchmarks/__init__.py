@@ -0,0 +1,4 @@
+""" Benchmarks on synthetic mapping tables and query sets. 
+
+Run "python -m convert_annotation.benchmarks.run --help" for options. 
+"""
@@ -0,0 +1,278 @@
+""" Benchmark harness. Each stage of a conversion run is timed on a synthetic 
+map and query set (see synthetic.py), and its throughput and peak memory are 
+recorded. Records can be appended to a JSON-lines history file, and a new 
+record is compared with the last one of the same parameters so that 
+regressions between commits are reported.
+
+Usage: python -m convert_annotation.benchmarks.run --history bench.jsonl
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import tempfile
+import subprocess
+import tracemalloc
+from contextlib import nullcontext
+from .. import read
+from .. import formatter
+from ..main import main
+from .synthetic import make_map_columns, write_map_csv, make_queries, \
+    write_query_file
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure(func, repeat=1):
+    """ Returns the shortest wall time of repeat calls of func and the value 
+    returned by the last call. """
+    best = float('inf')
+    for _ in range(repeat):
+        t = time.perf_counter()
+        value = func()
+        best = min(best, time.perf_counter() - t)
+    return best, value
+
+def peak_memory(func):
+    """ Returns the peak size in bytes of memory allocated by func (traced 
+    by tracemalloc, which includes NumPy arrays but not memory-mapped 
+    files). """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PACKAGE_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+def count_lines(path):
+    with open(path) as f:
+        return sum(1 for _ in f)
+
+def get_stages(map_path, compiled_path, query_path, out_path, n_single):
+    """ Returns a list of (stage name, function, number of items) in the 
+    order they are run. Functions of later stages use values made by 
+    earlier ones. """
+    state = {}
+
+    def load_csv():
+        state['cc'] = read.from_CSV_to_ConvertCoordinates(map_path, 1, 2)
+
+    def load_compiled():
+        state['compiled'] = read.load_compiled_map(compiled_path, 1, 2)
+
+    def parse_queries():
+        state['querys'] = read.parse_query_list(query_path)
+        state['single'] = state['querys'][:n_single]
+
+    def get_rows():
+        cc = state['cc']
+        for query in state['coords']:
+            cc.get_rows(1, query.chromosome, query.start, query.end)
+
+    def convert_coordinate():
+        cc = state['cc']
+        for query in state['single']:
+            cc.convert_coordinate(1, query)
+
+    def convert_strs():
+        state['result'] = state['compiled'].convert_strs(1, state['querys'])
+
+    def convert_arrays():
+        state['compiled'].convert_arrays(1, state['query_coords'])
+
+    def write_csv():
+        with formatter.ResultWriter(out_path) as writer:
+            writer.append_result(state['result'])
+
+    def to_DataFrame():
+        formatter.from_ConversionResult_to_DataFrame(state['result'])
+
+    def run_main():
+        main(compiled_path, 1, 2, query_path, out_path)
+
+    def prepare():
+        cc = state['cc']
+        state['coords'] = cc.from_query_strs_to_query_coords(state['single'])
+        state['query_coords'] = \
+            cc.from_query_strs_to_query_coords(state['querys'])
+
+    n_segments = count_lines(map_path) - 1
+    n_queries = count_lines(query_path) - 1
+    return [
+        ('load_csv', load_csv, n_segments),
+        ('compile_map', lambda: read.compile_map(
+            map_path, 1, 2, compiled_path), n_segments),
+        ('load_compiled', load_compiled, n_segments),
+        ('parse_queries', parse_queries, n_queries),
+        (None, prepare, 0),
+        ('get_rows', get_rows, min(n_single, n_queries)),
+        ('convert_coordinate', convert_coordinate, min(n_single, n_queries)),
+        ('convert_strs', convert_strs, n_queries),
+        ('convert_arrays', convert_arrays, n_queries),
+        ('write_csv', write_csv, n_queries),
+        ('to_DataFrame', to_DataFrame, n_queries),
+        ('main', run_main, n_queries),
+    ]
+
+def measure_import():
+    """ Returns seconds to import the main module in a new interpreter. """
+    code = 'import time; t = time.perf_counter(); '\
+        'import convert_annotation.main; print(time.perf_counter() - t)'
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(PACKAGE_DIR))
+    return float(subprocess.run(
+        [sys.executable, '-c', code], env=env, capture_output=True, 
+        text=True, check=True).stdout)
+
+def run_benchmarks(n_segments=100000, n_queries=100000, n_single=1000, 
+                   repeat=3, memory=True, seed=0, workdir=None):
+    """ Runs all stages and returns a record as dict.
+
+    Parameters
+    ----------
+    n_segments: int
+        Number of rows of the synthetic map.
+    n_queries: int
+        Number of queries for batch stages.
+    n_single: int
+        Number of queries for stages that convert one query at a time 
+        (get_rows and convert_coordinate).
+    repeat: int
+        Each stage is run repeat times and the shortest time is recorded.
+    memory: bool
+        If True, each stage is run once more under tracemalloc to record 
+        its peak memory.
+    seed: int
+    workdir: str
+        A directory for the map, query and output files. A temporary 
+        directory is used if None.
+    """
+    with (tempfile.TemporaryDirectory() if workdir is None else 
+          nullcontext(workdir)) as workdir:
+        map_path = os.path.join(workdir, 'map.csv')
+        compiled_path = os.path.join(workdir, 'map.compiled')
+        query_path = os.path.join(workdir, 'query.txt')
+        out_path = os.path.join(workdir, 'out.csv')
+
+        columns = make_map_columns(n_segments, seed=seed)
+        write_map_csv(map_path, columns)
+        write_query_file(
+            query_path, make_queries(columns, 1, n_queries, seed=seed))
+
+        stages = {'import': {'seconds': measure_import()}}
+        for name, func, n_items in get_stages(
+                map_path, compiled_path, query_path, out_path, n_single):
+            if name is None:
+                func()
+                continue
+            seconds, _ = measure(func, repeat)
+            stages[name] = {
+                'seconds': seconds, 
+                'per_second': n_items / seconds if seconds > 0 else None,
+            }
+            if memory:
+                stages[name]['peak_bytes'] = peak_memory(func)
+
+    return {
+        'commit': get_commit(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'params': {
+            'n_segments': n_segments, 'n_queries': n_queries, 
+            'n_single': n_single, 'seed': seed
+        },
+        'stages': stages,
+    }
+
+def read_history(path):
+    """ Returns a list of records in a history file. """
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def append_history(path, record):
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+def compare(record, previous, threshold=0.2):
+    """ Returns a list of (stage, metric, previous value, new value) for 
+    times and peak memory that grew by more than threshold (a fraction) 
+    from a previous record. """
+    regressions = []
+    for stage, values in record['stages'].items():
+        old_values = previous['stages'].get(stage, {})
+        for metric in ('seconds', 'peak_bytes'):
+            old, new = old_values.get(metric), values.get(metric)
+            if old and new is not None and new > old * (1 + threshold):
+                regressions.append((stage, metric, old, new))
+    return regressions
+
+def format_record(record):
+    lines = [
+        f'commit {record["commit"] or "-"}  {record["date"]}  '\
+        f'segments {record["params"]["n_segments"]}  '\
+        f'queries {record["params"]["n_queries"]}',
+        f'{"stage":<20}{"seconds":>12}{"items/s":>14}{"peak MiB":>12}',
+    ]
+    for stage, values in record['stages'].items():
+        per_second = values.get('per_second')
+        peak = values.get('peak_bytes')
+        lines.append(
+            f'{stage:<20}{values["seconds"]:>12.4f}'
+            f'{per_second if per_second is not None else float("nan"):>14.0f}'
+            f'{peak / 2**20 if peak is not None else float("nan"):>12.1f}')
+    return '\n'.join(lines)
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m convert_annotation.benchmarks.run',
+        description='Benchmark conversion stages on synthetic data.')
+    parser.add_argument('--segments', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=100000)
+    parser.add_argument('--single', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true')
+    parser.add_argument(
+        '--history', metavar='PATH', 
+        help='JSON-lines file to compare with and append the record to')
+    parser.add_argument(
+        '--threshold', type=float, default=0.2, 
+        help='fraction of growth reported as a regression')
+    return parser
+
+def run(argv=None):
+    args = get_parser().parse_args(argv)
+    record = run_benchmarks(
+        args.segments, args.queries, args.single, args.repeat, 
+        not args.no_memory, args.seed)
+    print(format_record(record))
+
+    if not args.history:
+        return 0
+    previous = [
+        rec for rec in read_history(args.history) 
+        if rec['params'] == record['params']
+    ]
+    append_history(args.history, record)
+    if not previous:
+        return 0
+
+    regressions = compare(record, previous[-1], args.threshold)
+    for stage, metric, old, new in regressions:
+        print(f'Regression in {stage} {metric}: {old:.4g} -> {new:.4g} '\
+            f'(commit {previous[-1]["commit"] or "-"} -> '\
+            f'{record["commit"] or "-"})')
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(run())
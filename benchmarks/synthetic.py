@@ -0,0 +1,99 @@
+""" Generators of synthetic mapping tables and query files. Tables follow the 
+schema read by read.from_CSV_to_ConvertCoordinates and query files follow 
+the format read by read.parse_query_list. """
+import csv
+import numpy as np
+
+def _layout(chrom_codes, sizes):
+    """ Returns 1-based start positions of segments placed one after another 
+    on each chromosome. chrom_codes must be sorted. """
+    ends = np.cumsum(sizes)
+    offsets = ends - sizes
+    is_first = np.r_[True, chrom_codes[1:] != chrom_codes[:-1]]
+    first = np.maximum.accumulate(np.where(is_first, np.arange(len(sizes)), 0))
+    return offsets - offsets[first] + 1
+
+def make_map_columns(n_segments, n_chromosomes=8, version1=1, version2=2,
+                     mean_length=1000, move_rate=0.05, inversion_rate=0.05,
+                     seed=0):
+    """ Returns a dict of columns of a synthetic mapping table.
+
+    Segments are laid out along n_chromosomes chromosomes of version1 with 
+    small gaps. In version2, segments are shuffled within chromosomes, a 
+    fraction (move_rate) is moved to another chromosome and a fraction 
+    (inversion_rate) is inverted. Segment lengths are the same in both 
+    versions, so the table passes ConvertCoordinates.validate.
+
+    Parameters
+    ----------
+    n_segments: int
+        Number of rows.
+    n_chromosomes: int
+        Number of chromosomes ("chr1", "chr2", ...).
+    version1, version2: str or int
+    mean_length: int
+        Mean length of segments.
+    move_rate, inversion_rate: float
+    seed: int
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array(
+        [f'chr{i + 1}' for i in range(n_chromosomes)], dtype=object)
+    lengths = rng.integers(1, 2 * mean_length, n_segments)
+
+    chrom1 = np.sort(rng.integers(0, n_chromosomes, n_segments))
+    gaps1 = rng.integers(0, mean_length // 10 + 1, n_segments)
+    start1 = _layout(chrom1, lengths + gaps1)
+
+    chrom2 = chrom1.copy()
+    moved = rng.random(n_segments) < move_rate
+    chrom2[moved] = rng.integers(0, n_chromosomes, moved.sum())
+    order = np.lexsort((rng.random(n_segments), chrom2))
+    gaps2 = rng.integers(0, mean_length // 10 + 1, n_segments)
+    start2 = np.empty(n_segments, dtype=np.int64)
+    start2[order] = _layout(chrom2[order], (lengths + gaps2)[order])
+
+    return {
+        f'v{version1}_chr': names[chrom1],
+        f'v{version1}_start': start1,
+        f'v{version1}_end': start1 + lengths - 1,
+        f'v{version2}_chr': names[chrom2],
+        f'v{version2}_start': start2,
+        f'v{version2}_end': start2 + lengths - 1,
+        'is_inversion': np.where(
+            rng.random(n_segments) < inversion_rate, '-', '+'),
+    }
+
+def write_map_csv(path, columns):
+    """ Writes columns returned by make_map_columns to a CSV file. """
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(list(columns))
+        writer.writerows(zip(*[col.tolist() for col in columns.values()]))
+
+def make_queries(columns, version, n_queries, not_found_rate=0.05, seed=0):
+    """ Returns a list of query strings ("chr:start..end") of a given 
+    version. Each query lies within a random segment of the table, except 
+    a fraction (not_found_rate) that is put on an unknown chromosome. """
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(columns['is_inversion']), n_queries)
+    seg_start = columns[f'v{version}_start'][rows]
+    seg_end = columns[f'v{version}_end'][rows]
+    starts = seg_start + (rng.random(n_queries) * (seg_end - seg_start + 1))\
+        .astype(np.int64)
+    ends = starts + (rng.random(n_queries) * (seg_end - starts + 1))\
+        .astype(np.int64)
+    chromosomes = columns[f'v{version}_chr'][rows]
+    chromosomes[rng.random(n_queries) < not_found_rate] = 'chrUn'
+
+    return [
+        f'{c}:{s}..{e}' for c, s, e in 
+        zip(chromosomes.tolist(), starts.tolist(), ends.tolist())
+    ]
+
+def write_query_file(path, query_strs):
+    """ Writes query strings in the format of read.parse_query_list. """
+    with open(path, 'w') as f:
+        f.write(f'itemnum: {len(query_strs)}\n')
+        for query in query_strs:
+            f.write(f'{query}\n')
@@ -1,18 +1,75 @@
 import re
-import pandas as pd
-from collections import namedtuple
-from collections.abc import Mapping
+import sys
+import operator
+import numpy as np
+from collections import namedtuple, OrderedDict
+from collections.abc import Mapping, Sequence
+from functools import lru_cache
+
+def factorize(values):
+    """ Returns integer codes and a list of unique values in order of
+    appearance. Unlike numpy.unique, values are never sorted so that mixed
+    types (e.g. -9 and '2L') are accepted. """
+    lookup = {}
+    codes = np.fromiter(
+        (lookup.setdefault(v, len(lookup)) for v in values),
+        dtype=np.int64, count=len(values))
+
+    return codes, list(lookup)
+
+def object_array(values):
+    """ Returns a one-dimensional object array even if values are tuples. """
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = values
+    return arr
+
+def copy_DataFrame(df):
+    """ Returns a copy of a DataFrame that can be modified without changing 
+    df. With copy-on-write (pandas 3, or pandas 2 with the option enabled) 
+    data are copied only when either of them is modified. """
+    import pandas as pd
+    copy_on_write = int(pd.__version__.split('.')[0]) >= 3 \
+        or getattr(pd.options.mode, 'copy_on_write', False) is True
+    return df.copy(deep=not copy_on_write)
+
+def get_conversion_codes(query_chromosome, query_start, ref_chromosome, 
+                         ref_start, multiple):
+    """ Returns an int8 array of conversion codes for columns of results. 
+    0: found at the same position, 1: found on a different chromosome, 
+    2: found at a different position on the same chromosome, 4: not found 
+    (ref_start is -9), 8: found in multiple segments (multiple is a boolean 
+    array). """
+    multiple = np.asarray(multiple, dtype=bool)
+    ref_start = np.asarray(ref_start)
+    codes = np.zeros(len(multiple), dtype=np.int8)
+    found = ref_start != -9
+    same_chr = np.asarray(query_chromosome) == np.asarray(ref_chromosome)
+    codes[found & ~same_chr] = 1
+    codes[found & same_chr & (np.asarray(query_start) != ref_start)] = 2
+    codes[~found] = 4
+    codes[multiple] = 8
+
+    return codes
+
+def is_DataFrame(obj):
+    """ Returns True if obj is a pandas.DataFrame. pandas is not imported 
+    by this check, so it stays unloaded unless the caller already uses it. """
+    pd = sys.modules.get('pandas')
+    return pd is not None and isinstance(obj, pd.DataFrame)
 
 class GenomicRange(object):
     """ Construct GenomicRange object. This GenomicRange is for chromosomal 
     position data. Coordinates are counted from 1 (e.g. the first nucleotide 
-    at a given chromosome is counted as 1).
+    at a given chromosome is counted as 1). version is optional and is not 
+    compared by __eq__.
     """
-    def __init__(self, chromosome, start, end):
+    __slots__ = ('chromosome', 'start', 'end', 'version')
+
+    def __init__(self, chromosome, start, end, version=None):
         self.chromosome = chromosome
         self.start = start
         self.end = end
-        self._range = range(start, end+1)
+        self.version = version
 
     @staticmethod
     def from_str(gencoord_str):
@@ -48,10 +105,19 @@ class GenomicRange(object):
         return coordinate - self.start
 
     def __len__(self):
-        return len(self._range)
+        return max(self.end - self.start + 1, 0)
     
     def __getitem__(self, index):
-        return self._range[index]
+        if isinstance(index, slice):
+            return range(self.start, self.end+1)[index]
+
+        length = self.__len__()
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError('range object index out of range')
+
+        return self.start + index
 
     def __eq__(self, compare):
         if isinstance(compare, GenomicRange):
@@ -67,7 +133,7 @@ class GenomicRange(object):
         return False
 
     def __iter__(self):
-        return self._range.__iter__()
+        return iter(range(self.start, self.end+1))
 
     def __repr__(self):
         return '{name}(chromosome={chromosome}, start={start}, end={end})'\
@@ -76,6 +142,137 @@ class GenomicRange(object):
                 start=self.start, end=self.end
             )
 
+_GENCOORD_STR = re.compile(
+    r'^([^:\n]*):(-?\d+)\.\.(-?\d+)(?::[^\n]*)?$', re.MULTILINE)
+
+class GenomicRangeArray(Sequence):
+    """ Sequence of GenomicRange stored in typed arrays. Chromosome names 
+    are kept once in categories and referred to by int32 codes, and starts 
+    and ends are int64 arrays. Indexing with an integer returns a 
+    GenomicRange object, while slicing returns another GenomicRangeArray 
+    that shares the arrays.
+    """
+    def __init__(self, chromosomes, starts, ends, version=None):
+        codes, categories = factorize(chromosomes)
+        self.codes = codes.astype(np.int32)
+        self.categories = object_array(categories)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.version = version
+
+    @staticmethod
+    def from_codes(codes, categories, starts, ends, version=None):
+        """ Returns GenomicRangeArray from chromosome codes and categories 
+        without factorizing chromosome names again. """
+        obj = GenomicRangeArray.__new__(GenomicRangeArray)
+        obj.codes = np.asarray(codes, dtype=np.int32)
+        obj.categories = object_array(list(categories))
+        obj.starts = np.asarray(starts, dtype=np.int64)
+        obj.ends = np.asarray(ends, dtype=np.int64)
+        obj.version = version
+        return obj
+
+    @staticmethod
+    def from_strs(gencoord_strs, version=None):
+        """ Returns GenomicRangeArray for strings in the format of 
+        "{chr}:{start}..{end}" (see GenomicRange.from_str). Strings are 
+        parsed by a single regular expression search without creating 
+        GenomicRange objects. """
+        gencoord_strs = list(gencoord_strs)
+        matches = _GENCOORD_STR.findall('\n'.join(gencoord_strs))
+        if len(matches) != len(gencoord_strs):
+            bad = [q for q in gencoord_strs if not _GENCOORD_STR.match(q)]
+            raise ValueError(f'Invalid query: "{bad[0]}".')
+        if not matches:
+            return GenomicRangeArray([], [], [], version)
+
+        chromosomes, starts, ends = zip(*matches)
+        return GenomicRangeArray(
+            chromosomes, np.array(starts).astype(np.int64), 
+            np.array(ends).astype(np.int64), version)
+
+    @staticmethod
+    def from_GenomicRanges(gen_ranges, version=None):
+        gen_ranges = list(gen_ranges)
+        return GenomicRangeArray(
+            [r.chromosome for r in gen_ranges], 
+            [r.start for r in gen_ranges], 
+            [r.end for r in gen_ranges], version)
+
+    @property
+    def chromosomes(self):
+        """ Returns chromosome names as an object array. """
+        return self.categories[self.codes]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return GenomicRange(
+                self.categories[self.codes[index]], 
+                int(self.starts[index]), int(self.ends[index]), self.version)
+
+        return GenomicRangeArray.from_codes(
+            self.codes[index], self.categories, 
+            self.starts[index], self.ends[index], self.version)
+
+    def __iter__(self):
+        for code, start, end in zip(
+                self.codes.tolist(), self.starts.tolist(), self.ends.tolist()):
+            yield GenomicRange(self.categories[code], start, end, self.version)
+
+    def __eq__(self, compare):
+        if isinstance(compare, GenomicRangeArray):
+            return len(self) == len(compare) \
+                and (self.chromosomes == compare.chromosomes).all() \
+                and (self.starts == compare.starts).all() \
+                and (self.ends == compare.ends).all()
+
+        return False
+
+    def __repr__(self):
+        return '<{name}: {size} ranges>'.format(
+            name=type(self).__name__, size=self.__len__())
+
+class CategoricalArray(Sequence):
+    """ Read-only column of values stored as integer codes into categories
+    (e.g. chromosome codes of a compiled map). Indexing with an array
+    decodes only the selected rows, so codes can stay memory-mapped.
+    numpy.asarray decodes all rows into an object array.
+    """
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = object_array(list(categories))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self.categories[int(self.codes[index])]
+        return np.take(self.categories, self.codes[index])
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __array__(self, dtype=None, copy=None):
+        values = np.take(self.categories, self.codes)
+        return values if dtype is None else values.astype(dtype)
+
+    def isin(self, values):
+        """ Returns a boolean array which is True for rows whose value is
+        in values, comparing categories instead of every row. """
+        return np.take(np.isin(self.categories, values), self.codes)
+
+    def tolist(self):
+        return np.asarray(self).tolist()
+
+    def __repr__(self):
+        return '<{name}: {size} values, {n} categories>'.format(
+            name=type(self).__name__, size=self.__len__(),
+            n=len(self.categories))
+
 class PairedGenomicRanges(Mapping):
     def __init__(self, keys, ranges, is_inversion, name=None):
         self._keys = tuple(keys)
@@ -92,6 +289,14 @@ class PairedGenomicRanges(Mapping):
     def ranges(self):
         return self._ranges
 
+    def copy(self):
+        """ Returns a copy that does not share GenomicRange objects. """
+        return PairedGenomicRanges(
+            self._keys, 
+            [GenomicRange(r.chromosome, r.start, r.end, r.version) 
+             for r in self._ranges],
+            self.is_inversion, self.name)
+
     @staticmethod
     def from_dict(pairedRangeDict, is_inversion):
         keys = pairedRangeDict.keys()
@@ -119,12 +324,12 @@ class PairedGenomicRanges(Mapping):
             start_ix, end_ix = -(end_ix+1), -(start_ix+1)
 
         try:
-            s2 = self[match_key]._range[start_ix]
+            s2 = self[match_key][start_ix]
         except IndexError:
             raise Exception('IndexError found: {} '\
                 'while length is {}'.format(start_ix, len(self[match_key])))
         try:
-            e2 = self[match_key]._range[end_ix]
+            e2 = self[match_key][end_ix]
         except IndexError:
             raise Exception('IndexError found: {} '\
                 'while length is {}'.format(end_ix, len(self[match_key])))
@@ -149,6 +354,7 @@ class PairedGenomicRanges(Mapping):
         data += [self.is_inversion]
         indices += ['is_inversion']
 
+        import pandas as pd
         return pd.Series(data, index=indices, name=self.name)
     
     def __len__(self):
@@ -179,6 +385,117 @@ class PairedGenomicRanges(Mapping):
             pair=self._pair.__repr__(), is_inversion=self.is_inversion
         )
 
+_COMPARISONS = {
+    'gt': operator.gt, 'gte': operator.ge, 
+    'lt': operator.lt, 'lte': operator.le, 
+    'ne': operator.ne,
+}
+_COMPARISON_PREFIX = re.compile(r'^(gte|gt|lte|lt|ne)\d')
+_COMPARISON_VALUE = re.compile(r'^(?:gte|gt|lte|lt|ne)(\d+\.*\d*)$')
+_CONTAINS = re.compile(r'^n?c/(.+)/$')
+
+class FilterPlan(object):
+    """ Compiled form of keyword arguments of Database.filter. Each 
+    condition is parsed once into a function that returns a boolean mask for 
+    a column, and all conditions are combined with "&" when the plan is 
+    applied to a DataFrame.
+
+    Use compile_filter to get a FilterPlan, which memoizes plans by their 
+    keyword arguments.
+    """
+    def __init__(self, signature):
+        self.signature = signature
+        self.conditions = []
+        for column, frozen in signature:
+            kind, value = frozen
+            if kind == 'and':
+                predicates = [self.compile_value(*item) for item in value]
+            elif kind in ('str', 'or'):
+                predicates = [self.compile_value(kind, value)]
+            elif issubclass(kind, int):
+                predicates = [self.compile_value(kind, value)]
+            else:
+                # Other types are not used for filtering
+                predicates = []
+
+            predicates = [p for p in predicates if p is not None]
+            if predicates:
+                self.conditions.append((column, predicates))
+
+    @staticmethod
+    def freeze(value):
+        """ Returns a hashable representation of a filter value. A type is 
+        kept so that e.g. 1 and 1.0 are not confused. """
+        if isinstance(value, tuple):
+            return ('and', tuple(FilterPlan.freeze(v) for v in value))
+        elif isinstance(value, list):
+            return ('or', tuple(value))
+        elif isinstance(value, str):
+            return ('str', value)
+        return (type(value), value)
+
+    @staticmethod
+    def compile_value(kind, value):
+        """ Returns a function that takes a Series and returns a boolean 
+        mask, or None if the value does not filter anything. """
+        if kind == 'str':
+            if value == '*':
+                return None
+            elif _COMPARISON_PREFIX.match(value):
+                op = _COMPARISONS[_COMPARISON_PREFIX.match(value).group(1)]
+                match = _COMPARISON_VALUE.match(value)
+                if match is None:
+                    raise ValueError(f'Invalid filter value: "{value}".')
+                threshold = float(match.group(1))
+                return lambda series: op(series, threshold)
+            elif value.startswith(('c/', 'nc/')):
+                match = _CONTAINS.match(value)
+                if match is None:
+                    raise ValueError(f'Invalid filter value: "{value}".')
+                pattern = match.group(1)
+                if value.startswith('nc/'):
+                    return lambda series: ~series.str.contains(pattern)
+                return lambda series: series.str.contains(pattern)
+        elif kind == 'or':
+            value = list(value)
+            return lambda series: series.isin(value)
+
+        return lambda series: series == value
+
+    def mask(self, df):
+        """ Returns a boolean NumPy array which is True for rows that 
+        satisfy all conditions. """
+        mask = np.ones(len(df.index), dtype=bool)
+        for column, predicates in self.conditions:
+            series = df[column]
+            for predicate in predicates:
+                mask &= np.asarray(predicate(series), dtype=bool)
+
+        return mask
+
+    def apply(self, df):
+        """ Returns rows of a given DataFrame that satisfy all conditions. """
+        if not self.conditions:
+            return df
+        return df[self.mask(df)]
+
+    def __repr__(self):
+        return '<{name}: {size} conditions>'.format(
+            name=type(self).__name__, size=len(self.conditions))
+
+@lru_cache(maxsize=1024)
+def _compile_filter(signature):
+    return FilterPlan(signature)
+
+def compile_filter(**kwargs):
+    """ Returns a FilterPlan for keyword arguments of Database.filter. Plans 
+    are memoized, so the same keyword arguments are parsed only once. """
+    signature = tuple((k, FilterPlan.freeze(v)) for k, v in kwargs.items())
+    try:
+        return _compile_filter(signature)
+    except TypeError: # unhashable values (e.g. a list in a list)
+        return FilterPlan(signature)
+
 class Database(Mapping):
     """ This class inherits Mapping class. __iter__, __getitem__ and __len__ 
     functions are overwritten. This is a base class of SFS class. """
@@ -186,13 +503,18 @@ class Database(Mapping):
         self.df = df
         self.description = description
 
+    def _get_df(self):
+        """ Returns df for use by methods. Subclasses whose df getter 
+        returns a copy override this to return the DataFrame itself. """
+        return self.df
+
     @property
     def columns(self):
-        return self.df.columns
+        return self._get_df().columns
 
     @property
     def shape(self):
-        return self.df.shape
+        return self._get_df().shape
         
     def filter(self, sort_by='', ascending=True, **kwargs):
         '''
@@ -221,130 +543,774 @@ class Database(Mapping):
             If you pass tuple to value, this function search and filter 
             items recursively.
 
+        Filter values are compiled into a FilterPlan once and reused for 
+        the same keyword arguments (see compile_filter).
+
         Dependencies
         ------------
         pandas
         re
         '''
-        res_df = self.df
-        def f(res_df, k, v):
-            if isinstance(v, str):
-                if v == '*':
-                    pass
-                elif re.search('^gt\d+', v):
-                    v = float(re.search('^gt(\d+\.*\d*)$', v).group(1))
-                    res_df = res_df[res_df[k] > v]
-                elif re.search('^gte\d+', v):
-                    v = float(re.search('^gte(\d+\.*\d*)$', v).group(1))
-                    res_df = res_df[res_df[k] >= v]
-                elif re.search('^lt\d+', v):
-                    v = float(re.search('^lt(\d+\.*\d*)$', v).group(1))
-                    res_df = res_df[res_df[k] < v]
-                elif re.search('^lte\d+', v):
-                    v = float(re.search('lte(\d+\.*\d*)$', v).group(1))
-                    res_df = res_df[res_df[k] <= v]
-                elif re.search('^ne\d+', v):
-                    v = float(re.search('ne(\d+\.*\d*)$', v).group(1))
-                    res_df = res_df[res_df[k] != v]
-                elif re.search('^c\/', v):
-                    v = re.search('^c\/(.+)\/$', v).group(1)
-                    res_df = res_df[res_df[k].str.contains(v)]
-                elif re.search('^nc\/', v):
-                    v = re.search('^nc\/(.+)\/$', v).group(1)
-                    res_df = res_df[~res_df[k].str.contains(v)]
-                else:
-                    res_df = res_df[res_df[k] == v]
-            elif isinstance(v, list):
-                res_df = res_df[res_df[k].isin(v)]
-            else:
-                res_df = res_df[res_df[k] == v]
-
-            return res_df
-
-        for k,v in kwargs.items():
-            if isinstance(v, tuple): # "and"
-                res_df_list = []
-                for i in v:
-                    tmp_res_df = f(res_df, k, i)
-                    res_df = pd.merge(res_df, tmp_res_df, how='inner')
-            elif isinstance(v, (str, list)): # list means "or" condition
-                res_df = f(res_df, k, v)
-            elif isinstance(v, int):
-                res_df = res_df[res_df[k] == v]
+        plan = compile_filter(**kwargs)
+        # Without conditions the whole table is returned through df
+        res_df = plan.apply(self._get_df()) if plan.conditions else self.df
         if sort_by:
-            res_df.sort_values(by=sort_by, ascending=ascending, inplace=True)
+            res_df = res_df.sort_values(by=sort_by, ascending=ascending)
             
         return res_df
 
     def groupby(self, **kwargs):
-        return self.df.groupby(**kwargs)
+        return self._get_df().groupby(**kwargs)
 
     def head(self, *kwargs):
-        return self.df.head(*kwargs)
+        return self._get_df().head(*kwargs)
 
     def tail(self, *kwargs):
-        return self.df.tail(*kwargs)
+        return self._get_df().tail(*kwargs)
 
     def __len__(self):
-        return len(self.df.index)
+        return len(self._get_df().index)
 
     def __iter__(self):
-        return self.df.iterrows()
+        return self._get_df().iterrows()
 
     def __getitem__(self, key):
         if key == '*':
             return self.df
         else:
-            return self.df.loc[key, :]
+            return self._get_df().loc[key, :]
 
     def __repr__(self):
         return '<{name}: {desc} ({size} records)>'.format(
             name=type(self).__name__, desc=self.description, size=self.__len__()
         )
 
+IndexBlock = namedtuple('IndexBlock', ['starts', 'ends', 'max_ends', 'rows'])
+CacheInfo = namedtuple(
+    'CacheInfo', ['hits', 'misses', 'evictions', 'maxsize', 'currsize'])
+PositionResult = namedtuple(
+    'PositionResult', 
+    ['chromosome', 'position', 'is_inversion', 'row', 'conversion_code'])
+
+class IntervalIndex(Mapping):
+    """ Containment index over the segments of one version of a mapping
+    table. Segments are grouped by chromosome and sorted by start position.
+    A running maximum of end positions allows a search to stop as soon as no
+    earlier segment can contain a query, so a lookup costs O(log n) plus the
+    number of segments overlapping the query end.
+
+    Row numbers returned by this class are positions (not labels) in the
+    arrays used to build the index. -9 means that no segment contains a
+    query and -8 means that multiple segments contain it.
+    """
+    NOT_FOUND = -9
+    MULTIPLE = -8
+
+    def __init__(self, chromosomes, starts, ends):
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        codes, uniques = factorize(chromosomes)
+        order = np.lexsort((starts, codes))
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+
+        self._blocks = {}
+        self._disjoint = {}
+        for code, chromosome in enumerate(uniques):
+            rows = order[bounds[code]:bounds[code+1]]
+            self._blocks[chromosome] = IndexBlock(
+                starts[rows], ends[rows], np.maximum.accumulate(ends[rows]),
+                rows)
+
+    @staticmethod
+    def from_arrays(chromosomes, bounds, starts, ends, max_ends, rows):
+        """ Returns IntervalIndex from arrays returned by to_arrays. Blocks 
+        are views of the given arrays, so memory-mapped arrays are not 
+        copied. """
+        obj = IntervalIndex.__new__(IntervalIndex)
+        obj._blocks = {}
+        obj._disjoint = {}
+        for i, chromosome in enumerate(chromosomes):
+            sl = slice(bounds[i], bounds[i+1])
+            obj._blocks[chromosome] = IndexBlock(
+                starts[sl], ends[sl], max_ends[sl], rows[sl])
+
+        return obj
+
+    def to_arrays(self):
+        """ Returns chromosomes, block boundaries and concatenated starts, 
+        ends, running maximum of ends and row positions of all blocks. """
+        chromosomes = list(self._blocks)
+        blocks = [self._blocks[c] for c in chromosomes]
+        bounds = np.cumsum([0] + [len(b.rows) for b in blocks])
+        arrays = [
+            np.concatenate([getattr(b, field) for b in blocks]) if blocks
+            else np.empty(0, dtype=np.int64)
+            for field in IndexBlock._fields
+        ]
+
+        return (chromosomes, bounds) + tuple(arrays)
+
+    @staticmethod
+    def from_DataFrame(df, version):
+        """ Returns IntervalIndex for columns "v{version}_chr",
+        "v{version}_start" and "v{version}_end" in a given DataFrame. """
+        return IntervalIndex(
+            df[f'v{version}_chr'].to_numpy(),
+            df[f'v{version}_start'].to_numpy(),
+            df[f'v{version}_end'].to_numpy()
+        )
+
+    def find(self, chromosome, start, end):
+        """ Returns positions of all rows whose segment includes the range
+        from start to end completely. Positions are sorted in ascending
+        order. """
+        block = self._blocks.get(chromosome)
+        if block is None:
+            return np.empty(0, dtype=np.int64)
+
+        hits = []
+        i = int(np.searchsorted(block.starts, start, side='right')) - 1
+        while i >= 0 and block.max_ends[i] >= end:
+            if block.ends[i] >= end:
+                hits.append(block.rows[i])
+            i -= 1
+
+        return np.sort(np.array(hits, dtype=np.int64))
+
+    def lookup(self, chromosomes, starts, ends):
+        """ Returns an array with the position of the single row including
+        each query range. -9 is returned if no row includes a query and -8 if
+        multiple rows do.
+
+        Parameters
+        ----------
+        chromosomes: array-like
+        starts: array-like of int
+        ends: array-like of int
+        """
+        codes, uniques = factorize(chromosomes)
+        return self.lookup_codes(codes, uniques, starts, ends)
+
+    def lookup_codes(self, codes, categories, starts, ends):
+        """ Same as lookup but chromosomes are given as integer codes into 
+        categories (e.g. GenomicRangeArray.codes and .categories). """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        result = np.full(len(starts), self.NOT_FOUND, dtype=np.int64)
+
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(categories) + 1))
+
+        for code, chromosome in enumerate(categories):
+            block = self._blocks.get(chromosome)
+            if block is None:
+                continue
+            sel = order[bounds[code]:bounds[code+1]]
+            result[sel] = self._lookup_block(
+                block, starts[sel], ends[sel], 
+                disjoint=self.is_disjoint(chromosome))
+
+        return result
+
+    def lookup_sorted(self, codes, categories, starts, ends):
+        """ Same as lookup_codes for queries sorted by chromosome and start, 
+        i.e. each chromosome appears in one contiguous run and starts do not 
+        decrease within a run. Instead of a binary search per query, the 
+        sorted queries and segments of a chromosome are merged in one pass 
+        (a stable sort of two sorted runs takes O(n + m)). """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        result = np.full(len(starts), self.NOT_FOUND, dtype=np.int64)
+        if len(codes) == 0:
+            return result
+
+        run_bounds = np.concatenate(
+            ([0], np.flatnonzero(np.diff(codes)) + 1, [len(codes)]))
+        for i, j in zip(run_bounds[:-1], run_bounds[1:]):
+            chromosome = categories[codes[i]]
+            block = self._blocks.get(chromosome)
+            if block is None:
+                continue
+            n_segments = len(block.starts)
+            merged = np.argsort(
+                np.concatenate((block.starts, starts[i:j])), kind='stable')
+            # Number of segments that start at or before each query
+            n_before = np.cumsum(merged < n_segments)[merged >= n_segments]
+            result[i:j] = self._lookup_block(
+                block, starts[i:j], ends[i:j], pos=n_before - 1, 
+                disjoint=self.is_disjoint(chromosome))
+
+        return result
+
+    @staticmethod
+    def is_sorted(codes, starts):
+        """ Returns True if queries are sorted by chromosome and start (see 
+        lookup_sorted). Chromosomes may appear in any order. """
+        if len(codes) < 2:
+            return True
+        same = codes[1:] == codes[:-1]
+        n_runs = len(codes) - int(same.sum())
+        return n_runs == len(np.unique(codes)) \
+            and bool((starts[1:][same] >= starts[:-1][same]).all())
+
+    def is_disjoint(self, chromosome):
+        """ Returns True if no two segments of a chromosome overlap. The 
+        result is computed once per chromosome. """
+        if chromosome not in self._disjoint:
+            block = self._blocks[chromosome]
+            self._disjoint[chromosome] = \
+                bool(np.all(block.starts[1:] > block.max_ends[:-1]))
+        return self._disjoint[chromosome]
+
+    def set_block(self, chromosome, starts, ends, rows):
+        """ Replaces the segments of a chromosome (the chromosome is removed
+        if no segment is given). Other chromosomes are not touched. """
+        self._disjoint.pop(chromosome, None)
+        if len(rows) == 0:
+            self._blocks.pop(chromosome, None)
+            return
+
+        # Sorted like __init__: by start, then by row
+        rows = np.asarray(rows, dtype=np.int64)
+        by_row = np.argsort(rows)
+        rows = rows[by_row]
+        starts = np.asarray(starts, dtype=np.int64)[by_row]
+        ends = np.asarray(ends, dtype=np.int64)[by_row]
+        order = np.argsort(starts, kind='stable')
+        self._blocks[chromosome] = IndexBlock(
+            starts[order], ends[order], np.maximum.accumulate(ends[order]),
+            rows[order])
+
+    def shift_rows(self, deleted):
+        """ Renumbers rows after the rows at sorted positions deleted are
+        removed from the table. Rows in deleted must not be in any block. """
+        if len(deleted) == 0:
+            return
+        for chromosome, block in self._blocks.items():
+            self._blocks[chromosome] = block._replace(
+                rows=block.rows - np.searchsorted(deleted, block.rows))
+
+    def _lookup_block(self, block, starts, ends, pos=None, disjoint=False):
+        hit = np.full(len(starts), self.NOT_FOUND, dtype=np.int64)
+        if pos is None:
+            pos = np.searchsorted(block.starts, starts, side='right') - 1
+
+        if disjoint:
+            # Only the last segment starting at or before a query can 
+            # contain it if segments do not overlap
+            j = np.maximum(pos, 0)
+            contain = (pos >= 0) & (block.ends[j] >= ends)
+            hit[contain] = block.rows[j[contain]]
+            return hit
+
+        count = np.zeros(len(starts), dtype=np.int64)
+
+        # Walk backwards from the last segment starting at or before each
+        # query until no earlier segment can reach the query end. Stop once
+        # two segments are found because any more do not change the result.
+        active = np.flatnonzero(pos >= 0)
+        while active.size:
+            j = pos[active]
+            reach = block.max_ends[j] >= ends[active]
+            active, j = active[reach], j[reach]
+
+            contain = block.ends[j] >= ends[active]
+            hit[active[contain]] = block.rows[j[contain]]
+            count[active[contain]] += 1
+
+            pos[active] = j - 1
+            active = active[(count[active] < 2) & (j > 0)]
+
+        hit[count > 1] = self.MULTIPLE
+        return hit
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def __iter__(self):
+        return iter(self._blocks)
+
+    def __getitem__(self, chromosome):
+        return self._blocks[chromosome]
+
+    def __repr__(self):
+        return '<{name}: {size} chromosomes>'.format(
+            name=type(self).__name__, size=self.__len__())
+
 class ConvertCoordinates(Database):
-    def __init__(self, df, version1, version2, description=''):
+    """ Mapping table between two versions of genomic coordinates. df must 
+    have "v{version}_chr", "v{version}_start" and "v{version}_end" columns for 
+    both versions and "is_inversion" column ("-" for inverted segments).
+
+    validate controls check_same_len: True runs it when the object is 
+    constructed, "defer" runs it before the first lookup and False skips it 
+    for trusted tables. Use validate() to get a report of all problems.
+
+    If indices is given (a dict of IntervalIndex objects keyed by version, 
+    e.g. from a compiled map in read.load_compiled_map), the table is 
+    trusted: checks are skipped and the indices are used as they are.
+
+    df can also be a dict of NumPy arrays keyed by the same column names, 
+    with row names given by names (positions if None). Conversion then 
+    works on the arrays and the DataFrame is created (and pandas imported) 
+    only when df is accessed.
+
+    Segments can be inserted, deleted and replaced with update_segments 
+    (or apply_patch with a MapPatch) without rebuilding the whole index. 
+    The table is kept as arrays afterwards.
+    """
+    def __init__(self, df, version1, version2, description='', indices=None,
+                 validate=True, names=None):
+        self.disable_cache()
+        self._names = names
         super().__init__(df, description) # use __init__() of parent class
         self.version1, self.version2 = version1, version2
 
+        if indices is not None:
+            self.indices = {
+                version1: indices[version1], version2: indices[version2]}
+            self._arrays = {}
+            self._validated = True
+            return
+
         # Check if all columns are contined in DataFrame
         self.check_columns()
-        self.check_same_len()
+        self.build_index()
+
+        self._validated = False
+        if validate == 'defer':
+            pass
+        elif validate:
+            self.ensure_validated()
+        else:
+            self._validated = True
+
+    @property
+    def df(self):
+        """ The mapping table as a DataFrame. This is a copy: modifying it 
+        does not change the map, so the indices and cached results always 
+        agree with the table. Assign a new DataFrame to df or use 
+        update_segments to change the map. """
+        return copy_DataFrame(self._get_df())
+
+    def _get_df(self):
+        if self._df is None:
+            import pandas as pd
+            self._df = pd.DataFrame(
+                {name: np.asarray(column) 
+                 for name, column in self._columns.items()}, 
+                index=self._names)
+        return self._df
+
+    @df.setter
+    def df(self, df):
+        # Lookup structures are rebuilt if df is replaced after construction
+        if isinstance(df, dict):
+            self._df, self._columns = None, df
+        else:
+            # The caller's DataFrame may be modified later
+            self._df, self._columns = copy_DataFrame(df), None
+            self._names = None
+        if hasattr(self, 'indices'):
+            self.check_columns()
+            self.build_index()
+            self._validated = False
+
+    @property
+    def columns(self):
+        if self._df is None:
+            return list(self._columns)
+        return self._df.columns
+
+    def enable_cache(self, maxsize=100000):
+        """ Keeps results of convert_coordinate for up to maxsize queries in 
+        a least recently used cache keyed by query version, chromosome, start 
+        and end. The cache is cleared whenever the table changes (df is 
+        replaced or segments are updated); df itself cannot be modified in 
+        place. Hits return copies of cached results. """
+        self._cache = OrderedDict()
+        self._cache_maxsize = maxsize
+        self._cache_hits = self._cache_misses = self._cache_evictions = 0
+
+    def disable_cache(self):
+        self._cache = None
+        self._cache_maxsize = 0
+        self._cache_hits = self._cache_misses = self._cache_evictions = 0
+
+    def clear_cache(self):
+        if self._cache is not None:
+            self._cache.clear()
+
+    def cache_info(self):
+        """ Returns CacheInfo with numbers of hits, misses and evictions, 
+        the maximum size and the current size of the cache. """
+        return CacheInfo(
+            self._cache_hits, self._cache_misses, self._cache_evictions, 
+            self._cache_maxsize, 
+            len(self._cache) if self._cache is not None else 0
+        )
+
+    def build_index(self):
+        """ Builds an IntervalIndex for each version. This is called when 
+        the object is constructed and when df is replaced. """
+        self.clear_cache()
+        self._arrays = {}
+        self.indices = {
+            version: IntervalIndex(*self.get_arrays(version))
+            for version in (self.version1, self.version2)
+        }
+
+    def get_arrays(self, version):
+        """ Returns chromosome, start and end columns of a given version as
+        NumPy arrays. Arrays are cached until the index is rebuilt. The 
+        chromosome column may be a CategoricalArray, which supports the 
+        indexing used for lookups. """
+        if version not in self._arrays:
+            self._arrays[version] = (
+                self.get_column(f'v{version}_chr', decode=False),
+                self.get_column(f'v{version}_start', dtype=np.int64),
+                self.get_column(f'v{version}_end', dtype=np.int64),
+            )
+        return self._arrays[version]
+
+    def get_column(self, name, dtype=None, decode=True):
+        """ Returns a column as a NumPy array without creating the 
+        DataFrame if the table was given as arrays. If decode is False, a 
+        CategoricalArray column is returned as it is. """
+        if self._df is None:
+            column = self._columns[name]
+            if not decode and isinstance(column, CategoricalArray):
+                return column
+            return np.asarray(column, dtype=dtype)
+        return self._df[name].to_numpy(dtype=dtype)
+
+    def get_names(self):
+        """ Returns row names (the index of df) as a NumPy array. """
+        if self._df is not None:
+            return self._df.index.to_numpy()
+        elif self._names is None:
+            return np.arange(len(self))
+        return np.asarray(self._names)
+
+    def get_inversions(self):
+        """ Returns a boolean array which is True for inverted segments. """
+        if 'is_inversion' not in self._arrays:
+            column = self.get_column('is_inversion', decode=False)
+            if isinstance(column, CategoricalArray):
+                self._arrays['is_inversion'] = column.isin(['-'])
+            else:
+                self._arrays['is_inversion'] = column == '-'
+        return self._arrays['is_inversion']
+
+    def get_interval_index(self, version):
+        """ Returns the IntervalIndex for a given version. """
+        self.ensure_validated()
+        try:
+            return self.indices[version]
+        except KeyError:
+            raise Exception(f'Please input either of version {self.version1} '\
+                f'or {self.version2}.')
 
     def check_columns(self):
-        assert f'v{self.version1}_chr' in self.df.columns, \
+        assert f'v{self.version1}_chr' in self.columns, \
             f'Column not found: "v{self.version1}_chr" was expected.'
-        assert f'v{self.version1}_start' in self.df.columns, \
+        assert f'v{self.version1}_start' in self.columns, \
             f'Column not found: "v{self.version1}_start" was expected.'
-        assert f'v{self.version1}_end' in self.df.columns, \
+        assert f'v{self.version1}_end' in self.columns, \
             f'Column not found: "v{self.version1}_end" was expected.'
 
-        assert f'v{self.version2}_chr' in self.df.columns, \
+        assert f'v{self.version2}_chr' in self.columns, \
             f'Column not found: "v{self.version2}_chr" was expected.'
-        assert f'v{self.version2}_start' in self.df.columns, \
+        assert f'v{self.version2}_start' in self.columns, \
             f'Column not found: "v{self.version2}_start" was expected.'
-        assert f'v{self.version2}_end' in self.df.columns, \
+        assert f'v{self.version2}_end' in self.columns, \
             f'Column not found: "v{self.version2}_end" was expected.'
 
+    def get_length_mismatches(self):
+        """ Returns positions of rows whose segment lengths differ between 
+        the two versions. """
+        _, v1_start, v1_end = self.get_arrays(self.version1)
+        _, v2_start, v2_end = self.get_arrays(self.version2)
+
+        return np.flatnonzero(v1_end - v1_start != v2_end - v2_start)
+
     def check_same_len(self):
-        v1_start = f'v{self.version1}_start'
-        v1_end = f'v{self.version1}_end'
-        v2_start = f'v{self.version2}_start'
-        v2_end = f'v{self.version2}_end'
+        bad = self.get_length_mismatches()
+        assert len(bad) == 0, \
+            f'Segment lengths differ between versions {self.version1} and '\
+            f'{self.version2} in {len(bad)} rows: '\
+            f'{self.get_names()[bad[:10]].tolist()}'\
+            f'{" ..." if len(bad) > 10 else ""}'
+
+    def ensure_validated(self):
+        """ Runs check_same_len if it has been deferred. """
+        if not self._validated:
+            self.check_same_len()
+            self._validated = True
+
+    def validate(self):
+        """ Returns a DataFrame that reports problems of the mapping table. 
+        Each row of the report has the position and name of an offending row 
+        of df, the version concerned and one of the problems below. An empty 
+        DataFrame is returned if no problem is found.
+
+        "length_mismatch": segment lengths differ between versions
+        "negative": start or end is negative
+        "unsorted": start is greater than end
+        "overlap": segment overlaps an earlier segment on the same 
+            chromosome of the same version
+        """
+        positions = [self.get_length_mismatches()]
+        versions = [np.full(len(positions[0]), '', dtype=object)]
+        problems = [np.full(len(positions[0]), 'length_mismatch', dtype=object)]
+
+        def add(pos, version, problem):
+            positions.append(pos)
+            versions.append(np.full(len(pos), version, dtype=object))
+            problems.append(np.full(len(pos), problem, dtype=object))
+
+        for version in (self.version1, self.version2):
+            _, starts, ends = self.get_arrays(version)
+            add(np.flatnonzero((starts < 0) | (ends < 0)), version, 'negative')
+            add(np.flatnonzero(starts > ends), version, 'unsorted')
+            for block in self.indices[version].values():
+                overlap = block.starts[1:] <= block.max_ends[:-1]
+                add(np.sort(block.rows[1:][overlap]), version, 'overlap')
+
+        positions = np.concatenate(positions)
+        order = np.argsort(positions, kind='stable')
+        positions = positions[order]
 
-        assert self.df.apply(lambda x: x[v1_end] - x[v1_start] ==\
-                x[v2_end] - x[v2_start], axis=1).all()
+        import pandas as pd
+        return pd.DataFrame(
+            {
+                'position': positions,
+                'name': self.get_names()[positions],
+                'version': np.concatenate(versions)[order],
+                'problem': np.concatenate(problems)[order],
+            }
+        )
+
+    def get_positions(self, names):
+        """ Returns positions of rows with given names. Each name must be
+        the name of exactly one row. """
+        all_names = self.get_names()
+        if all_names.dtype.kind in 'iu':
+            names = np.asarray(names, dtype=np.int64)
+        else:
+            names = object_array(list(names))
+        if len(all_names) == 0:
+            if len(names):
+                raise Exception(f'Segment not found: {names[0]}')
+            return np.empty(0, dtype=np.int64)
+
+        order = np.argsort(all_names, kind='stable')
+        sorted_names = all_names[order]
+        pos = np.minimum(
+            np.searchsorted(sorted_names, names), len(sorted_names) - 1)
+        missing = sorted_names[pos] != names
+        if missing.any():
+            raise Exception(f'Segment not found: {names[missing][0]}')
+        after = np.minimum(pos + 1, len(sorted_names) - 1)
+        duplicated = (after != pos) & (sorted_names[after] == names)
+        if duplicated.any():
+            raise Exception(
+                f'More than one segment is named {names[duplicated][0]}.')
+
+        return order[pos]
+
+    def to_segment_columns(self, segments):
+        """ Returns columns of new segments converted to the dtypes of the
+        table. segments is a DataFrame or a dict of array-likes with the
+        coordinate columns and "is_inversion" (strings "+"/"-" or booleans).
+        Other columns of the table are filled with None if missing, or with
+        -9 if they are integer columns (e.g. "chain_id" of chain maps). """
+        if segments is None:
+            segments = {name: [] for name in self.columns}
+        n = len(segments['is_inversion'])
+        columns = {}
+        for name in self.columns:
+            if name in segments:
+                values = np.asarray(segments[name])
+            else:
+                assert name not in self._required_columns(), \
+                    f'Column not found: "{name}" was expected.'
+                values = np.full(n, None, dtype=object)
+            integer = name not in self._required_columns() and \
+                self.get_column(name).dtype.kind in 'iu'
+
+            if name.endswith(('_start', '_end')):
+                values = values.astype(np.int64)
+            elif integer and name not in segments:
+                values = np.full(n, IntervalIndex.NOT_FOUND, dtype=np.int64)
+            elif integer and values.dtype.kind in 'iu':
+                values = values.astype(np.int64)
+            elif name == 'is_inversion' and values.dtype == bool:
+                values = object_array(np.where(values, '-', '+').tolist())
+            elif values.dtype != object:
+                values = object_array(values.tolist())
+            columns[name] = values
+
+        return columns
+
+    def _required_columns(self):
+        return [f'v{version}_{field}'
+                for version in (self.version1, self.version2)
+                for field in ('chr', 'start', 'end')] + ['is_inversion']
+
+    def insert_segments(self, segments, names=None):
+        """ Appends segments to the table (see to_segment_columns). names
+        are row names of the new segments. If None, integers following the
+        largest row name are used (the table must have integer names). """
+        self.update_segments(insertions=segments, names=names)
+
+    def delete_segments(self, positions):
+        """ Removes rows at given positions. Rows after them move up while
+        keeping their names. """
+        self.update_segments(delete=positions)
+
+    def replace_segments(self, positions, segments):
+        """ Replaces rows at given positions with segments (see
+        to_segment_columns). Names of the rows are kept. """
+        self.update_segments(replace=positions, replacements=segments)
+
+    def apply_patch(self, patch):
+        """ Applies a MapPatch. Segments are identified by row names. """
+        versions = {str(self.version1), str(self.version2)}
+        assert {str(patch.version1), str(patch.version2)} == versions, \
+            f'Patch for versions {patch.version1} and {patch.version2} '\
+            f'cannot be applied to versions {self.version1} and '\
+            f'{self.version2}.'
+        self.update_segments(
+            delete=self.get_positions(patch.deletions),
+            replace=self.get_positions(list(patch.replacements)),
+            replacements=patch.to_columns(patch.replacements.values()),
+            insertions=patch.to_columns(patch.insertions.values()),
+            names=list(patch.insertions))
+
+    def update_segments(self, delete=(), replace=(), replacements=None,
+                        insertions=None, names=None):
+        """ Deletes rows at positions delete, replaces rows at positions
+        replace with replacements and appends insertions in one step (see
+        delete_segments, replace_segments and insert_segments).
+
+        Only the IntervalIndex blocks of chromosomes that lose or gain a
+        segment are rebuilt; blocks of other chromosomes are renumbered if
+        rows are deleted. If the table has been checked (see
+        ensure_validated), only new segments are checked for length
+        mismatches, and nothing is changed if they fail.
+        """
+        delete = np.unique(np.asarray(delete, dtype=np.int64))
+        replace = np.asarray(replace, dtype=np.int64)
+        edited = np.concatenate((delete, replace))
+        n_rows = len(self)
+        assert len(np.unique(edited)) == len(edited), \
+            'A row cannot be deleted or replaced more than once.'
+        if len(edited) and (edited.min() < 0 or edited.max() >= n_rows):
+            raise Exception(f'Row positions must be from 0 to {n_rows - 1}.')
+
+        replacements = self.to_segment_columns(replacements)
+        insertions = self.to_segment_columns(insertions)
+        assert len(replacements['is_inversion']) == len(replace), \
+            f'{len(replace)} segments were expected for replacement.'
+        n_inserted = len(insertions['is_inversion'])
+
+        old_names = self.get_names()
+        if old_names.dtype.kind not in 'iu':
+            old_names = old_names.astype(object)
+        if names is None:
+            if old_names.dtype.kind not in 'iu':
+                raise Exception(
+                    'Names of inserted segments are needed for a table with '\
+                    'non-integer row names.')
+            first = int(old_names.max()) + 1 if len(old_names) else 0
+            names = np.arange(first, first + n_inserted)
+        assert len(names) == n_inserted, \
+            f'{n_inserted} names were expected for inserted segments.'
+        names = np.asarray(names, dtype=old_names.dtype) \
+            if old_names.dtype.kind in 'iu' else object_array(list(names))
+        # Names of rows deleted in the same step can be reused
+        taken = names[np.isin(names, np.delete(old_names, delete))]
+        assert len(taken) == 0, \
+            f'Segment names are already used: {taken[:10].tolist()}'
+        assert len(set(names.tolist())) == len(names), \
+            'Inserted segments must have different names.'
+
+        if self._validated:
+            new = {
+                name: np.concatenate((replacements[name], insertions[name]))
+                for name in self._required_columns()
+            }
+            bad = np.flatnonzero(
+                new[f'v{self.version1}_end'] - new[f'v{self.version1}_start']
+                != new[f'v{self.version2}_end'] - new[f'v{self.version2}_start'])
+            new_names = np.concatenate((old_names[replace], names))
+            assert len(bad) == 0, \
+                f'Segment lengths differ between versions {self.version1} '\
+                f'and {self.version2} in {len(bad)} new segments: '\
+                f'{new_names[bad[:10]].tolist()}'\
+                f'{" ..." if len(bad) > 10 else ""}'
+
+        # Rows are renumbered after deletion; replaced rows keep their place
+        # and inserted rows are appended
+        def edit(old, replaced, inserted):
+            new = old
+            if len(replace):
+                new = np.array(old)
+                new[replace] = replaced
+            if len(delete):
+                new = np.delete(new, delete)
+            if len(inserted):
+                new = np.concatenate((new, inserted))
+            return new
+
+        columns = {
+            name: edit(self.get_column(name), replacements[name],
+                       insertions[name])
+            for name in self.columns
+        }
+        self._names = edit(old_names, old_names[replace], names)
+        added = np.concatenate((
+            replace - np.searchsorted(delete, replace),
+            np.arange(n_inserted) + n_rows - len(delete)))
+
+        for version in (self.version1, self.version2):
+            index = self.indices[version]
+            old_chr = self.get_arrays(version)[0]
+            new_chr = columns[f'v{version}_chr']
+            starts = columns[f'v{version}_start']
+            ends = columns[f'v{version}_end']
+            affected = set(old_chr[edited].tolist()) \
+                | set(new_chr[added].tolist())
+
+            blocks = {}
+            for chromosome in affected:
+                rows = index[chromosome].rows if chromosome in index \
+                    else np.empty(0, dtype=np.int64)
+                rows = rows[~np.isin(rows, edited)]
+                rows = np.concatenate((
+                    rows - np.searchsorted(delete, rows),
+                    added[new_chr[added] == chromosome]))
+                blocks[chromosome] = rows
+
+            index.shift_rows(delete)
+            for chromosome, rows in blocks.items():
+                index.set_block(chromosome, starts[rows], ends[rows], rows)
+
+        self._df, self._columns = None, columns
+        self._arrays = {}
+        self.clear_cache()
 
     def get_rows(self, version, chromosome, start, end, sort_by='', ascending=True):
         """ Returns a subset of DataFrame where a segment include input range 
         completely. Currently this function does not take care of partial matches.
         """
-        filt_kw = {
-            f'v{version}_chr': chromosome,
-            f'v{version}_start': f'lte{start}',
-            f'v{version}_end': f'gte{end}',
-        }
-        return self.filter(sort_by, ascending, **filt_kw)
+        rows = self.get_interval_index(version).find(chromosome, start, end)
+        res_df = self._get_df().iloc[rows]
+        if sort_by:
+            res_df = res_df.sort_values(by=sort_by, ascending=ascending)
+
+        return res_df
 
     def get_another_version(self, version):
         if version == self.version1:
@@ -375,10 +1341,97 @@ class ConvertCoordinates(Database):
         return PairedGenomicRanges(keys, ranges, is_inversion, name)
 
     def to_list_of_PairedGenomicRanges(self):
-        return self.df.apply(lambda x: 
+        return self._get_df().apply(lambda x: 
             self.to_PairedGenomicRanges(x, self.version1, self.version2), 
             axis=1).tolist()
 
+    def compose(self, other, description=''):
+        """ Returns ConvertCoordinates that maps the version of this object 
+        that is not shared with other directly to the version of other that 
+        is not shared with this object (e.g. 4 and 6 for maps of versions 4 
+        and 5 and of 5 and 6). 
+
+        Segments of both maps are intersected on the shared version, so a 
+        range converted by the returned map is the same as a range converted 
+        by this object and then by other. The inversion flag of a new 
+        segment is True if exactly one of the two segments is inverted. 
+
+        If a range is found in multiple segments (-8) by this object but 
+        only one of them continues in other, the returned map resolves the 
+        range while hop by hop conversion reports -8.
+        """
+        if other.version1 in (self.version1, self.version2):
+            shared = other.version1
+        elif other.version2 in (self.version1, self.version2):
+            shared = other.version2
+        else:
+            raise Exception('Maps do not share a version: versions '\
+                f'{self.version1} and {self.version2} and versions '\
+                f'{other.version1} and {other.version2}.')
+        first = self.get_another_version(shared)
+        last = other.get_another_version(shared)
+
+        a_chr, a_start, a_end = self.get_arrays(first)
+        b_chr, b_start, b_end = self.get_arrays(shared)
+        c_chr, c_start, c_end = other.get_arrays(last)
+        a_inv, c_inv = self.get_inversions(), other.get_inversions()
+
+        _, ob_start, ob_end = other.get_arrays(shared)
+
+        # Find pairs of segments that overlap on the shared version
+        pair_a, pair_b = [], []
+        index = other.get_interval_index(shared)
+        codes, categories = factorize(b_chr)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(categories) + 1))
+        for code, chromosome in enumerate(categories):
+            block = index.get(chromosome)
+            if block is None:
+                continue
+            rows_a = order[bounds[code]:bounds[code+1]]
+            # Candidates start before the end of a segment and come after 
+            # the last segment whose running maximum end does not reach it.
+            lo = np.searchsorted(block.max_ends, b_start[rows_a], side='left')
+            hi = np.searchsorted(block.starts, b_end[rows_a], side='right')
+            n = np.maximum(hi - lo, 0)
+            ix_a = np.repeat(rows_a, n)
+            ix_block = np.repeat(lo, n) + \
+                np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+            overlap = block.ends[ix_block] >= b_start[ix_a]
+            pair_a.append(ix_a[overlap])
+            pair_b.append(block.rows[ix_block[overlap]])
+        pair_a = np.concatenate(pair_a) if pair_a else np.empty(0, np.int64)
+        pair_b = np.concatenate(pair_b) if pair_b else np.empty(0, np.int64)
+
+        # Intersection on the shared version
+        lo = np.maximum(b_start[pair_a], ob_start[pair_b])
+        hi = np.minimum(b_end[pair_a], ob_end[pair_b])
+
+        def project(starts, ends, inv, from_start, lo, hi):
+            lo_offset, hi_offset = lo - from_start, hi - from_start
+            return (np.where(inv, ends - hi_offset, starts + lo_offset),
+                    np.where(inv, ends - lo_offset, starts + hi_offset))
+
+        new_a_start, new_a_end = project(
+            a_start[pair_a], a_end[pair_a], a_inv[pair_a], b_start[pair_a], 
+            lo, hi)
+        new_c_start, new_c_end = project(
+            c_start[pair_b], c_end[pair_b], c_inv[pair_b], 
+            ob_start[pair_b], lo, hi)
+
+        order = np.lexsort((pair_b, pair_a))
+        columns = {
+            f'v{first}_chr': a_chr[pair_a][order],
+            f'v{first}_start': new_a_start[order],
+            f'v{first}_end': new_a_end[order],
+            f'v{last}_chr': c_chr[pair_b][order],
+            f'v{last}_start': new_c_start[order],
+            f'v{last}_end': new_c_end[order],
+            'is_inversion': np.where(
+                a_inv[pair_a] != c_inv[pair_b], '-', '+')[order],
+        }
+        return ConvertCoordinates(columns, first, last, description)
+
     def convert_coordinate(self, query_version, query=None,
                            query_chr='', query_start=None, query_end=None):
         # Parse input query
@@ -393,16 +1446,36 @@ class ConvertCoordinates(Database):
             raise Exception('Please input query or query_chr, query_start and'\
                 ' query_end.')
         
-        # Find query coordinate in DataFrame
-        conv_table = self.get_rows(
-            query_version, query_coord.chromosome, 
-            query_coord.start, query_coord.end)
+        if self._cache is None:
+            return self._convert_coordinate(query_version, query_coord)
+
+        key = (query_version, query_coord.chromosome, 
+               query_coord.start, query_coord.end)
+        # Copies are returned so that callers cannot modify cached results
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self._cache_hits += 1
+            return self._cache[key].copy()
 
+        self._cache_misses += 1
+        paired = self._cache[key] = \
+            self._convert_coordinate(query_version, query_coord)
+        if len(self._cache) > self._cache_maxsize:
+            self._cache.popitem(last=False)
+            self._cache_evictions += 1
+
+        return paired.copy()
+
+    def _convert_coordinate(self, query_version, query_coord):
         # Get an name of the other version
         match_version = self.get_another_version(query_version)
-        
+
+        # Find query coordinate in DataFrame
+        rows = self.get_interval_index(query_version).find(
+            query_coord.chromosome, query_coord.start, query_coord.end)
+
         # If query is not found, return -9
-        if len(conv_table) == 0:
+        if len(rows) == 0:
             return PairedGenomicRanges(
                 keys=[query_version, match_version], 
                 ranges=[query_coord, GenomicRange(-9, -9, -9)], 
@@ -410,37 +1483,216 @@ class ConvertCoordinates(Database):
             )
             
         # If query range is found in the multiple rows, return -8
-        elif len(conv_table) > 1:
+        elif len(rows) > 1:
             return PairedGenomicRanges(
                 keys=[query_version, match_version], 
                 ranges=[query_coord, GenomicRange(-8, -8, -8)], 
                 is_inversion=-9, name=-8
             )
 
+        row = self._get_df().iloc[rows[0]]
         paired = self.to_PairedGenomicRanges(
-            conv_table.iloc[0], self.version1, self.version2, 
-            conv_table.iloc[0].name)
+            row, self.version1, self.version2, row.name)
 
         # Return converted coordinates
         return paired.convert_range(query_version, query_coord)
 
     @staticmethod
     def from_query_strs_to_query_coords(query_strs):
-        return list(map(GenomicRange.from_str, query_strs))
+        return GenomicRangeArray.from_strs(query_strs)
         
     def convert_coordinates(self, query_version, query_coords):
+        if isinstance(query_coords, GenomicRangeArray):
+            yield from self.convert_arrays(query_version, query_coords)\
+                .iter_pairs()
+            return
         for query_coord in query_coords:
             yield self.convert_coordinate(query_version, query_coord)
 
-    def from_querys_to_DataFrame(self, query_version, query_strs):
-        query_coords = self.from_query_strs_to_query_coords(query_strs)
+    def convert_arrays(self, query_version, chromosomes, starts=None, ends=None):
+        """ Converts many query ranges at once and returns ConversionResult.
+        This gives the same coordinates as convert_coordinate but does not 
+        create any object per query.
 
-        concat_list = [
-            pair.to_Series() for pair in 
-            self.convert_coordinates(query_version, query_coords)
-        ]
+        Parameters
+        ----------
+        query_version: str, int or tuple
+        chromosomes: array-like, GenomicRangeArray or pandas.DataFrame
+            Chromosome names of queries. A GenomicRangeArray or a DataFrame 
+            with "chromosome", "start" and "end" columns can be passed 
+            instead of three arrays.
+        starts: array-like of int
+        ends: array-like of int
+
+        Return
+        ------
+        ConversionResult object
+        """
+        if is_DataFrame(chromosomes):
+            chromosomes, starts, ends = chromosomes['chromosome'], \
+                chromosomes['start'], chromosomes['end']
+        if isinstance(chromosomes, GenomicRangeArray):
+            query_coords = chromosomes
+        else:
+            query_coords = GenomicRangeArray(chromosomes, starts, ends)
+
+        rows = self.get_interval_index(query_version).lookup_codes(
+            query_coords.codes, query_coords.categories, 
+            query_coords.starts, query_coords.ends)
+
+        return self.to_ConversionResult(query_version, query_coords, rows)
+
+    def convert_sorted(self, query_version, chromosomes, starts=None, 
+                       ends=None, assume_sorted=None):
+        """ Same as convert_arrays but walks queries sorted by chromosome and 
+        start (e.g. from BED or GFF files) together with the sorted segments 
+        (see IntervalIndex.lookup_sorted).
+
+        Parameters
+        ----------
+        assume_sorted: bool or None
+            If None, queries are checked and converted by convert_arrays 
+            when they are not sorted. If True, queries are not checked. If 
+            False, convert_arrays is used.
+        
+        See convert_arrays for the other parameters.
+        """
+        if is_DataFrame(chromosomes):
+            chromosomes, starts, ends = chromosomes['chromosome'], \
+                chromosomes['start'], chromosomes['end']
+        if isinstance(chromosomes, GenomicRangeArray):
+            query_coords = chromosomes
+        else:
+            query_coords = GenomicRangeArray(chromosomes, starts, ends)
+
+        index = self.get_interval_index(query_version)
+        if assume_sorted is None:
+            assume_sorted = index.is_sorted(
+                query_coords.codes, query_coords.starts)
+        if not assume_sorted:
+            return self.convert_arrays(query_version, query_coords)
+
+        rows = index.lookup_sorted(
+            query_coords.codes, query_coords.categories, 
+            query_coords.starts, query_coords.ends)
+
+        return self.to_ConversionResult(query_version, query_coords, rows)
+
+    def to_ConversionResult(self, query_version, query_coords, rows):
+        """ Returns ConversionResult for a GenomicRangeArray of queries and 
+        rows returned by IntervalIndex.lookup. """
+        query_chr = query_coords.chromosomes
+        query_start = query_coords.starts
+        query_end = query_coords.ends
+
+        match_version = self.get_another_version(query_version)
+        found = np.flatnonzero(rows >= 0)
+        matched = rows[found]
+
+        _, seg_start, _ = self.get_arrays(query_version)
+        match_chr, match_start, match_end = self.get_arrays(match_version)
+        inversion = self.get_inversions()[matched]
+
+        # Offsets of query start and end from the start of the segment
+        start_ix = query_start[found] - seg_start[matched]
+        end_ix = query_end[found] - seg_start[matched]
+
+        ref_chr = rows.astype(object)
+        ref_chr[found] = match_chr[matched]
+        ref_start = rows.copy()
+        ref_start[found] = np.where(inversion, 
+            match_end[matched] - end_ix, match_start[matched] + start_ix)
+        ref_end = rows.copy()
+        ref_end[found] = np.where(inversion, 
+            match_end[matched] - start_ix, match_start[matched] + end_ix)
+
+        is_inversion = np.full(len(rows), -9, dtype=np.int8)
+        is_inversion[found] = inversion
+        name = rows.astype(object)
+        name[found] = self.get_names()[matched]
+
+        return ConversionResult(
+            query_version, match_version,
+            query_chromosome=query_chr, query_start=query_start, 
+            query_end=query_end, ref_chromosome=ref_chr, ref_start=ref_start, 
+            ref_end=ref_end, is_inversion=is_inversion, name=name,
+            conversion_code=self.get_conversion_codes(
+                rows, query_chr, query_start, ref_chr, ref_start)
+        )
+
+    def convert_positions(self, query_version, chromosomes, positions):
+        """ Converts single positions (e.g. SNPs) and returns PositionResult 
+        of arrays: converted chromosome and position, is_inversion (1, 0 or 
+        -9), the row of the segment (-9 if not found, -8 if multiple) and 
+        conversion_code. Positions are mapped by their offset from the 
+        start of the segment, or from its end on inversions.
+
+        Parameters
+        ----------
+        query_version: str, int or tuple
+        chromosomes: array-like
+        positions: array-like of int
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        codes, categories = factorize(chromosomes)
+        rows = self.get_interval_index(query_version).lookup_codes(
+            codes, categories, positions, positions)
 
-        return pd.concat(concat_list, axis=1).T
+        match_version = self.get_another_version(query_version)
+        found = np.flatnonzero(rows >= 0)
+        matched = rows[found]
+
+        _, seg_start, _ = self.get_arrays(query_version)
+        match_chr, match_start, match_end = self.get_arrays(match_version)
+        inversion = self.get_inversions()[matched]
+        offset = positions[found] - seg_start[matched]
+
+        ref_chr = rows.astype(object)
+        ref_chr[found] = match_chr[matched]
+        ref_pos = rows.copy()
+        ref_pos[found] = np.where(
+            inversion, match_end[matched] - offset, match_start[matched] + offset)
+        is_inversion = np.full(len(rows), -9, dtype=np.int8)
+        is_inversion[found] = inversion
+
+        return PositionResult(
+            ref_chr, ref_pos, is_inversion, rows, 
+            self.get_conversion_codes(
+                rows, object_array(categories)[codes], positions, ref_chr, 
+                ref_pos)
+        )
+
+    @staticmethod
+    def get_conversion_codes(rows, query_chr, query_start, ref_chr, ref_start):
+        """ Returns conversion codes (see get_conversion_codes) for the 
+        results of IntervalIndex.lookup. """
+        return get_conversion_codes(
+            query_chr, query_start, ref_chr, ref_start, 
+            rows == IntervalIndex.MULTIPLE)
+
+    def convert_strs(self, query_version, query_strs):
+        """ Converts query strings (see GenomicRange.from_str) and returns 
+        ConversionResult in the order of query_strs. Identical strings are 
+        parsed and converted only once and their results are copied to all 
+        positions. """
+        codes, uniques = factorize(query_strs)
+        query_coords = self.from_query_strs_to_query_coords(uniques)
+        result = self.convert_arrays(query_version, query_coords)
+        if len(uniques) == len(codes):
+            return result
+
+        return result.take(codes)
+
+    def from_querys_to_DataFrame(self, query_version, query_strs):
+        """ Returns a DataFrame with one row per query string (see 
+        ConversionResult.to_paired_DataFrame for columns and dtypes). """
+        return self.convert_strs(query_version, query_strs)\
+            .to_paired_DataFrame()
+
+    def __len__(self):
+        if self._df is None:
+            return len(self._columns['is_inversion'])
+        return len(self._df.index)
                 
     def __repr__(self):
         return '<{name}: {desc} (versions {v1} and {v2}; {size} records)>'.format(
@@ -448,3 +1700,298 @@ class ConvertCoordinates(Database):
             v1=self.version1, v2=self.version2,
             size=self.__len__()
         )
+
+class ConversionResult(Mapping):
+    """ Columnar result of a batch conversion. Each column is a NumPy array 
+    whose i-th element belongs to the i-th query. Unresolved queries have -9
+    (not found) or -8 (multiple segments found) in the reference columns,
+    is_inversion and name like PairedGenomicRanges. len() returns the number 
+    of queries. """
+    column_names = (
+        'query_chromosome', 'query_start', 'query_end', 
+        'ref_chromosome', 'ref_start', 'ref_end', 
+        'is_inversion', 'name', 'conversion_code'
+    )
+
+    def __init__(self, query_version, ref_version, **columns):
+        self.query_version = query_version
+        self.ref_version = ref_version
+        self._columns = {name: columns[name] for name in self.column_names}
+
+    @staticmethod
+    def concat(results):
+        """ Returns a ConversionResult that contains all queries of given 
+        ConversionResult objects in order. Versions are taken from the first 
+        one. """
+        results = list(results)
+        return ConversionResult(
+            results[0].query_version, results[0].ref_version,
+            **{
+                name: np.concatenate([res[name] for res in results])
+                for name in ConversionResult.column_names
+            }
+        )
+
+    def take(self, indices):
+        """ Returns a ConversionResult with the results at given positions 
+        (e.g. to expand results of unique queries to all queries). """
+        return ConversionResult(
+            self.query_version, self.ref_version,
+            **{name: self[name][indices] for name in self.column_names}
+        )
+
+    def to_PairedGenomicRanges(self, i):
+        """ Returns the i-th result as PairedGenomicRanges object. """
+        is_inversion = int(self['is_inversion'][i])
+        return PairedGenomicRanges(
+            keys=[self.query_version, self.ref_version],
+            ranges=[
+                GenomicRange(self['query_chromosome'][i], 
+                    int(self['query_start'][i]), int(self['query_end'][i])),
+                GenomicRange(self['ref_chromosome'][i],
+                    int(self['ref_start'][i]), int(self['ref_end'][i]))
+            ],
+            is_inversion=bool(is_inversion) if is_inversion >= 0 else -9,
+            name=self['name'][i]
+        )
+
+    def iter_pairs(self):
+        for i in range(self.__len__()):
+            yield self.to_PairedGenomicRanges(i)
+
+    def to_DataFrame(self):
+        import pandas as pd
+        return pd.DataFrame(self._columns, columns=list(self.column_names))
+
+    def to_paired_DataFrame(self):
+        """ Returns a DataFrame with "v{version}_chr", "v{version}_start" and 
+        "v{version}_end" columns for the query and reference versions and 
+        "is_inversion", indexed by segment names (see 
+        PairedGenomicRanges.to_Series). Chromosomes are categorical, starts 
+        and ends are int64 (-9 or -8 for unresolved queries) and 
+        is_inversion is a nullable boolean (NA for unresolved queries). """
+        import pandas as pd
+        def categorical(values):
+            codes, uniques = factorize(values)
+            return pd.Categorical.from_codes(
+                codes, categories=pd.Index(object_array(uniques)))
+
+        inversion = self._columns['is_inversion']
+        return pd.DataFrame(
+            {
+                f'v{self.query_version}_chr': 
+                    categorical(self._columns['query_chromosome']),
+                f'v{self.query_version}_start': self._columns['query_start'],
+                f'v{self.query_version}_end': self._columns['query_end'],
+                f'v{self.ref_version}_chr': 
+                    categorical(self._columns['ref_chromosome']),
+                f'v{self.ref_version}_start': self._columns['ref_start'],
+                f'v{self.ref_version}_end': self._columns['ref_end'],
+                'is_inversion': pd.arrays.BooleanArray(
+                    inversion == 1, inversion < 0),
+            },
+            index=pd.Index(self._columns['name'].tolist())
+        )
+
+    def __len__(self):
+        return len(self._columns['query_start'])
+
+    def __iter__(self):
+        return iter(self.column_names)
+
+    def __getitem__(self, key):
+        return self._columns[key]
+
+    def __repr__(self):
+        return '<{name}: version {qv} to {rv} ({size} queries)>'.format(
+            name=type(self).__name__, qv=self.query_version, 
+            rv=self.ref_version, size=self.__len__()
+        )
+
+class MapPatch(object):
+    """ Edits to a mapping table between version1 and version2: deletions, 
+    replacements and insertions of segments identified by row names. A 
+    segment is a tuple of (v{version1}_chr, v{version1}_start, 
+    v{version1}_end, v{version2}_chr, v{version2}_start, v{version2}_end, 
+    is_inversion). A name can be edited only once in a patch. See 
+    ConvertCoordinates.apply_patch and read.write_patch for the file format.
+    """
+    def __init__(self, version1, version2):
+        self.version1, self.version2 = version1, version2
+        self.deletions = []
+        self.replacements = OrderedDict()
+        self.insertions = OrderedDict()
+
+    def check_name(self, name):
+        assert name not in self.deletions and name not in self.replacements \
+            and name not in self.insertions, \
+            f'Segment {name} is already edited in this patch.'
+
+    def delete(self, name):
+        self.check_name(name)
+        self.deletions.append(name)
+
+    def replace(self, name, segment):
+        self.check_name(name)
+        self.replacements[name] = self.check_segment(segment)
+
+    def insert(self, name, segment):
+        self.check_name(name)
+        self.insertions[name] = self.check_segment(segment)
+
+    @staticmethod
+    def check_segment(segment):
+        assert len(segment) == 7, \
+            f'A segment needs 7 values but {len(segment)} were given.'
+        chr1, start1, end1, chr2, start2, end2, is_inversion = segment
+        assert is_inversion in ('+', '-'), \
+            f'is_inversion must be "+" or "-": "{is_inversion}" was given.'
+        return (chr1, int(start1), int(end1), chr2, int(start2), int(end2), 
+                is_inversion)
+
+    def to_columns(self, segments):
+        """ Returns a dict of columns for a list of segments (see 
+        ConvertCoordinates.to_segment_columns). """
+        segments = list(segments)
+        names = [
+            f'v{version}_{field}' for version in (self.version1, self.version2)
+            for field in ('chr', 'start', 'end')] + ['is_inversion']
+        values = list(zip(*segments)) if segments else [()] * len(names)
+        return {
+            name: object_array(list(column)) for name, column in zip(names, values)
+        }
+
+    def __len__(self):
+        return len(self.deletions) + len(self.replacements) \
+            + len(self.insertions)
+
+    def __repr__(self):
+        return '<{name}: versions {v1} and {v2}; {d} deletions, ' \
+            '{r} replacements, {i} insertions>'.format(
+                name=type(self).__name__, v1=self.version1, v2=self.version2,
+                d=len(self.deletions), r=len(self.replacements),
+                i=len(self.insertions))
+
+class ConvertCoordinatesChain(Sequence):
+    """ Sequence of ConvertCoordinates objects in which neighbouring maps 
+    share a version, e.g. maps of versions 4 and 5 and of 5 and 6. Ranges 
+    can be converted between any two versions of the chain either hop by hop 
+    (convert_arrays) or through a composed map (compose), which needs only 
+    one lookup per query. Composed maps are kept in the object and can be 
+    written with read.write_compiled_map.
+    """
+    def __init__(self, maps, description=''):
+        self.maps = list(maps)
+        self.description = description
+        if not self.maps:
+            raise Exception('At least one ConvertCoordinates is required.')
+
+        first = self.maps[0]
+        if len(self.maps) > 1 and \
+                first.version1 in (self.maps[1].version1, self.maps[1].version2):
+            self.versions = [first.version2, first.version1]
+        else:
+            self.versions = [first.version1, first.version2]
+        for cc in self.maps[1:]:
+            self.versions.append(cc.get_another_version(self.versions[-1]))
+
+        self._composed = {}
+
+    def get_hops(self, query_version, ref_version):
+        """ Returns a list of (ConvertCoordinates, version) tuples to convert 
+        query_version to ref_version, where version is the query version of 
+        each hop. """
+        try:
+            i = self.versions.index(query_version)
+            j = self.versions.index(ref_version)
+        except ValueError:
+            raise Exception(f'Please input versions in {self.versions}.')
+        if i == j:
+            raise Exception('Query and reference versions are the same.')
+
+        if i < j:
+            return [(self.maps[k], self.versions[k]) for k in range(i, j)]
+        return [(self.maps[k-1], self.versions[k]) for k in range(i, j, -1)]
+
+    def compose(self, query_version, ref_version):
+        """ Returns ConvertCoordinates that maps query_version to ref_version 
+        directly (see ConvertCoordinates.compose). The result is cached. """
+        key = (query_version, ref_version)
+        if key not in self._composed:
+            hops = self.get_hops(query_version, ref_version)
+            cc = hops[0][0]
+            for other, _ in hops[1:]:
+                cc = cc.compose(other, self.description)
+            self._composed[key] = cc
+
+        return self._composed[key]
+
+    def convert_arrays(self, query_version, ref_version, chromosomes, 
+                       starts=None, ends=None):
+        """ Converts query ranges from query_version to ref_version hop by hop 
+        and returns ConversionResult. A query that is not found (-9) or found 
+        in multiple segments (-8) in a hop is not converted further. The 
+        inversion flag is True if the range was inverted an odd number of 
+        times and name is the row name in the last map. """
+        if isinstance(chromosomes, GenomicRangeArray):
+            query_coords = chromosomes
+        else:
+            query_coords = GenomicRangeArray(chromosomes, starts, ends)
+
+        n = len(query_coords)
+        status = np.zeros(n, dtype=np.int64)
+        inversion = np.zeros(n, dtype=bool)
+        alive = np.arange(n)
+        coords = query_coords
+        for cc, version in self.get_hops(query_version, ref_version):
+            res = cc.convert_arrays(version, coords)
+            ok = res['conversion_code'] < 4
+            status[alive[~ok]] = res['ref_start'][~ok]
+            alive = alive[ok]
+            inversion[alive] ^= res['is_inversion'][ok].astype(bool)
+            name = res['name'][ok]
+            coords = GenomicRangeArray(res['ref_chromosome'][ok], 
+                res['ref_start'][ok], res['ref_end'][ok])
+
+        ref_chr = status.astype(object)
+        ref_chr[alive] = coords.chromosomes
+        ref_start = status.copy()
+        ref_start[alive] = coords.starts
+        ref_end = status.copy()
+        ref_end[alive] = coords.ends
+        is_inversion = np.full(n, -9, dtype=np.int8)
+        is_inversion[alive] = inversion[alive]
+        names = status.astype(object)
+        names[alive] = name
+
+        query_chr = query_coords.chromosomes
+        return ConversionResult(
+            query_version, ref_version,
+            query_chromosome=query_chr, query_start=query_coords.starts,
+            query_end=query_coords.ends, ref_chromosome=ref_chr, 
+            ref_start=ref_start, ref_end=ref_end, is_inversion=is_inversion, 
+            name=names,
+            conversion_code=ConvertCoordinates.get_conversion_codes(
+                status, query_chr, query_coords.starts, ref_chr, ref_start)
+        )
+
+    def convert_coordinate(self, query_version, ref_version, query):
+        """ Returns PairedGenomicRanges for a query string or GenomicRange 
+        converted hop by hop. """
+        if isinstance(query, str):
+            query = GenomicRange.from_str(query)
+        return self.convert_arrays(
+            query_version, ref_version, [query.chromosome], [query.start], 
+            [query.end]).to_PairedGenomicRanges(0)
+
+    def __len__(self):
+        return len(self.maps)
+
+    def __getitem__(self, index):
+        return self.maps[index]
+
+    def __repr__(self):
+        return '<{name}: {desc} (versions {versions})>'.format(
+            name=type(self).__name__, desc=self.description, 
+            versions=' -> '.join(map(str, self.versions))
+        )
@@ -1,6 +1,28 @@
-import pandas as pd
+import os
+import csv
+import numpy as np
+from .classes import GenomicRangeArray, factorize, object_array, \
+    get_conversion_codes
+from .instrument import CODE_NAMES
+
+def from_GenomicRange_list_to_DataFrame(gen_coord_list, version=None):
+    """ Returns a DataFrame with chromosome, start, end and version columns 
+    for GenomicRange objects or a GenomicRangeArray. If version is None, the 
+    version attribute of each range (or of the GenomicRangeArray) is used. 
+    """
+    import pandas as pd
+    if isinstance(gen_coord_list, GenomicRangeArray):
+        # Columns are taken from the arrays without creating GenomicRange
+        return pd.DataFrame(
+            {
+                'chromosome': gen_coord_list.chromosomes,
+                'start': gen_coord_list.starts,
+                'end': gen_coord_list.ends,
+                'version': gen_coord_list.version if version is None 
+                    else version
+            }
+        )
 
-def from_GenomicRange_list_to_DataFrame(gen_coord_list):
     chr_list = []
     start_list = []
     end_list = []
@@ -10,7 +32,8 @@ def from_GenomicRange_list_to_DataFrame(gen_coord_list):
         chr_list.append(gen_coord.chromosome)
         start_list.append(gen_coord.start)
         end_list.append(gen_coord.end)
-        version_list.append(gen_coord.version)
+        version_list.append(
+            gen_coord.version if version is None else version)
 
     return pd.DataFrame(
         {
@@ -21,62 +44,343 @@ def from_GenomicRange_list_to_DataFrame(gen_coord_list):
         }
     )
 
-def from_PairedGenomicRanges_to_DataFrame(paired_gen_coord):
-    matched_df = from_GenomicRange_list_to_DataFrame(
-        paired_gen_coord.reference)
-    
-    matched_df.rename(
-        columns={
-            'chromosome': 'ref_chromosome',
-            'start': 'ref_start',
-            'end': 'ref_end',
-            'version': 'ref_version'
-        }, 
-        inplace=True)
-    
-    matched_df['query_chromosome'] = paired_gen_coord.query.chromosome
-    matched_df['query_start'] = paired_gen_coord.query.start
-    matched_df['query_end'] = paired_gen_coord.query.end
-    matched_df['query_version'] = paired_gen_coord.query.version
-
-    code = 0
-    if len(matched_df.index) == 1:
-        # If query coord was found in conversion table
-        if paired_gen_coord.reference[0].start != -9:
-            # If segment coordinate changed to different chromosome
-            if paired_gen_coord.query.chromosome != \
-                    paired_gen_coord.reference[0].chromosome:
-                code += 1
-            # If segment coordinate was different on the same chromosome
-            elif paired_gen_coord.query.start != \
-                    paired_gen_coord.reference[0].start:
-                code += 2
-
-        # If query segment coord was not found in conversion table
-        else:
-            code += 4
+def from_PairedGenomicRanges_list_to_columns(paired_gen_coord_list, 
+                                             first_pair_id=1):
+    """ Returns a dict of output columns (see ResultWriter.columns_order) 
+    for PairedGenomicRanges objects (or objects accepted by unpack_pair) 
+    and the number of pairs. Rows are collected in one pass and conversion 
+    codes are computed over whole columns by get_conversion_codes. """
+    rows = []
+    multiple = []
+    pair_ids = []
+    n_pairs = 0
+    for i, paired_gen_coord in enumerate(paired_gen_coord_list):
+        query, query_version, references, is_multiple = \
+            unpack_pair(paired_gen_coord)
+        for ref, ref_version in references:
+            rows.append((
+                query.chromosome, query.start, query.end, query_version,
+                ref.chromosome, ref.start, ref.end, ref_version))
+            multiple.append(is_multiple)
+            pair_ids.append(first_pair_id + i)
+        n_pairs = i + 1
+
+    columns = ResultWriter.columns_order[:-2]
+    data = dict(zip(columns, map(list, zip(*rows)) if rows else 
+                    [[] for _ in columns]))
+    data['conversion_code'] = get_conversion_codes(
+        object_array(data['query_chromosome']), data['query_start'], 
+        object_array(data['ref_chromosome']), data['ref_start'], multiple)
+    data['pair_id'] = np.array(pair_ids, dtype=np.int64)
+
+    return data, n_pairs
 
-    # If multiple segments found
-    elif len(matched_df.index) > 1:
-        code += 8
+def concat_list_of_PairedGenomicRanges_to_DataFrame(paired_gen_coord_list):
+    """ Returns a DataFrame with the columns of ResultWriter.columns_order 
+    and one row per converted range of PairedGenomicRanges objects (see 
+    from_PairedGenomicRanges_list_to_columns). """
+    import pandas as pd
+    data, _ = from_PairedGenomicRanges_list_to_columns(paired_gen_coord_list)
+    data['conversion_code'] = data['conversion_code'].astype(np.int64)
+
+    return pd.DataFrame(data)
+
+def from_ConversionResult_to_DataFrame(result, first_pair_id=1):
+    """ Returns a DataFrame in the same format as 
+    concat_list_of_PairedGenomicRanges_to_DataFrame for a ConversionResult 
+    object. pair_id starts from first_pair_id, so that results of 
+    consecutive chunks can be numbered continuously. """
+    import pandas as pd
+    n = len(result)
+
+    return pd.DataFrame(
+        {
+            'query_chromosome': result['query_chromosome'],
+            'query_start': result['query_start'],
+            'query_end': result['query_end'],
+            'query_version': result.query_version,
+            'ref_chromosome': result['ref_chromosome'],
+            'ref_start': result['ref_start'],
+            'ref_end': result['ref_end'],
+            'ref_version': result.ref_version,
+            'conversion_code': result['conversion_code'],
+            'pair_id': range(first_pair_id, first_pair_id + n),
+        }, 
+        index=range(first_pair_id - 1, first_pair_id - 1 + n)
+    )
 
-    matched_df['conversion_code'] = code
+class ResultWriter(object):
+    """ Writes conversion results to a CSV file in the same format as 
+    concat_list_of_PairedGenomicRanges_to_DataFrame(...).to_csv(). Rows are 
+    appended into preallocated column buffers and the buffers are written 
+    out every chunksize rows, so the whole result is never held in memory.
 
+    Parameters
+    ----------
+    out_csv_path: str
+        A path to an output file. 
+    chunksize: int
+        Number of rows kept in buffers before they are written.
+    sep: str
+        Field delimiter (e.g. "\\t" for TSV).
+    index: bool
+        If True, the row number is written in the first column like 
+        DataFrame.to_csv.
+    """
     columns_order = [
         'query_chromosome', 'query_start', 'query_end', 'query_version',
         'ref_chromosome', 'ref_start', 'ref_end', 'ref_version', 
-        'conversion_code'
+        'conversion_code', 'pair_id'
     ]
+    dtypes = {
+        'query_chromosome': object, 'query_start': np.int64, 
+        'query_end': np.int64, 'query_version': object,
+        'ref_chromosome': object, 'ref_start': np.int64, 
+        'ref_end': np.int64, 'ref_version': object, 
+        'conversion_code': np.int8, 'pair_id': np.int64
+    }
 
-    return matched_df.loc[:, columns_order]
+    def __init__(self, out_csv_path, chunksize=100000, sep=',', index=True):
+        self.out_csv_path = out_csv_path
+        self.index = index
+        self.init_buffers(chunksize)
 
-def concat_list_of_PairedGenomicRanges_to_DataFrame(paired_gen_coord_list):
-    concat_list = []
+        self._file = open(out_csv_path, 'w', newline='')
+        self._writer = csv.writer(self._file, delimiter=sep)
+        self._writer.writerow(
+            ([''] if index else []) + self.columns_order)
 
-    for i, paired_gen_coord in enumerate(paired_gen_coord_list):
-        tmp_df = from_PairedGenomicRanges_to_DataFrame(paired_gen_coord)
-        tmp_df['pair_id'] = i+1
+    def init_buffers(self, chunksize):
+        self.chunksize = chunksize
+        self.buffers = {
+            col: np.empty(chunksize, dtype=self.dtypes[col]) 
+            for col in self.columns_order
+        }
+        self.size = 0         # Number of rows in buffers
+        self.row_count = 0    # Number of rows already written
+        self.pair_count = 0   # Number of pairs appended so far
+
+    def append(self, paired_gen_coord):
+        """ Appends rows for a PairedGenomicRanges object. """
+        self.extend([paired_gen_coord])
+
+    def extend(self, paired_gen_coord_list):
+        """ Appends rows for PairedGenomicRanges objects. """
+        columns, n_pairs = from_PairedGenomicRanges_list_to_columns(
+            paired_gen_coord_list, first_pair_id=self.pair_count + 1)
+        self.pair_count += n_pairs
+        self.append_columns(columns)
+
+    def append_result(self, result):
+        """ Appends all rows of a ConversionResult object. One row is 
+        written per query. """
+        self.append_columns({
+            'query_chromosome': result['query_chromosome'],
+            'query_start': result['query_start'],
+            'query_end': result['query_end'],
+            'query_version': result.query_version,
+            'ref_chromosome': result['ref_chromosome'],
+            'ref_start': result['ref_start'],
+            'ref_end': result['ref_end'],
+            'ref_version': result.ref_version,
+            'conversion_code': result['conversion_code'],
+            'pair_id': np.arange(
+                self.pair_count + 1, self.pair_count + len(result) + 1),
+        })
+        self.pair_count += len(result)
+
+    def append_columns(self, columns):
+        """ Appends rows given as a dict of columns keyed by the names in 
+        columns_order. Scalars are repeated for all rows. """
+        n_rows = len(columns['pair_id'])
+        done = 0
+        while done < n_rows:
+            if self.size == self.chunksize:
+                self.flush()
+            n = min(self.chunksize - self.size, n_rows - done)
+            for col, values in columns.items():
+                if isinstance(values, (np.ndarray, list)):
+                    values = values[done:done+n]
+                self.buffers[col][self.size:self.size+n] = values
+            self.size += n
+            done += n
+
+    def flush(self):
+        """ Writes buffered rows to the output file. """
+        columns = [
+            self.buffers[col][:self.size].tolist() 
+            for col in self.columns_order
+        ]
+        if self.index:
+            columns.insert(
+                0, range(self.row_count, self.row_count + self.size))
+        self._writer.writerows(zip(*columns))
+
+        self.row_count += self.size
+        self.size = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return '<{name}: {path} ({size} rows)>'.format(
+            name=type(self).__name__, path=self.out_csv_path, 
+            size=self.row_count + self.size
+        )
+
+class ArrowResultWriter(ResultWriter):
+    """ Writes conversion results to a Parquet file or an Arrow IPC 
+    (Feather version 2) file with the columns of ResultWriter (without the 
+    index column). Buffers are written as one record batch (a row group in 
+    Parquet) every chunksize rows. Chromosome and version columns are 
+    dictionary-encoded with one dictionary per column that grows across 
+    batches. Arrow IPC files are not compressed, so they can be read with 
+    pyarrow.memory_map without copying. Requires pyarrow.
+
+    Parameters
+    ----------
+    out_path: str
+        A path to an output file. 
+    out_format: str
+        "parquet", "feather" or "arrow" ("feather" and "arrow" are the same 
+        Arrow IPC file format).
+    chunksize: int
+        Number of rows in a record batch.
+    """
+    dictionary_columns = [
+        'query_chromosome', 'query_version', 'ref_chromosome', 'ref_version'
+    ]
+    formats = ['parquet', 'feather', 'arrow']
+
+    def __init__(self, out_path, out_format='parquet', chunksize=100000):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError(
+                f'pyarrow is required to write {out_format} files.')
+        if out_format not in self.formats:
+            raise Exception(f'Unknown format: {out_format}. Please input '\
+                f'one of {", ".join(self.formats)}.')
+
+        self.out_csv_path = out_path
+        self.out_format = out_format
+        self.init_buffers(chunksize)
+        self._dictionaries = {col: {} for col in self.dictionary_columns}
+        self.schema = pa.schema([
+            pa.field(col, pa.dictionary(pa.int32(), pa.string()) 
+                     if col in self.dictionary_columns else 
+                     pa.from_numpy_dtype(self.dtypes[col]))
+            for col in self.columns_order
+        ])
+
+        if out_format == 'parquet':
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(out_path, self.schema)
+        else:
+            import pyarrow.ipc as ipc
+            self._writer = ipc.new_file(
+                out_path, self.schema, 
+                options=ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+        self._closed = False
+
+    def encode(self, col, values):
+        """ Returns a DictionaryArray for values of a dictionary column. 
+        Values are converted to str and new values are appended to the 
+        dictionary of the column, so earlier codes stay valid. """
+        import pyarrow as pa
+        lookup = self._dictionaries[col]
+        codes, uniques = factorize(values)
+        mapping = np.array(
+            [lookup.setdefault(str(u), len(lookup)) for u in uniques], 
+            dtype=np.int32)
+
+        return pa.DictionaryArray.from_arrays(
+            pa.array(mapping[codes] if len(codes) else codes.astype(np.int32), 
+                     type=pa.int32()), 
+            pa.array(list(lookup), type=pa.string()))
+
+    def flush(self):
+        """ Writes buffered rows as a record batch. """
+        if self.size == 0:
+            return
+        import pyarrow as pa
+        arrays = [
+            self.encode(col, self.buffers[col][:self.size]) 
+            if col in self.dictionary_columns else
+            pa.array(self.buffers[col][:self.size])
+            for col in self.columns_order
+        ]
+        self._writer.write_batch(
+            pa.record_batch(arrays, schema=self.schema))
+
+        self.row_count += self.size
+        self.size = 0
+
+    def close(self):
+        if not self._closed:
+            self.flush()
+            self._writer.close()
+            self._closed = True
+
+OUTPUT_FORMATS = {
+    '.csv': 'csv', '.tsv': 'tsv', '.txt': 'csv', 
+    '.parquet': 'parquet', '.pq': 'parquet', 
+    '.feather': 'feather', '.arrow': 'arrow', '.ipc': 'arrow',
+}
+
+def get_ResultWriter(out_path, out_format=None, chunksize=100000, sep=','):
+    """ Returns ResultWriter or ArrowResultWriter for an output format: 
+    "csv", "tsv", "parquet", "feather" or "arrow". If out_format is None, 
+    it is inferred from the extension of out_path (CSV by default). sep is 
+    the delimiter of CSV output. """
+    if out_format is None:
+        ext = os.path.splitext(out_path)[1].lower()
+        out_format = OUTPUT_FORMATS.get(ext, 'csv')
+
+    if out_format == 'csv':
+        return ResultWriter(out_path, chunksize, sep=sep)
+    elif out_format == 'tsv':
+        return ResultWriter(out_path, chunksize, sep='\t')
+    return ArrowResultWriter(out_path, out_format, chunksize)
+
+def summarize_conversion_codes(result, by='query_chromosome'):
+    """ Returns a DataFrame with the number of rows of each conversion code 
+    (columns named as in instrument.CODE_NAMES, plus "total") for each value 
+    of a column (e.g. "query_chromosome" or "ref_chromosome"). result can 
+    be a ConversionResult or a DataFrame with the columns of ResultWriter. 
+    Rows are in order of first appearance. """
+    import pandas as pd
+    codes = np.asarray(result['conversion_code'], dtype=np.int64)
+    keys, uniques = factorize(np.asarray(result[by]))
+    counts = np.bincount(
+        keys * 9 + codes, minlength=len(uniques) * 9).reshape(-1, 9)
+
+    table = pd.DataFrame(
+        counts[:, list(CODE_NAMES)], columns=list(CODE_NAMES.values()), 
+        index=pd.Index(uniques, name=by))
+    table['total'] = counts.sum(axis=1)
+    return table
 
-        concat_list.append(tmp_df)
+def unpack_pair(paired_gen_coord):
+    """ Returns the query, its version, a list of (reference, version) and 
+    whether the query was found in multiple segments for a 
+    PairedGenomicRanges object. Objects with a query GenomicRange and a 
+    list of reference GenomicRanges (with versions) as query and reference 
+    attributes are also accepted. """
+    if hasattr(paired_gen_coord, 'reference'):
+        query = paired_gen_coord.query
+        references = [(ref, ref.version) for ref in paired_gen_coord.reference]
+        return query, query.version, references, len(references) > 1
 
-    return pd.concat(concat_list).reset_index(drop=True)
+    query, ref = paired_gen_coord.ranges
+    query_version, ref_version = paired_gen_coord.keys
+    # PairedGenomicRanges marks multiple matches by -8
+    return query, query_version, [(ref, ref_version)], ref.start == -8
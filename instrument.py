@@ -0,0 +1,179 @@
+""" Opt-in instrumentation of conversion runs. RunStats records wall time 
+per stage, the number of queries and counts of conversion codes, and sends a 
+summary to sinks when the run finishes.
+
+Sinks are callables that receive the summary dict. LogSink writes a log 
+line and JSONSink writes a JSON file; any other function can be used as a 
+callback. NULL_STATS has the same interface and does nothing, so code can 
+be instrumented unconditionally at almost no cost.
+"""
+import json
+import time
+import logging
+import numpy as np
+from contextlib import contextmanager
+from collections import OrderedDict
+
+# Names of conversion codes (see ConvertCoordinates.get_conversion_codes)
+CODE_NAMES = OrderedDict([
+    (0, 'same'), (1, 'chromosome_changed'), (2, 'shifted'), 
+    (4, 'not_found'), (8, 'multiple'),
+])
+
+class RunStats(object):
+    """ Records wall time per stage and counts of queries and conversion 
+    codes. 
+
+    Parameters
+    ----------
+    sinks: list
+        Callables that receive the summary dict (see summary) when emit is 
+        called, e.g. LogSink(), JSONSink(path) or print.
+    """
+    enabled = True
+
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+        self.stages = OrderedDict()
+        self.n_queries = 0
+        self.code_counts = OrderedDict((code, 0) for code in CODE_NAMES)
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """ Context manager that adds wall time of its block to a stage. """
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t)
+
+    def add_time(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def iter_stage(self, name, iterable):
+        """ Yields items of iterable, adding the time spent to produce each 
+        item (e.g. reading a chunk of queries) to a stage. """
+        iterator = iter(iterable)
+        while True:
+            t = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(name, time.perf_counter() - t)
+                return
+            self.add_time(name, time.perf_counter() - t)
+            yield item
+
+    def count_result(self, result):
+        """ Counts queries and conversion codes of a ConversionResult. """
+        codes = np.asarray(result['conversion_code'])
+        self.n_queries += len(codes)
+        counts = np.bincount(codes[codes >= 0], minlength=9)
+        for code in self.code_counts:
+            self.code_counts[code] += int(counts[code])
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def summary(self):
+        """ Returns a dict with total and per-stage seconds, the number of 
+        queries, queries per second (over the conversion stage and over the 
+        whole run) and counts of conversion codes by name. 
+        
+        Stages are timed in the calling thread and do not overlap. When 
+        conversion runs in other processes (main.main with workers > 1), 
+        the convert stage only counts time spent waiting for them. """
+        elapsed = self.elapsed
+        convert = self.stages.get('convert', 0.0)
+        counts = OrderedDict(
+            (CODE_NAMES[code], n) for code, n in self.code_counts.items())
+        counts['found'] = counts['same'] + counts['chromosome_changed'] + \
+            counts['shifted']
+
+        return {
+            'seconds': elapsed,
+            'stages': dict(self.stages),
+            'n_queries': self.n_queries,
+            'convert_qps': self.n_queries / convert if convert > 0 else None,
+            'qps': self.n_queries / elapsed if elapsed > 0 else None,
+            'conversion_codes': dict(counts),
+        }
+
+    def emit(self):
+        """ Sends the summary to all sinks and returns it. """
+        summary = self.summary()
+        for sink in self.sinks:
+            sink(summary)
+        return summary
+
+    def __repr__(self):
+        return '<{name}: {n} queries, {stages}>'.format(
+            name=type(self).__name__, n=self.n_queries, 
+            stages=', '.join(f'{k} {v:.3f}s' for k, v in self.stages.items()))
+
+class _NullContext(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+class NullStats(object):
+    """ Same interface as RunStats but records nothing. """
+    enabled = False
+    _context = _NullContext()
+
+    def stage(self, name):
+        return self._context
+
+    def add_time(self, name, seconds):
+        pass
+
+    def iter_stage(self, name, iterable):
+        return iterable
+
+    def count_result(self, result):
+        pass
+
+    def summary(self):
+        return {}
+
+    def emit(self):
+        return {}
+
+    def __repr__(self):
+        return f'<{type(self).__name__}>'
+
+NULL_STATS = NullStats()
+
+def format_summary(summary):
+    """ Returns a summary dict as one line of text. """
+    stages = ' '.join(f'{k}={v:.3f}s' for k, v in summary['stages'].items())
+    codes = ' '.join(f'{k}={v}' for k, v in summary['conversion_codes'].items())
+    qps = summary['qps']
+    return f'{summary["n_queries"]} queries in {summary["seconds"]:.3f}s '\
+        f'({qps if qps is not None else 0:.0f}/s); {stages}; {codes}'
+
+class LogSink(object):
+    """ Sink that writes a summary as one log line. """
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('convert_annotation')
+        self.level = level
+
+    def __call__(self, summary):
+        self.logger.log(self.level, format_summary(summary))
+
+class JSONSink(object):
+    """ Sink that writes a summary to a JSON file, or appends it as a line 
+    if append is True. """
+    def __init__(self, path, append=False):
+        self.path = path
+        self.append = append
+
+    def __call__(self, summary):
+        with open(self.path, 'a' if self.append else 'w') as f:
+            json.dump(summary, f)
+            if self.append:
+                f.write('\n')
@@ -1,5 +1,32 @@
+import os
 from . import read
 from . import formatter
+from . import parallel
+from . import partition
+from .instrument import NULL_STATS
+
+def load_map(map_csv_path, query_version, ref_version, map_cache_path=None,
+             via=None, memory_budget=None):
+    """ Returns ConvertCoordinates for a CSV file, a compiled map directory, 
+    a UCSC chain file (".chain" or ".chain.gz"; query_version is the target 
+    assembly of the chain) or a chain of CSV files, or 
+    PartitionedConvertCoordinates for a partitioned map directory (see main 
+    for parameters). """
+    if via:
+        return read.from_CSVs_to_composed_ConvertCoordinates(
+            map_csv_path, [query_version] + list(via) + [ref_version], 
+            cache_path=map_cache_path)
+    elif partition.read_partitioned_header(map_csv_path) is not None:
+        return partition.load_partitioned_map(
+            map_csv_path, query_version, ref_version, memory_budget)
+    elif os.path.isdir(map_csv_path):
+        return read.load_compiled_map(map_csv_path, query_version, ref_version)
+    elif map_csv_path.endswith(('.chain', '.chain.gz')):
+        return read.from_chain_to_ConvertCoordinates(
+            map_csv_path, query_version, ref_version, cache_path=map_cache_path)
+    else:
+        return read.from_CSV_to_ConvertCoordinates(
+            map_csv_path, query_version, ref_version, cache_path=map_cache_path)
 
 def main(
         map_csv_path:str, 
@@ -7,14 +34,25 @@ def main(
         ref_version:str, 
         query_path:str, 
         out_csv_path:str, 
+        workers:int=1,
+        map_cache_path:str=None,
+        via:list=None,
+        sep:str=',',
+        out_format:str=None,
+        stats=None,
+        memory_budget:int=None,
         **kwargs
         ):
     """ Outputs a file with converted coordinates from a given query file. 
     
     Parameters
     ----------
-    map_csv_path: str
-        A path to a file including the corresponding coordinates. 
+    map_csv_path: str or list
+        A path to a file including the corresponding coordinates, to a 
+        compiled map directory (see read.compile_map), to a partitioned map 
+        directory (see partition.partition_map) or to a UCSC chain 
+        file from query_version to ref_version (see load_map). A list of paths can 
+        be given together with via to convert through intermediate versions.
     query_version: str, int or tuple
         A key to keep track of query data.
     ref_version: str, int or tuple
@@ -24,17 +62,70 @@ def main(
         to the reference version. 
     out_csv_path: str
         A path to an output file. 
+    workers: int
+        Number of processes for conversion. If more than 1, chunks of 
+        queries are converted in a process pool and written in the order of 
+        the query file. At most 2 * workers chunks are read ahead of the 
+        writer.
+    map_cache_path: str
+        A path to a compiled map of map_csv_path (see read.compile_map). The 
+        map is compiled there if it does not exist or is out of date.
+    via: list
+        Intermediate versions between query_version and ref_version. The 
+        i-th file of map_csv_path maps the i-th and (i+1)-th versions of 
+        [query_version] + via + [ref_version]. The maps are composed into 
+        one map before conversion (and cached at map_cache_path if given).
+    sep: str
+        Field delimiter of the output file (e.g. "\t" for TSV).
+    out_format: str
+        "csv", "tsv", "parquet", "feather" or "arrow" (see 
+        formatter.get_ResultWriter). Inferred from the extension of 
+        out_csv_path if None.
+    stats: instrument.RunStats
+        If given, wall time of stages (load_map, parse_queries, convert and 
+        write) and counts of conversion codes are recorded, and the summary 
+        is sent to its sinks at the end. If workers > 1, workers convert 
+        while the main process parses and writes, so convert is the time 
+        spent waiting for workers rather than the time spent converting.
+    memory_budget: int
+        Maximum bytes of chromosomes loaded at a time from a partitioned 
+        map (no limit if None). Ignored for other maps.
+    **kwargs:
+        Passed to read.iter_query_chunks (e.g. chunksize, expect and avoid).
     
     """
-    cc = read.from_CSV_to_ConvertCoordinates(
-        map_csv_path, query_version, ref_version)
+    if stats is None:
+        stats = NULL_STATS
+
+    with stats.stage('load_map'):
+        cc = load_map(
+            map_csv_path, query_version, ref_version, map_cache_path, via,
+            memory_budget)
 
-    querys = read.parse_query_list(query_path, **kwargs)
+    # Queries are converted and written chunk by chunk so that memory usage
+    # does not depend on the size of the query file.
+    query_chunks = stats.iter_stage(
+        'parse_queries', read.iter_query_chunks(query_path, **kwargs))
+    with formatter.get_ResultWriter(
+            out_csv_path, out_format, sep=sep) as writer:
+        def write(result):
+            stats.count_result(result)
+            with stats.stage('write'):
+                writer.append_result(result)
 
-    paired_gen_coord_list = cc.recursively_get_dmel_coordinates(
-        query_version, ref_version, querys)
+        if workers > 1:
+            with parallel.get_pool(cc, query_version, workers) as pool:
+                for result in parallel.imap_convert(
+                        pool, query_chunks, max_pending=2 * workers, 
+                        stats=stats):
+                    write(result)
+        else:
+            for querys in query_chunks:
+                with stats.stage('convert'):
+                    result = cc.convert_strs(query_version, querys)
+                write(result)
 
-    out_df = formatter.concat_list_of_PairedGenomicRanges_to_DataFrame(
-        paired_gen_coord_list)
+        with stats.stage('write'):
+            writer.flush()
 
-    out_df.to_csv(out_csv_path)
+    stats.emit()
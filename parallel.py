@@ -0,0 +1,90 @@
+""" Multi-process conversion. Worker processes receive the ConvertCoordinates
+object once when the pool starts. With the "fork" start method (default on 
+Linux) the object is not pickled and its index arrays are shared with the 
+parent process copy-on-write. """
+import multiprocessing as mp
+import numpy as np
+from collections import deque
+from .classes import ConversionResult, GenomicRangeArray
+from .instrument import NULL_STATS
+
+# ConvertCoordinates object and query version used in a worker process
+_worker_state = {}
+
+def _init_worker(cc, query_version):
+    _worker_state['cc'] = cc
+    _worker_state['query_version'] = query_version
+
+def _convert_chunk(querys):
+    cc = _worker_state['cc']
+    if isinstance(querys, GenomicRangeArray):
+        return cc.convert_arrays(_worker_state['query_version'], querys)
+
+    return cc.convert_strs(_worker_state['query_version'], querys)
+
+def get_pool(cc, query_version, workers):
+    """ Returns a multiprocessing pool whose workers convert queries with a 
+    given ConvertCoordinates object. The "fork" start method is used if the 
+    platform supports it. """
+    if 'fork' in mp.get_all_start_methods():
+        context = mp.get_context('fork')
+    else:
+        context = mp.get_context()
+
+    return context.Pool(
+        workers, initializer=_init_worker, initargs=(cc, query_version))
+
+def imap_convert(pool, query_chunks, max_pending=8, stats=None):
+    """ Yields ConversionResult for each chunk of queries in the order of 
+    chunks. Each chunk is converted by one worker, so chunks are read and 
+    converted concurrently. At most max_pending chunks are submitted ahead 
+    of the result being yielded, so memory stays bounded when results are 
+    consumed (e.g. written) more slowly than workers convert them.
+
+    Parameters
+    ----------
+    pool: multiprocessing.pool.Pool
+        A pool returned by get_pool.
+    query_chunks: iterable
+        Lists of query strings or GenomicRangeArray objects.
+    max_pending: int
+        Maximum number of chunks submitted but not yet yielded (e.g. twice 
+        the number of workers).
+    stats: instrument.RunStats
+        If given, time spent waiting for results of workers is added to the 
+        convert stage. Time spent reading query_chunks is not included, so 
+        it can be recorded separately (e.g. with stats.iter_stage).
+    """
+    if stats is None:
+        stats = NULL_STATS
+
+    def get(result):
+        with stats.stage('convert'):
+            return result.get()
+
+    pending = deque()
+    for querys in query_chunks:
+        pending.append(pool.apply_async(_convert_chunk, (querys,)))
+        if len(pending) >= max_pending:
+            yield get(pending.popleft())
+    while pending:
+        yield get(pending.popleft())
+
+def convert_parallel(cc, query_version, query_coords, workers):
+    """ Converts a GenomicRangeArray with multiple processes and returns a 
+    ConversionResult in the order of queries. Queries are split into 
+    contiguous chunks, one per worker. """
+    if not isinstance(query_coords, GenomicRangeArray):
+        query_coords = cc.from_query_strs_to_query_coords(query_coords)
+    if workers <= 1 or len(query_coords) < 2:
+        return cc.convert_arrays(query_version, query_coords)
+
+    bounds = np.linspace(0, len(query_coords), workers + 1).astype(int)
+    chunks = [
+        query_coords[bounds[i]:bounds[i+1]] for i in range(workers)
+        if bounds[i] < bounds[i+1]
+    ]
+    with get_pool(cc, query_version, min(workers, len(chunks))) as pool:
+        results = list(imap_convert(pool, chunks, max_pending=len(chunks)))
+
+    return ConversionResult.concat(results)
@@ -0,0 +1,388 @@
+""" Chromosome-partitioned mapping tables that are loaded lazily.
+
+A partitioned map is a directory with "partitions.json" and one directory
+per version ("v{version}"). The rows of the table are stored there sorted by
+the chromosome and start of that version, together with their positions in
+the original table, and the header records the boundaries of each
+chromosome. PartitionedConvertCoordinates reads and
+indexes the rows of a chromosome only when a query hits it, and keeps
+loaded chromosomes within a memory budget by evicting the least recently
+used ones. Only the files of one version are read for queries of that
+version.
+"""
+import os
+import json
+import threading
+import numpy as np
+from collections import OrderedDict, namedtuple
+from . import read
+from .classes import ConvertCoordinates, ConversionResult, GenomicRange, \
+    GenomicRangeArray, PositionResult, IntervalIndex, factorize, object_array
+
+PARTITIONED_MAP_FORMAT = 2
+HEADER_NAME = 'partitions.json'
+
+PartitionInfo = namedtuple(
+    'PartitionInfo',
+    ['loads', 'evictions', 'loaded', 'nbytes', 'memory_budget'])
+
+def write_partitioned_map(cc, out_path, source_sha1=''):
+    """ Writes a ConvertCoordinates object to a partitioned map directory.
+    The header is written last, so a directory without header is an
+    incomplete map. """
+    os.makedirs(out_path, exist_ok=True)
+    header_path = os.path.join(out_path, HEADER_NAME)
+    if os.path.exists(header_path):
+        os.remove(header_path)
+
+    names = cc.get_names()
+    if names.dtype.kind in 'iu':
+        names_kind = 'int'
+        names = names.astype(np.int64)
+    else:
+        names_kind = 'str'
+        names = np.array([str(name) for name in names])
+
+    header = {
+        'format': PARTITIONED_MAP_FORMAT,
+        'source_sha1': source_sha1,
+        'versions': [
+            read._to_json_value(cc.version1), read._to_json_value(cc.version2)],
+        'description': cc.description,
+        'n_rows': len(cc),
+        'names': names_kind,
+        'chromosomes': {},
+        'bounds': {},
+    }
+    inversions = cc.get_inversions()
+    for version in (cc.version1, cc.version2):
+        chromosomes, bounds, _, _, _, rows = cc.indices[version].to_arrays()
+        header['chromosomes'][str(version)] = \
+            [read._to_json_value(c) for c in chromosomes]
+        header['bounds'][str(version)] = bounds.tolist()
+
+    for version in (cc.version1, cc.version2):
+        other = cc.get_another_version(version)
+        _, _, _, _, _, rows = cc.indices[version].to_arrays()
+        _, starts, ends = cc.get_arrays(version)
+        other_chr, other_start, other_end = cc.get_arrays(other)
+        other_codes, _ = factorize(
+            header['chromosomes'][str(other)] + other_chr[rows].tolist())
+        n_chromosomes = len(header['chromosomes'][str(other)])
+
+        version_path = os.path.join(out_path, f'v{version}')
+        os.makedirs(version_path, exist_ok=True)
+        for name, arr in [
+                ('start', starts[rows]), ('end', ends[rows]),
+                ('other_chr', other_codes[n_chromosomes:].astype(np.int32)),
+                ('other_start', other_start[rows]),
+                ('other_end', other_end[rows]),
+                ('is_inversion', inversions[rows]), ('names', names[rows]),
+                ('rows', rows.astype(np.int64))]:
+            np.save(os.path.join(version_path, f'{name}.npy'), arr)
+
+    with open(header_path, 'w') as f:
+        json.dump(header, f)
+
+def partition_map(csv_path, version1, version2, out_path, description=''):
+    """ Reads a mapping CSV file and writes it to out_path as a partitioned
+    map. The SHA-1 digest of the CSV file is recorded in the header. """
+    cc = read.from_CSV_to_ConvertCoordinates(
+        csv_path, version1, version2, description)
+    write_partitioned_map(cc, out_path, source_sha1=read.file_sha1(csv_path))
+
+def read_partitioned_header(path):
+    """ Returns the header of a partitioned map as dict, or None if path is
+    not a complete partitioned map. """
+    try:
+        with open(os.path.join(path, HEADER_NAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+class PartitionedConvertCoordinates(object):
+    """ ConvertCoordinates-like object for a partitioned map (see
+    write_partitioned_map). Conversion methods take the same arguments as
+    those of ConvertCoordinates and return the same results.
+
+    Parameters
+    ----------
+    path: str
+        A path to a partitioned map directory.
+    version1, version2: str, int or tuple
+        Versions expected in the map. Versions in the header are used if
+        not given.
+    memory_budget: int
+        Maximum number of bytes of loaded chromosomes. The least recently
+        used chromosomes are evicted when it is exceeded (the chromosome in
+        use is always kept). No limit if None.
+    """
+    def __init__(self, path, version1=None, version2=None, memory_budget=None):
+        header = read_partitioned_header(path)
+        if header is None:
+            raise Exception(f'Partitioned map not found: {path}')
+        if header['format'] != PARTITIONED_MAP_FORMAT:
+            raise Exception(
+                f'Unsupported partitioned map format: {header["format"]}')
+        if version1 is None or version2 is None:
+            version1, version2 = header['versions']
+        elif not read._same_versions(header, version1, version2):
+            raise Exception(
+                f'Versions {version1} and {version2} were expected but the '\
+                f'map has versions {header["versions"][0]} and '\
+                f'{header["versions"][1]}.')
+
+        self.path = path
+        self.header = header
+        self.version1, self.version2 = version1, version2
+        self.description = header['description']
+        self.memory_budget = memory_budget
+        # Header keys of versions, which may differ from the given versions
+        # in type (e.g. 5 and "5")
+        self._keys = dict(zip((version1, version2), header['versions']))
+        # Positions of chromosomes in the header lists of each version
+        self._chromosome_index = {
+            version: {
+                chromosome: i for i, chromosome in 
+                enumerate(header['chromosomes'][str(key)])}
+            for version, key in self._keys.items()
+        }
+        self._arrays = {}
+        self._partitions = OrderedDict()
+        self._nbytes = 0
+        self._loads = self._evictions = 0
+        # Guards _arrays, _partitions and their counters, which are 
+        # changed by lookups from any thread
+        self._lock = threading.Lock()
+
+    def get_another_version(self, version):
+        if version == self.version1:
+            return self.version2
+        elif version == self.version2:
+            return self.version1
+        raise Exception(f'Please input either of version {self.version1} '\
+            f'or {self.version2}.')
+
+    def get_chromosomes(self, version):
+        """ Returns the list of chromosomes of a version in the map. """
+        self.get_another_version(version)
+        return self.header['chromosomes'][str(self._keys[version])]
+
+    def get_partition(self, version, chromosome):
+        """ Returns ConvertCoordinates with the segments of a chromosome of
+        a version and the positions of its rows in the original table, 
+        loading them if needed, or (None, None) if the chromosome is not in
+        the map. Safe to call from multiple threads. """
+        self.get_another_version(version)
+        key = (version, chromosome)
+        with self._lock:
+            if key in self._partitions:
+                self._partitions.move_to_end(key)
+                cc, rows, _ = self._partitions[key]
+                return cc, rows
+
+            i = self._chromosome_index[version].get(chromosome)
+            if i is None:
+                return None, None
+
+            bounds = self.header['bounds'][str(self._keys[version])]
+            cc, rows, nbytes = self.load_partition(version, chromosome,
+                                                   bounds[i], bounds[i+1])
+            self._partitions[key] = (cc, rows, nbytes)
+            self._nbytes += nbytes
+            self._loads += 1
+            if self.memory_budget is not None:
+                while self._nbytes > self.memory_budget and \
+                        len(self._partitions) > 1:
+                    _, (_, _, evicted) = self._partitions.popitem(last=False)
+                    self._nbytes -= evicted
+                    self._evictions += 1
+
+        return cc, rows
+
+    def load_partition(self, version, chromosome, start, stop):
+        """ Returns ConvertCoordinates for rows start to stop of the files of
+        a version, the positions of its rows in the original table and its
+        size in bytes. """
+        other = self.get_another_version(version)
+        key = self._keys[version]
+        if version not in self._arrays:
+            # Files are memory-mapped once and only the slices of requested
+            # chromosomes are copied into memory
+            self._arrays[version] = {
+                name: np.load(
+                    os.path.join(self.path, f'v{key}', f'{name}.npy'),
+                    mmap_mode='r')
+                for name in ['start', 'end', 'other_chr', 'other_start',
+                             'other_end', 'is_inversion', 'names', 'rows']
+            }
+        arrays = {
+            name: np.array(arr[start:stop])
+            for name, arr in self._arrays[version].items()
+        }
+        n_rows = stop - start
+        other_chromosomes = object_array(self.get_chromosomes(other))
+        columns = {
+            f'v{version}_chr': np.full(n_rows, chromosome, dtype=object),
+            f'v{version}_start': arrays['start'],
+            f'v{version}_end': arrays['end'],
+            f'v{other}_chr': other_chromosomes[arrays['other_chr']],
+            f'v{other}_start': arrays['other_start'],
+            f'v{other}_end': arrays['other_end'],
+            'is_inversion': np.where(arrays['is_inversion'], '-', '+'),
+        }
+        indices = {
+            version: IntervalIndex(
+                columns[f'v{version}_chr'], arrays['start'], arrays['end']),
+            other: IntervalIndex(
+                columns[f'v{other}_chr'], arrays['other_start'],
+                arrays['other_end']),
+        }
+        cc = ConvertCoordinates(
+            columns, self.version1, self.version2, self.description,
+            indices=indices, names=arrays['names'])
+
+        # Object arrays are counted by their pointers, and each index holds
+        # four int64 arrays (see IndexBlock)
+        nbytes = sum(arr.nbytes for arr in columns.values()) + \
+            arrays['names'].nbytes + arrays['rows'].nbytes + 8 * 8 * n_rows
+        return cc, arrays['rows'], nbytes
+
+    def __getstate__(self):
+        # Worker processes (see parallel.get_pool) load chromosomes again
+        # from the files instead of receiving copies of loaded ones
+        state = self.__dict__.copy()
+        state.update(_arrays={}, _partitions=OrderedDict(), _nbytes=0)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def partition_info(self):
+        """ Returns PartitionInfo with numbers of loads and evictions, the
+        number and estimated size in bytes of loaded chromosomes and the
+        memory budget. """
+        with self._lock:
+            return PartitionInfo(
+                self._loads, self._evictions, len(self._partitions), 
+                self._nbytes, self.memory_budget)
+
+    def clear(self):
+        """ Unloads all chromosomes. """
+        with self._lock:
+            self._partitions.clear()
+            self._nbytes = 0
+
+    def iter_groups(self, version, codes, categories):
+        """ Yields ConvertCoordinates (or None) of each chromosome, the
+        positions of its rows in the original table and positions of queries
+        on it. """
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(categories) + 1))
+        for code, chromosome in enumerate(categories):
+            sel = order[bounds[code]:bounds[code+1]]
+            if len(sel):
+                cc, rows = self.get_partition(version, chromosome)
+                yield cc, rows, sel
+
+    def convert_arrays(self, query_version, chromosomes, starts=None, ends=None):
+        """ Same as ConvertCoordinates.convert_arrays. Row names (the name
+        column) are the names of the original table. """
+        if isinstance(chromosomes, GenomicRangeArray):
+            query_coords = chromosomes
+        else:
+            query_coords = GenomicRangeArray(chromosomes, starts, ends)
+        ref_version = self.get_another_version(query_version)
+
+        n = len(query_coords)
+        columns = {
+            'query_chromosome': query_coords.chromosomes,
+            'query_start': query_coords.starts,
+            'query_end': query_coords.ends,
+            'ref_chromosome': np.full(n, IntervalIndex.NOT_FOUND, dtype=object),
+            'ref_start': np.full(n, IntervalIndex.NOT_FOUND, dtype=np.int64),
+            'ref_end': np.full(n, IntervalIndex.NOT_FOUND, dtype=np.int64),
+            'is_inversion': np.full(n, IntervalIndex.NOT_FOUND, dtype=np.int8),
+            'name': np.full(n, IntervalIndex.NOT_FOUND, dtype=object),
+            'conversion_code': np.full(n, 4, dtype=np.int8),
+        }
+        for cc, _, sel in self.iter_groups(
+                query_version, query_coords.codes, query_coords.categories):
+            if cc is None:
+                continue
+            res = cc.convert_arrays(
+                query_version, query_coords.chromosomes[sel],
+                query_coords.starts[sel], query_coords.ends[sel])
+            for name in ConversionResult.column_names[3:]:
+                columns[name][sel] = res[name]
+
+        return ConversionResult(query_version, ref_version, **columns)
+
+    @staticmethod
+    def from_query_strs_to_query_coords(query_strs):
+        return GenomicRangeArray.from_strs(query_strs)
+
+    def convert_strs(self, query_version, query_strs):
+        """ Same as ConvertCoordinates.convert_strs. """
+        codes, uniques = factorize(query_strs)
+        result = self.convert_arrays(
+            query_version, GenomicRangeArray.from_strs(uniques))
+        if len(uniques) == len(codes):
+            return result
+        return result.take(codes)
+
+    def convert_positions(self, query_version, chromosomes, positions):
+        """ Same as ConvertCoordinates.convert_positions. Rows are positions
+        in the original table. """
+        positions = np.asarray(positions, dtype=np.int64)
+        codes, categories = factorize(chromosomes)
+        n = len(positions)
+        ref_chr = np.full(n, IntervalIndex.NOT_FOUND, dtype=object)
+        ref_pos = np.full(n, IntervalIndex.NOT_FOUND, dtype=np.int64)
+        is_inversion = np.full(n, IntervalIndex.NOT_FOUND, dtype=np.int8)
+        rows = np.full(n, IntervalIndex.NOT_FOUND, dtype=np.int64)
+        conversion_code = np.full(n, 4, dtype=np.int8)
+
+        for cc, partition_rows, sel in self.iter_groups(
+                query_version, codes, categories):
+            if cc is None:
+                continue
+            res = cc.convert_positions(
+                query_version, np.full(len(sel), categories[codes[sel[0]]],
+                dtype=object), positions[sel])
+            ref_chr[sel], ref_pos[sel] = res.chromosome, res.position
+            # Rows of the partition are mapped back to the original table
+            found = res.row >= 0
+            rows[sel] = np.where(
+                found, partition_rows[np.where(found, res.row, 0)], res.row)
+            is_inversion[sel] = res.is_inversion
+            conversion_code[sel] = res.conversion_code
+
+        return PositionResult(
+            ref_chr, ref_pos, is_inversion, rows, conversion_code)
+
+    def convert_coordinate(self, query_version, query):
+        """ Converts a query string or GenomicRange and returns
+        PairedGenomicRanges like ConvertCoordinates.convert_coordinate. """
+        if isinstance(query, str):
+            query = GenomicRange.from_str(query)
+        return self.convert_arrays(
+            query_version, [query.chromosome], [query.start], [query.end])\
+            .to_PairedGenomicRanges(0)
+
+    def __len__(self):
+        return self.header['n_rows']
+
+    def __repr__(self):
+        return '<{name}: {desc} (versions {v1} and {v2}; {size} records; '\
+            '{loaded} chromosomes loaded)>'.format(
+                name=type(self).__name__, desc=self.description,
+                v1=self.version1, v2=self.version2, size=self.__len__(),
+                loaded=len(self._partitions))
+
+def load_partitioned_map(path, version1=None, version2=None,
+                         memory_budget=None):
+    """ Returns PartitionedConvertCoordinates for a partitioned map. """
+    return PartitionedConvertCoordinates(path, version1, version2, memory_budget)
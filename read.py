@@ -1,46 +1,496 @@
-import pandas as pd
-from .classes import ConvertCoordinates
+import os
+import gzip
+from array import array
+import json
+import hashlib
+import numpy as np
+from .classes import ConvertCoordinates, ConvertCoordinatesChain, IntervalIndex, \
+    MapPatch, CategoricalArray
 
-def from_CSV_to_ConvertCoordinates(csv_path, version1, version2, description=''):
-    """ Read CSV file into ConvertCoordinates object. """
-    return ConvertCoordinates(
-        pd.read_csv(csv_path), version1, version2, description)
+COMPILED_MAP_FORMAT = 1
+PATCH_FORMAT = 1
 
-def parse_query_list(path, expect='itemnum: ', avoid=['itemnum', '/*']):
-    """ Returns a list of query names that are written in a given file.
+def from_CSV_to_ConvertCoordinates(csv_path, version1, version2, description='',
+                                   cache_path=None):
+    """ Read CSV file into ConvertCoordinates object. 
     
+    If cache_path is given, a compiled map (see compile_map) at cache_path 
+    is loaded instead of the CSV file as long as it was compiled from the 
+    same CSV content and versions. Otherwise the map is compiled to 
+    cache_path first.
+    """
+    if cache_path is None:
+        import pandas as pd
+        return ConvertCoordinates(
+            pd.read_csv(csv_path), version1, version2, description)
+
+    source_sha1 = file_sha1(csv_path)
+    if not is_compiled_map_current(cache_path, version1, version2, source_sha1):
+        compile_map(csv_path, version1, version2, cache_path, description)
+
+    return load_compiled_map(cache_path, version1, version2)
+
+def open_text(path, mode='r'):
+    """ Opens a text file, with gzip if path ends with ".gz". """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't')
+    return open(path, mode)
+
+def parse_chain(chain_path):
+    """ Returns a dict of columns of aligned blocks in a UCSC chain file 
+    (optionally gzipped): "t_chr", "t_start", "q_chr", "q_start", "size", 
+    "q_strand" and "chain_id". Starts are 0-based on the forward strand of 
+    each sequence, i.e. blocks of "-" query strands are already reversed 
+    with qSize. """
+    chain_ids, t_names, t_starts, q_names, q_sizes, q_strands, q_starts = \
+        [], [], [], [], [], [], []
+    n_blocks = []   # Number of blocks of each chain
+    # Blocks are kept in compact arrays of 64-bit integers
+    sizes, t_gaps, q_gaps = array('q'), array('q'), array('q')
+
+    with open_text(chain_path) as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            if fields[0] == 'chain':
+                # chain score tName tSize tStrand tStart tEnd 
+                #   qName qSize qStrand qStart qEnd id
+                if fields[4] != '+':
+                    raise Exception(
+                        f'Target strand must be "+": {line.rstrip()}')
+                t_names.append(fields[2])
+                t_starts.append(int(fields[5]))
+                q_names.append(fields[7])
+                q_sizes.append(int(fields[8]))
+                q_strands.append(fields[9])
+                q_starts.append(int(fields[10]))
+                chain_ids.append(int(fields[12]) if len(fields) > 12 
+                                 else len(chain_ids) + 1)
+                n_blocks.append(0)
+            else:
+                sizes.append(int(fields[0]))
+                t_gaps.append(int(fields[1]) if len(fields) > 1 else 0)
+                q_gaps.append(int(fields[2]) if len(fields) > 2 else 0)
+                n_blocks[-1] += 1
+
+    n_blocks = np.array(n_blocks, dtype=np.int64)
+    chain = np.repeat(np.arange(len(n_blocks)), n_blocks)
+    sizes = np.frombuffer(sizes, dtype=np.int64)
+    first = np.repeat(np.cumsum(n_blocks) - n_blocks, n_blocks)
+
+    def offsets(gaps):
+        # Offset of each block from the start of its chain
+        steps = sizes + np.frombuffer(gaps, dtype=np.int64)
+        ends = np.cumsum(steps)
+        return ends - steps - (ends - steps)[first]
+
+    q_start = np.array(q_starts, dtype=np.int64)[chain] + offsets(q_gaps)
+    q_size = np.array(q_sizes, dtype=np.int64)[chain]
+    q_strand = np.array(q_strands, dtype=object)[chain]
+    reverse = q_strand == '-'
+    q_start[reverse] = q_size[reverse] - q_start[reverse] - sizes[reverse]
+
+    return {
+        't_chr': np.array(t_names, dtype=object)[chain],
+        't_start': np.array(t_starts, dtype=np.int64)[chain] + 
+            offsets(t_gaps),
+        'q_chr': np.array(q_names, dtype=object)[chain],
+        'q_start': q_start,
+        'size': sizes,
+        'q_strand': q_strand,
+        'chain_id': np.array(chain_ids, dtype=np.int64)[chain],
+    }
+
+def from_chain_to_ConvertCoordinates(chain_path, version1, version2, 
+                                     description='', cache_path=None):
+    """ Reads a UCSC chain file (see parse_chain) into ConvertCoordinates. 
+    The target (t) sequences become version1 and the query (q) sequences 
+    version2. Each aligned block becomes a segment in 1-based inclusive 
+    coordinates, blocks on "-" query strands are inversions, segments 
+    are named by their position in the file and the id of the chain of 
+    each block is kept in the "chain_id" column. The DataFrame is not 
+    created unless it is accessed. 
+
+    If cache_path is given, the map is compiled there and loaded from there 
+    as in from_CSV_to_ConvertCoordinates.
+    """
+    if cache_path is not None:
+        source_sha1 = file_sha1(chain_path)
+        if is_compiled_map_current(
+                cache_path, version1, version2, source_sha1):
+            return load_compiled_map(cache_path, version1, version2)
+
+    blocks = parse_chain(chain_path)
+    cc = ConvertCoordinates(
+        {
+            f'v{version1}_chr': blocks['t_chr'],
+            f'v{version1}_start': blocks['t_start'] + 1,
+            f'v{version1}_end': blocks['t_start'] + blocks['size'],
+            f'v{version2}_chr': blocks['q_chr'],
+            f'v{version2}_start': blocks['q_start'] + 1,
+            f'v{version2}_end': blocks['q_start'] + blocks['size'],
+            'is_inversion': np.where(blocks['q_strand'] == '-', '-', '+'),
+            'chain_id': blocks['chain_id'],
+        }, 
+        version1, version2, description)
+
+    if cache_path is not None:
+        write_compiled_map(cc, cache_path, source_sha1=source_sha1)
+        return load_compiled_map(cache_path, version1, version2)
+    return cc
+
+def from_CSVs_to_ConvertCoordinatesChain(csv_paths, versions, description=''):
+    """ Read CSV files into ConvertCoordinatesChain object. The i-th file 
+    maps versions[i] and versions[i+1]. """
+    assert len(versions) == len(csv_paths) + 1, \
+        f'{len(csv_paths) + 1} versions were expected for '\
+        f'{len(csv_paths)} files.'
+
+    return ConvertCoordinatesChain(
+        [
+            from_CSV_to_ConvertCoordinates(path, versions[i], versions[i+1])
+            for i, path in enumerate(csv_paths)
+        ], description
+    )
+
+def from_CSVs_to_composed_ConvertCoordinates(csv_paths, versions, 
+                                             description='', cache_path=None):
+    """ Returns ConvertCoordinates that maps versions[0] to versions[-1] 
+    directly, composed from CSV files of a chain (see 
+    from_CSVs_to_ConvertCoordinatesChain and ConvertCoordinatesChain.compose).
+
+    If cache_path is given, the composed map is written there as a compiled 
+    map and loaded from there as long as the CSV files and versions do not 
+    change.
+    """
+    if cache_path is not None:
+        source_sha1 = hashlib.sha1('\n'.join(
+            [file_sha1(path) for path in csv_paths] + 
+            [str(version) for version in versions]
+        ).encode()).hexdigest()
+        if is_compiled_map_current(
+                cache_path, versions[0], versions[-1], source_sha1):
+            return load_compiled_map(cache_path, versions[0], versions[-1])
+
+    chain = from_CSVs_to_ConvertCoordinatesChain(
+        csv_paths, versions, description)
+    cc = chain.compose(versions[0], versions[-1])
+    if cache_path is not None:
+        write_compiled_map(cc, cache_path, source_sha1=source_sha1)
+
+    return cc
+
+def file_sha1(path, blocksize=1 << 20):
+    """ Returns SHA-1 hex digest of a file. """
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            sha1.update(block)
+
+    return sha1.hexdigest()
+
+def _to_json_value(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+def compile_map(csv_path, version1, version2, out_path, description=''):
+    """ Reads a mapping CSV file, checks it through ConvertCoordinates and 
+    writes it to out_path as a compiled map (see write_compiled_map). The 
+    SHA-1 digest of the CSV file is recorded in the header. """
+    cc = from_CSV_to_ConvertCoordinates(
+        csv_path, version1, version2, description)
+    write_compiled_map(cc, out_path, source_sha1=file_sha1(csv_path))
+
+def write_compiled_map(cc, out_path, source_sha1='', patches=()):
+    """ Writes a ConvertCoordinates object to a directory of NumPy arrays 
+    that can be memory-mapped by load_compiled_map. 
+    
+    The directory contains one .npy file per column ("v{version}_chr" holds 
+    chromosome codes), the sorted IntervalIndex arrays of each version and 
+    "header.json", which records the versions, chromosome names, row names, 
+    the names of other integer columns (e.g. "chain_id" of chain maps; 
+    written to "column_{name}.npy"), the digest of the source file and the 
+    digests of patch files applied to it (see patch_compiled_map). Other 
+    columns are not written. The header is written last, so a directory 
+    without header is an incomplete map.
+    """
+    os.makedirs(out_path, exist_ok=True)
+    header_path = os.path.join(out_path, 'header.json')
+    if os.path.exists(header_path):
+        os.remove(header_path)
+
+    def save(name, arr):
+        np.save(os.path.join(out_path, f'{name}.npy'), arr)
+
+    n_rows = len(cc)
+    header = {
+        'format': COMPILED_MAP_FORMAT,
+        'source_sha1': source_sha1,
+        'versions': [_to_json_value(cc.version1), _to_json_value(cc.version2)],
+        'description': cc.description,
+        'n_rows': n_rows,
+        'chromosomes': {},
+        'columns': [],
+        'patches': list(patches),
+    }
+    for version in (cc.version1, cc.version2):
+        chromosomes, bounds, starts, ends, max_ends, rows = \
+            cc.indices[version].to_arrays()
+        codes = np.empty(n_rows, dtype=np.int32)
+        codes[rows] = np.repeat(np.arange(len(chromosomes)), np.diff(bounds))
+        _, start_col, end_col = cc.get_arrays(version)
+
+        save(f'v{version}_chr', codes)
+        save(f'v{version}_start', start_col)
+        save(f'v{version}_end', end_col)
+        save(f'v{version}_index_bounds', bounds)
+        save(f'v{version}_index_starts', starts)
+        save(f'v{version}_index_ends', ends)
+        save(f'v{version}_index_max_ends', max_ends)
+        save(f'v{version}_index_rows', rows)
+        header['chromosomes'][str(version)] = \
+            [_to_json_value(c) for c in chromosomes]
+    save('is_inversion', cc.get_inversions())
+    for name in cc.columns:
+        if name in cc._required_columns():
+            continue
+        column = cc.get_column(name)
+        if column.dtype.kind in 'iu':
+            save(f'column_{name}', column.astype(np.int64))
+            header['columns'].append(name)
+
+    names = cc.get_names()
+    if np.array_equal(names, np.arange(n_rows)):
+        header['names'] = 'range'
+    elif names.dtype.kind in 'iu':
+        header['names'] = 'npy'
+        save('names', names.astype(np.int64))
+    else:
+        header['names'] = [_to_json_value(name) for name in names]
+
+    with open(header_path, 'w') as f:
+        json.dump(header, f)
+
+def read_compiled_header(path):
+    """ Returns the header of a compiled map as dict, or None if path is not 
+    a complete compiled map. """
+    try:
+        with open(os.path.join(path, 'header.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _same_versions(header, version1, version2):
+    return [str(v) for v in header['versions']] == [str(version1), str(version2)]
+
+def is_compiled_map_current(path, version1, version2, source_sha1):
+    """ Returns True if a compiled map at path was made from a source file 
+    with a given SHA-1 digest for given versions and has not been patched 
+    since. """
+    header = read_compiled_header(path)
+    return header is not None \
+        and header['format'] == COMPILED_MAP_FORMAT \
+        and header['source_sha1'] == source_sha1 \
+        and not header.get('patches') \
+        and _same_versions(header, version1, version2)
+
+def load_compiled_map(path, version1=None, version2=None, mmap_mode='r'):
+    """ Returns ConvertCoordinates object for a compiled map written by 
+    write_compiled_map. Arrays are memory-mapped (mmap_mode='r'), so loading 
+    takes little time. Checks are not run again.
+
+    Columns (chromosomes as CategoricalArray codes) and interval indices 
+    stay file-backed, so processes that load the same map share their 
+    pages. Row names kept in the header and the DataFrame, which is built 
+    when df is accessed, are private to each process.
+
+    Parameters
+    ----------
+    path: str
+        A path to a compiled map directory.
+    version1, version2: str, int or tuple
+        Versions expected in the map. Versions in the header are used if 
+        not given.
+    mmap_mode: str or None
+        Passed to numpy.load.
+    """
+    header = read_compiled_header(path)
+    if header is None:
+        raise Exception(f'Compiled map not found: {path}')
+    if header['format'] != COMPILED_MAP_FORMAT:
+        raise Exception(f'Unsupported compiled map format: {header["format"]}')
+    if version1 is None or version2 is None:
+        version1, version2 = header['versions']
+    elif not _same_versions(header, version1, version2):
+        raise Exception(
+            f'Versions {version1} and {version2} were expected but the map '\
+            f'has versions {header["versions"][0]} and {header["versions"][1]}.')
+
+    def load(name):
+        return np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+
+    columns = {}
+    indices = {}
+    for version, key in zip((version1, version2), header['versions']):
+        chromosomes = header['chromosomes'][str(key)]
+        codes = load(f'v{key}_chr')
+        starts, ends = load(f'v{key}_start'), load(f'v{key}_end')
+        # Chromosome names are decoded only for rows that are looked up
+        columns[f'v{version}_chr'] = CategoricalArray(codes, chromosomes)
+        columns[f'v{version}_start'] = starts
+        columns[f'v{version}_end'] = ends
+        indices[version] = IntervalIndex.from_arrays(
+            chromosomes, load(f'v{key}_index_bounds'), 
+            load(f'v{key}_index_starts'), load(f'v{key}_index_ends'), 
+            load(f'v{key}_index_max_ends'), load(f'v{key}_index_rows'))
+
+    columns['is_inversion'] = CategoricalArray(
+        load('is_inversion'), ['+', '-'])
+    for name in header.get('columns', []):
+        columns[name] = load(f'column_{name}')
+
+    if header['names'] == 'range':
+        names = None
+    elif header['names'] == 'npy':
+        names = load('names')
+    else:
+        names = header['names']
+
+    return ConvertCoordinates(
+        columns, version1, version2, header['description'], indices=indices, 
+        names=names)
+
+def iter_query_chunks(path, chunksize=100000, expect='itemnum: ', 
+                      avoid=['itemnum', '/*']):
+    """ Yields lists of query names that are written in a given file. Each 
+    list contains at most chunksize queries, so a file of any size can be 
+    processed in bounded memory. The number of items is checked after the 
+    last chunk has been yielded.
+
     Parameter
     ---------
     path: str
         a path to a file of file name list
+    chunksize: int
+        maximum number of queries in a chunk
+    expect: str
+        a prefix of the line that describes the expected number of items
+    avoid: list
+        prefixes of lines that are not queries
         
     Return
     ------
-    query_list: list
-        a list that contains all file names listed in a given file.
+    generator of lists of query names
     """
-    query_list = []
+    avoid = tuple(avoid)
+    chunk = []
     exp_itemnum = 0
+    obs_itemnum = 0
     with open(path, 'r') as f:
         for line in f:
-            if expect:
-                if line.startswith(expect):
-                    exp_itemnum = int(line.rstrip().split(expect)[1])
-
-            bad = 0
-            for bad_char in avoid:
-                if line.startswith(bad_char):
-                    bad += 1
-            if bad > 0:
+            if expect and line.startswith(expect):
+                exp_itemnum = int(line.rstrip().split(expect)[1])
+
+            if avoid and line.startswith(avoid):
                 continue
 
-            query_list.append(line.rstrip())
+            chunk.append(line.rstrip())
+            if len(chunk) == chunksize:
+                obs_itemnum += len(chunk)
+                yield chunk
+                chunk = []
+
+    if chunk:
+        obs_itemnum += len(chunk)
+        yield chunk
+
     if expect:
         if exp_itemnum:
-            assert len(query_list) == exp_itemnum, \
-                f'Wrong item number: {len(query_list)} observed instead of '\
+            assert obs_itemnum == exp_itemnum, \
+                f'Wrong item number: {obs_itemnum} observed instead of '\
                 f'{exp_itemnum}.'
         else:
             raise Exception('Expected number has not been parsed.')
+
+def parse_query_list(path, expect='itemnum: ', avoid=['itemnum', '/*']):
+    """ Returns a list of query names that are written in a given file.
+    
+    Parameter
+    ---------
+    path: str
+        a path to a file of file name list
+        
+    Return
+    ------
+    query_list: list
+        a list that contains all file names listed in a given file.
+    """
+    query_list = []
+    for chunk in iter_query_chunks(path, expect=expect, avoid=avoid):
+        query_list += chunk
     
     return query_list
+
+def write_patch(patch, out_path):
+    """ Writes a MapPatch to a tab-separated text file (gzipped if out_path 
+    ends with ".gz"). The first line is "#patch", the format and the two 
+    versions. Each following line is one edit:
+
+        -   NAME
+        =   NAME  V1_CHR  V1_START  V1_END  V2_CHR  V2_START  V2_END  STRAND
+        +   NAME  V1_CHR  V1_START  V1_END  V2_CHR  V2_START  V2_END  STRAND
+
+    for deletion, replacement and insertion of the segment named NAME. 
+    STRAND is "-" for inverted segments. Other lines starting with "#" and 
+    empty lines are ignored by read_patch.
+    """
+    with open_text(out_path, 'w') as f:
+        f.write(f'#patch\t{PATCH_FORMAT}\t{patch.version1}\t{patch.version2}\n')
+        for name in patch.deletions:
+            f.write(f'-\t{name}\n')
+        for op, segments in (('=', patch.replacements), ('+', patch.insertions)):
+            for name, segment in segments.items():
+                f.write('\t'.join(str(v) for v in (op, name) + segment) + '\n')
+
+def read_patch(patch_path):
+    """ Returns MapPatch read from a file written by write_patch. Versions 
+    and names are strings (see ConvertCoordinates.get_positions). """
+    with open_text(patch_path) as f:
+        fields = f.readline().rstrip('\n').split('\t')
+        if len(fields) != 4 or fields[0] != '#patch':
+            raise Exception(f'Not a patch file: {patch_path}')
+        if int(fields[1]) != PATCH_FORMAT:
+            raise Exception(f'Unsupported patch format: {fields[1]}')
+        patch = MapPatch(fields[2], fields[3])
+
+        for i, line in enumerate(f, 2):
+            if not line.strip() or line.startswith('#'):
+                continue
+            fields = line.rstrip('\n').split('\t')
+            if fields[0] == '-' and len(fields) == 2:
+                patch.delete(fields[1])
+            elif fields[0] in ('=', '+') and len(fields) == 9:
+                edit = patch.replace if fields[0] == '=' else patch.insert
+                edit(fields[1], fields[2:])
+            else:
+                raise Exception(f'Invalid patch line {i}: "{line.rstrip()}"')
+
+    return patch
+
+def patch_compiled_map(path, patch_path, out_path=None):
+    """ Applies a patch file (see write_patch) to a compiled map and writes 
+    the result to out_path (path itself if None). Only chromosomes edited 
+    by the patch are re-indexed, and only new segments are checked. The 
+    digest of the patch file is appended to "patches" in the header. """
+    header = read_compiled_header(path)
+    if header is None:
+        raise Exception(f'Compiled map not found: {path}')
+    if out_path is None:
+        out_path = path
+    # Arrays are read into memory if the map is overwritten
+    in_place = os.path.abspath(out_path) == os.path.abspath(path)
+    cc = load_compiled_map(path, mmap_mode=None if in_place else 'r')
+    cc.apply_patch(read_patch(patch_path))
+    write_compiled_map(
+        cc, out_path, source_sha1=header['source_sha1'],
+        patches=header.get('patches', []) + [file_sha1(patch_path)])
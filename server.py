@@ -0,0 +1,296 @@
+""" Long-running conversion server and its client. The server keeps 
+ConvertCoordinates objects in memory and answers conversion requests over a 
+Unix socket or a localhost TCP port, so short jobs do not pay for loading 
+and indexing mapping tables.
+
+Requests and responses are JSON objects, one per line. A conversion request 
+has "map" (any map accepted by main.load_map, or a list of maps with 
+"via"), "query_version", "ref_version" and "querys" (a list of query 
+strings) and optionally "via". The response has "query_version", 
+"ref_version" and "columns" (see ConversionResult), or "error". Requests 
+{"command": "ping"} and {"command": "shutdown"} are also accepted.
+
+Compiled map caches and memory budgets of partitioned maps are configured 
+when the server starts, so clients cannot make the server write files.
+"""
+import asyncio
+import json
+import socket
+import threading
+import numpy as np
+from . import read
+from . import formatter
+from .classes import ConversionResult, object_array
+from .instrument import NULL_STATS
+
+# Maximum length of a request or response line
+LINE_LIMIT = 1 << 30
+
+def _to_json(obj):
+    return json.dumps(
+        obj, default=lambda x: x.item() if isinstance(x, np.generic) else str(x)
+    ).encode() + b'\n'
+
+def from_ConversionResult_to_dict(result):
+    return {
+        'query_version': result.query_version,
+        'ref_version': result.ref_version,
+        'columns': {name: result[name].tolist() for name in result},
+    }
+
+def from_dict_to_ConversionResult(response):
+    columns = {}
+    for name, values in response['columns'].items():
+        if name in ('query_chromosome', 'ref_chromosome', 'name'):
+            columns[name] = object_array(values)
+        else:
+            columns[name] = np.array(values, dtype=np.int64)
+
+    return ConversionResult(
+        response['query_version'], response['ref_version'], **columns)
+
+class ConversionServer(object):
+    """ Keeps ConvertCoordinates objects loaded and converts queries sent by 
+    clients. A map is loaded on the first request for it (or by load) and 
+    kept until the server stops. Requests for different maps are converted 
+    concurrently, while requests for the same map are converted one at a 
+    time because maps (e.g. partitioned maps within a memory budget) are 
+    not required to be thread-safe.
+
+    Parameters
+    ----------
+    map_cache_paths: dict
+        Compiled map paths (see main.load_map) keyed by map path, or by a 
+        tuple of map paths for maps with via.
+    memory_budget: int
+        Passed to main.load_map for partitioned maps.
+    """
+    def __init__(self, map_cache_paths=None, memory_budget=None):
+        self.maps = {}
+        self.map_cache_paths = dict(map_cache_paths or {})
+        self.memory_budget = memory_budget
+        self._server = None
+        self._lock = threading.Lock()
+        self._map_locks = {}
+
+    @staticmethod
+    def get_key(map_path, version1, version2, via=None):
+        if via:
+            # The order of versions matters for composed maps
+            return (tuple(map_path), tuple(str(v) for v in 
+                    [version1] + list(via) + [version2]))
+        return (map_path, frozenset((str(version1), str(version2))))
+
+    def get_lock(self, key):
+        """ Returns the lock that serializes loading of and conversion with 
+        the map of a key (see get_key). """
+        with self._lock:
+            return self._map_locks.setdefault(key, threading.Lock())
+
+    def load(self, map_path, version1, version2, via=None):
+        """ Returns ConvertCoordinates for a map, loading it if needed. A 
+        map requested by several connections at once is loaded once. """
+        from .main import load_map
+        key = self.get_key(map_path, version1, version2, via)
+        with self.get_lock(key):
+            if key not in self.maps:
+                cache_key = tuple(map_path) if via else map_path
+                self.maps[key] = load_map(
+                    list(map_path) if via else map_path, version1, version2, 
+                    self.map_cache_paths.get(cache_key), via, 
+                    self.memory_budget)
+
+        return self.maps[key]
+
+    def handle_command(self, request):
+        """ Returns a response dict for a ping or shutdown request. This 
+        runs in the thread of the event loop. """
+        if request['command'] == 'shutdown':
+            if self._server is not None:
+                self._server.close()
+            return {'status': 'ok'}
+        return {'status': 'ok', 'maps': len(self.maps)}
+
+    def handle_request(self, request):
+        """ Returns a response dict for a conversion request dict. """
+        command = request.get('command', 'convert')
+        if command != 'convert':
+            return {'error': f'Unknown command: {command}'}
+        if 'map_cache_path' in request:
+            return {'error': 'map_cache_path is configured by the server.'}
+
+        try:
+            args = (request['map'], request['query_version'], 
+                    request['ref_version'], request.get('via'))
+            cc = self.load(*args)
+            with self.get_lock(self.get_key(*args)):
+                result = cc.convert_strs(
+                    request['query_version'], request['querys'])
+        except Exception as e:
+            return {'error': f'{type(e).__name__}: {e}'}
+
+        return from_ConversionResult_to_dict(result)
+
+    async def handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = None
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    response = {'error': f'Invalid request: {e}'}
+                else:
+                    if not isinstance(request, dict):
+                        response = {'error': 'Invalid request: a JSON '\
+                            'object was expected.'}
+                    elif request.get('command') in ('ping', 'shutdown'):
+                        # asyncio objects are used only in the loop thread
+                        response = self.handle_command(request)
+                if response is None:
+                    # Conversion runs in a thread so that other connections 
+                    # are accepted in the meantime.
+                    response = await loop.run_in_executor(
+                        None, self.handle_request, request)
+                writer.write(_to_json(response))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self, address):
+        """ Starts listening on address, which is a path of a Unix socket 
+        or a (host, port) tuple. """
+        if isinstance(address, tuple):
+            host, port = address
+            self._server = await asyncio.start_server(
+                self.handle_connection, host, port, limit=LINE_LIMIT)
+        else:
+            self._server = await asyncio.start_unix_server(
+                self.handle_connection, address, limit=LINE_LIMIT)
+
+        return self._server
+
+    async def serve(self, address):
+        server = await self.start(address)
+        try:
+            await server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+
+    def __repr__(self):
+        return '<{name}: {size} maps>'.format(
+            name=type(self).__name__, size=len(self.maps))
+
+def run_server(address, preload=(), map_cache_paths=None, memory_budget=None):
+    """ Runs a ConversionServer until it receives a shutdown request.
+
+    Parameters
+    ----------
+    address: str or tuple
+        A path of a Unix socket or a (host, port) tuple.
+    preload: list
+        Tuples of arguments of ConversionServer.load for maps to be loaded 
+        before the server starts.
+    map_cache_paths, memory_budget:
+        See ConversionServer.
+    """
+    server = ConversionServer(map_cache_paths, memory_budget)
+    for args in preload:
+        server.load(*args)
+    asyncio.run(server.serve(address))
+
+class ConversionClient(object):
+    """ Blocking client of ConversionServer. """
+    def __init__(self, address):
+        if isinstance(address, tuple):
+            self._sock = socket.create_connection(address)
+        else:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.connect(address)
+        self._file = self._sock.makefile('rb')
+
+    def request(self, request):
+        """ Sends a request dict and returns the response dict. """
+        self._sock.sendall(_to_json(request))
+        response = json.loads(self._file.readline(LINE_LIMIT))
+        if 'error' in response:
+            raise Exception(response['error'])
+
+        return response
+
+    def convert_strs(self, map_csv_path, query_version, ref_version, 
+                     query_strs, via=None):
+        """ Returns ConversionResult for query strings converted by the 
+        server. map_csv_path and via are as in main.main. """
+        request = {
+            'map': map_csv_path, 'query_version': query_version, 
+            'ref_version': ref_version, 'querys': list(query_strs),
+        }
+        if via:
+            request['via'] = list(via)
+        return from_dict_to_ConversionResult(self.request(request))
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def main(
+        map_csv_path:str, 
+        query_version:str, 
+        ref_version:str, 
+        query_path:str, 
+        out_csv_path:str, 
+        address=None,
+        workers:int=1,
+        map_cache_path:str=None,
+        via:list=None,
+        sep:str=',',
+        out_format:str=None,
+        stats=None,
+        memory_budget:int=None,
+        **kwargs
+        ):
+    """ Same as main.main but queries are converted by a ConversionServer 
+    listening on address. The output file is the same as that of main.main. 
+    map_csv_path must be readable by the server. 
+
+    workers, map_cache_path and memory_budget are settings of the server 
+    (see ConversionServer) and are rejected here unless they are defaults. 
+    stats records the stages parse_queries, convert (including the round 
+    trip to the server) and write.
+    """
+    if workers != 1:
+        raise Exception('workers cannot be used with a conversion server.')
+    if map_cache_path is not None or memory_budget is not None:
+        raise Exception(
+            'map_cache_path and memory_budget are configured by the '\
+            'conversion server.')
+    if stats is None:
+        stats = NULL_STATS
+
+    query_chunks = stats.iter_stage(
+        'parse_queries', read.iter_query_chunks(query_path, **kwargs))
+    with ConversionClient(address) as client, \
+            formatter.get_ResultWriter(
+                out_csv_path, out_format, sep=sep) as writer:
+        for querys in query_chunks:
+            with stats.stage('convert'):
+                result = client.convert_strs(
+                    map_csv_path, query_version, ref_version, querys, via)
+            stats.count_result(result)
+            with stats.stage('write'):
+                writer.append_result(result)
+
+        with stats.stage('write'):
+            writer.flush()
+
+    stats.emit()
@@ -0,0 +1,143 @@
+""" Nose tests for annotation liftover. """
+import os
+import gzip
+import tempfile
+import pandas as pd
+from convert_annotation.classes import ConvertCoordinates
+from convert_annotation.annotation import convert_gff, convert_bed, \
+    convert_vcf, swap_strand, complement_alleles
+from convert_annotation.__main__ import run
+
+class TestAnnotation:
+    """ Unit tests for convert_gff and convert_bed. """
+    def setup(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.df = pd.DataFrame(
+            {
+                'v5_chr': ['2L', '2L', '2L'], 
+                'v5_start': [1, 20, 35], 
+                'v5_end': [10, 30, 45], 
+                'v6_chr': ['2L', '2R', '2R'], 
+                'v6_start': [11, 21, 25], 
+                'v6_end': [20, 31, 35], 
+                'is_inversion': ['+', '+', '-']
+            }
+        )
+        self.cc = ConvertCoordinates(self.df, 5, 6)
+        self.out_path = os.path.join(self.tmpdir.name, 'out')
+        self.reject_path = os.path.join(self.tmpdir.name, 'reject')
+
+    def teardown(self):
+        self.tmpdir.cleanup()
+
+    def path(self, name, lines):
+        path = os.path.join(self.tmpdir.name, name)
+        with (gzip.open(path, 'wt') if name.endswith('.gz') else 
+              open(path, 'w')) as f:
+            f.write(''.join(line + '\n' for line in lines))
+        return path
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read().splitlines()
+
+    def test_swap_strand(self):
+        assert swap_strand('+') == '-'
+        assert swap_strand('-') == '+'
+        assert swap_strand('.') == '.'
+
+    def test_convert_gff(self):
+        in_path = self.path('in.gff3', [
+            '##gff-version 3',
+            '2L\t.\tgene\t2\t5\t.\t+\t.\tID=g1',
+            '2L\t.\texon\t36\t40\t.\t+\t0\tID=e1',
+            '2L\t.\tgene\t8\t22\t.\t-\t.\tID=g2',
+            '',
+            '3L\t.\tgene\t1\t5\t.\t+\t.\tID=g3',
+            '##FASTA',
+            '>2L',
+            'ACGT',
+        ])
+        counts = convert_gff(
+            self.cc, 5, in_path, self.out_path, self.reject_path, chunksize=2)
+
+        assert counts == {'records': 4, 'converted': 2, 'rejected': 2}
+        assert self.read(self.out_path) == [
+            '##gff-version 3',
+            '2L\t.\tgene\t12\t15\t.\t+\t.\tID=g1',
+            '2R\t.\texon\t30\t34\t.\t-\t0\tID=e1',
+            '',
+            '##FASTA',
+            '>2L',
+            'ACGT',
+        ]
+        assert self.read(self.reject_path) == [
+            '2L\t.\tgene\t8\t22\t.\t-\t.\tID=g2',
+            '3L\t.\tgene\t1\t5\t.\t+\t.\tID=g3',
+        ]
+
+    def test_convert_bed(self):
+        in_path = self.path('in.bed.gz', [
+            'track name=test',
+            '2L\t1\t5\tb1\t0\t+',
+            '2L\t35\t40\tb2\t0\t+\t36\t38\t0\t2\t2,2,\t0,3,',
+            '2L\t4\t4',
+            '2L\t5\t25',
+        ])
+        out_path = self.out_path + '.bed.gz'
+        counts = convert_bed(self.cc, 5, in_path, out_path)
+
+        assert counts == {'records': 4, 'converted': 3, 'rejected': 1}
+        with gzip.open(out_path, 'rt') as f:
+            assert f.read().splitlines() == [
+                'track name=test',
+                '2L\t11\t15\tb1\t0\t+',
+                '2R\t29\t34\tb2\t0\t-\t31\t33\t0\t2\t2,2,\t0,3,',
+                '2L\t14\t14',
+            ]
+
+    def test_convert_vcf(self):
+        in_path = self.path('in.vcf', [
+            '##fileformat=VCFv4.2',
+            '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO',
+            '2L\t5\trs1\tA\tG\t.\tPASS\t.',
+            '2L\t38\trs2\tA\tC,T\t.\tPASS\t.',
+            '2L\t38\trs3\tAT\tA\t.\tPASS\t.',
+            '2L\t15\trs4\tA\tG\t.\tPASS\t.',
+            '2L\t25\trs5\tA\tG\t.\tPASS\t.',
+        ])
+        counts = convert_vcf(
+            self.cc, 5, in_path, self.out_path, self.reject_path, chunksize=3)
+
+        assert counts == {'records': 5, 'converted': 3, 'rejected': 2}
+        assert self.read(self.out_path) == [
+            '##fileformat=VCFv4.2',
+            '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO',
+            '2L\t15\trs1\tA\tG\t.\tPASS\t.',
+            '2R\t32\trs2\tT\tG,A\t.\tPASS\t.',
+            '2R\t26\trs5\tA\tG\t.\tPASS\t.',
+        ]
+        assert self.read(self.reject_path) == [
+            '2L\t38\trs3\tAT\tA\t.\tPASS\t.',
+            '2L\t15\trs4\tA\tG\t.\tPASS\t.',
+        ]
+        # Sites-only VCF lines end with ALT
+        in_path = self.path('in5.vcf', ['2L\t38\trs2\tA\tC', '2L\t5\trs1\tA\tG'])
+        counts = convert_vcf(self.cc, 5, in_path, self.out_path)
+        assert counts == {'records': 2, 'converted': 2, 'rejected': 0}
+        assert self.read(self.out_path) == \
+            ['2R\t32\trs2\tT\tG', '2L\t15\trs1\tA\tG']
+
+        assert complement_alleles('G', '*') == ('C', '*')
+        assert complement_alleles('G', '<DEL>') is None
+
+    def test_run(self):
+        map_path = os.path.join(self.tmpdir.name, 'map.csv')
+        self.df.to_csv(map_path, index=False)
+        in_path = self.path('in.gtf', ['2L\t.\texon\t2\t5\t.\t+\t.\tgene_id "g1";'])
+        run([map_path, '5', '6', in_path, self.out_path, 
+             '--annotation', 'gtf', '--reject', self.reject_path])
+
+        assert self.read(self.out_path) == \
+            ['2L\t.\texon\t12\t15\t.\t+\t.\tgene_id "g1";']
+        assert self.read(self.reject_path) == []
@@ -0,0 +1,68 @@
+""" Nose tests for benchmark helpers. """
+import os
+import tempfile
+import numpy as np
+from convert_annotation.classes import ConvertCoordinates
+from convert_annotation.benchmarks.synthetic import make_map_columns, \
+    make_queries
+from convert_annotation.benchmarks.run import run_benchmarks, compare
+
+class TestSynthetic:
+    """ Unit tests for synthetic maps and queries. """
+    def setup(self):
+        self.columns = make_map_columns(2000, n_chromosomes=4, seed=1)
+
+    def teardown(self):
+        pass
+
+    def test_make_map_columns(self):
+        cc = ConvertCoordinates(dict(self.columns), 1, 2)
+        assert len(cc) == 2000
+        assert len(cc.validate().index) == 0
+        assert set(self.columns['v1_chr']) == {'chr1', 'chr2', 'chr3', 'chr4'}
+
+    def test_make_queries(self):
+        cc = ConvertCoordinates(dict(self.columns), 1, 2)
+        querys = make_queries(self.columns, 1, 500, not_found_rate=0.1, seed=1)
+        codes = cc.convert_strs(1, querys)['conversion_code']
+
+        assert len(querys) == 500
+        assert np.array_equal(
+            codes == 4, np.array([q.startswith('chrUn') for q in querys]))
+        assert not np.any(codes == 8)
+
+class TestRunBenchmarks:
+    """ Unit tests for run_benchmarks and compare. """
+    def setup(self):
+        self.record = run_benchmarks(
+            n_segments=200, n_queries=100, n_single=10, repeat=1)
+
+    def teardown(self):
+        pass
+
+    def test_run_benchmarks(self):
+        stages = self.record['stages']
+        assert 'import' in stages
+        assert stages['convert_strs']['per_second'] > 0
+        assert stages['write_csv']['peak_bytes'] > 0
+
+    def test_workdir(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            run_benchmarks(
+                n_segments=200, n_queries=100, n_single=10, repeat=1, 
+                memory=False, workdir=workdir)
+            assert {'map.csv', 'query.txt', 'out.csv'} <= \
+                set(os.listdir(workdir))
+
+    def test_compare(self):
+        previous = {'stages': {
+            'main': {'seconds': 1.0, 'peak_bytes': 100}, 
+            'load_csv': {'seconds': 1.0},
+        }}
+        record = {'stages': {
+            'main': {'seconds': 1.1, 'peak_bytes': 200}, 
+            'load_csv': {'seconds': 2.0},
+            'convert_strs': {'seconds': 1.0},
+        }}
+        assert compare(record, previous) == [
+            ('main', 'peak_bytes', 100, 200), ('load_csv', 'seconds', 1.0, 2.0)]
@@ -1,9 +1,11 @@
 """ Nose tests for classes GenomicRange, PairedGenomicRanges, 
 ConvertCoordinates and their instances. """
 from nose.tools import assert_raises
+import numpy as np
 import pandas as pd
 from convert_annotation.classes import GenomicRange, PairedGenomicRanges, \
-	ConvertCoordinates
+	ConvertCoordinates, IntervalIndex, ConversionResult, Database, compile_filter, \
+	GenomicRangeArray, ConvertCoordinatesChain, MapPatch
 
 class TestGenomicRange:
     """ Unit tests for GenomicRange. """
@@ -38,6 +40,47 @@ class TestGenomicRange:
         assert_raises(IndexError, self.gencood.get_index, 11)
         assert_raises(IndexError, self.gencood.get_index, 0)
 
+    def test_sequence(self):
+        assert len(self.gencood) == 10
+        assert self.gencood[0] == 1
+        assert self.gencood[-1] == 10
+        assert self.gencood[2:5] == range(3, 6)
+        assert list(self.gencood) == list(range(1, 11))
+        assert_raises(IndexError, self.gencood.__getitem__, 10)
+        assert_raises(IndexError, self.gencood.__getitem__, -11)
+        assert_raises(AttributeError, setattr, self.gencood, 'strand', '+')
+        assert self.gencood.version is None
+        assert GenomicRange('2L', 1, 10, 5) == self.gencood
+
+class TestGenomicRangeArray:
+    """ Unit tests for GenomicRangeArray. """
+    def setup(self):
+        self.gen_ranges = GenomicRangeArray.from_strs(
+            ['2L:1..10', '3R:100..200:6', '2L:5..9'])
+
+    def teardown(self):
+        pass
+
+    def test_from_strs(self):
+        assert self.gen_ranges.codes.tolist() == [0, 1, 0]
+        assert self.gen_ranges.categories.tolist() == ['2L', '3R']
+        assert self.gen_ranges.starts.tolist() == [1, 100, 5]
+        assert self.gen_ranges.ends.tolist() == [10, 200, 9]
+        assert len(GenomicRangeArray.from_strs([])) == 0
+        assert_raises(ValueError, GenomicRangeArray.from_strs, ['2L:1-10'])
+
+    def test_sequence(self):
+        assert len(self.gen_ranges) == 3
+        assert self.gen_ranges[1] == GenomicRange('3R', 100, 200)
+        assert self.gen_ranges[-1] == GenomicRange('2L', 5, 9)
+        assert list(self.gen_ranges) == [
+            GenomicRange('2L', 1, 10), GenomicRange('3R', 100, 200), 
+            GenomicRange('2L', 5, 9)]
+        assert self.gen_ranges[1:] == GenomicRangeArray(
+            ['3R', '2L'], [100, 5], [200, 9])
+        assert self.gen_ranges == GenomicRangeArray.from_GenomicRanges(
+            list(self.gen_ranges))
+
 class TestPairedGenomicRanges:
     """ Unit tests for PairedGenomicRanges. """
     def setup(self):
@@ -126,6 +169,39 @@ class TestPairedGenomicRanges:
                 is_inversion=True, name=None
             )
 
+class TestDatabase:
+    """ Unit tests for Database. """
+    def setup(self):
+        self.db = Database(pd.DataFrame(
+            {'a': [1, 5, 10, 100, 7], 'b': ['x1', 'y2', 'x3', 'z', 'xx']},
+            index=[10, 11, 12, 13, 14]
+        ))
+
+    def teardown(self):
+        pass
+
+    def test_filter(self):
+        assert self.db.filter(a='gt5').index.tolist() == [12, 13, 14]
+        assert self.db.filter(a='gte5').index.tolist() == [11, 12, 13, 14]
+        assert self.db.filter(a='lte7', b='c/x/').index.tolist() == [10, 14]
+        assert self.db.filter(b='nc/x/').index.tolist() == [11, 13]
+        assert self.db.filter(b=['z', 'y2']).index.tolist() == [11, 13]
+        assert self.db.filter(a=5).index.tolist() == [11]
+        assert self.db.filter(a='*').index.tolist() == [10, 11, 12, 13, 14]
+        assert self.db.filter(a=('gte5', 'lt100')).index.tolist() == \
+            [11, 12, 14]
+        assert self.db.filter(
+            sort_by='a', ascending=False, a=('gte5', [7, 10, 100])
+        ).index.tolist() == [13, 12, 14]
+        assert_raises(ValueError, self.db.filter, a='gt5x')
+
+    def test_compile_filter(self):
+        plan = compile_filter(a='gte5', b='c/x/')
+        assert compile_filter(a='gte5', b='c/x/') is plan
+        assert compile_filter(a='gte5', b='c/y/') is not plan
+        assert plan.mask(self.db.df).tolist() == \
+            [False, False, True, False, True]
+
 class TestConvertCoordinates:
     """ Unit tests for ConvertCoordinates. """
     def setup(self):
@@ -237,3 +313,464 @@ class TestConvertCoordinates:
         assert self.cc.from_querys_to_DataFrame(5, query_strs).all().all() == \
             expect_df.all().all()
 
+
+class TestIntervalIndex:
+    """ Unit tests for IntervalIndex. """
+    def setup(self):
+        self.index = IntervalIndex(
+            ['2L', '2R', '2L', '2R'], [20, 21, 1, 25], [30, 31, 10, 35])
+
+    def teardown(self):
+        pass
+
+    def test_find(self):
+        assert self.index.find('2L', 1, 10).tolist() == [2]
+        assert self.index.find('2L', 23, 27).tolist() == [0]
+        assert self.index.find('2R', 25, 30).tolist() == [1, 3]
+        assert self.index.find('2L', 5, 25).tolist() == []
+        assert self.index.find('3L', 1, 10).tolist() == []
+
+    def test_lookup_sorted(self):
+        codes = np.array([0, 0, 0, 1, 2, 2])
+        categories = ['2L', '3L', '2R']
+        starts = np.array([1, 5, 23, 1, 25, 32])
+        ends = np.array([10, 25, 27, 10, 30, 35])
+        assert IntervalIndex.is_sorted(codes, starts)
+        assert not IntervalIndex.is_sorted(codes[::-1], starts[::-1])
+        assert not IntervalIndex.is_sorted(
+            np.array([0, 1, 0]), np.array([1, 2, 3]))
+        assert self.index.lookup_sorted(
+            codes, categories, starts, ends).tolist() == [2, -9, 0, -9, -8, 3]
+        assert self.index.lookup_sorted(
+            codes[:0], categories, starts[:0], ends[:0]).tolist() == []
+        assert self.index.lookup_sorted(
+            codes[:1], categories, starts[:1], ends[:1]).tolist() == [2]
+
+    def test_lookup(self):
+        assert self.index.lookup(
+            ['2L', '2L', '2R', '2L', '3L', '2R'],
+            [1, 23, 25, 5, 1, 32],
+            [10, 27, 30, 25, 10, 35]
+        ).tolist() == [2, 0, -8, -9, -9, 3]
+
+class TestConvertCoordinatesIndex:
+    """ Unit tests for lookups of ConvertCoordinates through IntervalIndex. """
+    def setup(self):
+        df = pd.DataFrame(
+            {
+                'v5_chr': ['2L', '2L', '2L'], 
+                'v5_start': [1, 20, 35], 
+                'v5_end': [10, 30, 45], 
+                'v6_chr': ['2L', '2R', '2R'], 
+                'v6_start': [11, 21, 25], 
+                'v6_end': [20, 31, 35], 
+                'is_inversion': ['+', '+', '-']
+            }
+        )
+        self.cc = ConvertCoordinates(
+            df, 5, 6, 'Test ConvertCoordinates object')
+
+    def teardown(self):
+        pass
+
+    def test_get_rows(self):
+        assert self.cc.get_rows(5, '2L', 23, 27).index.tolist() == [1]
+        assert self.cc.get_rows(6, '2R', 25, 30).index.tolist() == [1, 2]
+        assert self.cc.get_rows(
+            6, '2R', 25, 30, sort_by='v5_start', ascending=False
+        ).index.tolist() == [2, 1]
+        assert len(self.cc.get_rows(5, '3L', 100, 200)) == 0
+
+    def test_convert_coordinate(self):
+        assert self.cc.convert_coordinate(5, '2L:36..40') == \
+            PairedGenomicRanges(
+                [5, 6],
+                [GenomicRange(chromosome='2L', start=36, end=40),
+                GenomicRange(chromosome='2R', start=30, end=34)],
+                True
+            )
+        assert self.cc.convert_coordinate(6, '2R:25..30') == \
+            PairedGenomicRanges(
+                [6, 5],
+                [GenomicRange(chromosome='2R', start=25, end=30),
+                GenomicRange(chromosome=-8, start=-8, end=-8)],
+                -9
+            )
+        assert self.cc.convert_coordinate(5, '2L:5..25') == \
+            PairedGenomicRanges(
+                [5, 6],
+                [GenomicRange(chromosome='2L', start=5, end=25),
+                GenomicRange(chromosome=-9, start=-9, end=-9)],
+                -9
+            )
+
+    def test_convert_arrays(self):
+        query_strs = ['2L:1..10', '2L:36..40', '2L:23..27', '3L:100..200']
+        res = self.cc.convert_arrays(
+            5, ['2L', '2L', '2L', '3L'], [1, 36, 23, 100], [10, 40, 27, 200])
+
+        assert isinstance(res, ConversionResult)
+        assert len(res) == 4
+        assert res['ref_chromosome'].tolist() == ['2L', '2R', '2R', -9]
+        assert res['ref_start'].tolist() == [11, 30, 24, -9]
+        assert res['ref_end'].tolist() == [20, 34, 28, -9]
+        assert res['is_inversion'].tolist() == [0, 1, 0, -9]
+        assert res['name'].tolist() == [0, 2, 1, -9]
+        assert res['conversion_code'].tolist() == [2, 1, 1, 4]
+        for query_str, pair in zip(query_strs, res.iter_pairs()):
+            assert pair == self.cc.convert_coordinate(5, query_str)
+
+        df = pd.DataFrame(
+            {'chromosome': ['2R'], 'start': [25], 'end': [30]})
+        res = self.cc.convert_arrays(6, df)
+        assert res['ref_chromosome'].tolist() == [-8]
+        assert res['conversion_code'].tolist() == [8]
+
+    def test_validate(self):
+        assert len(self.cc.validate()) == 1
+        assert self.cc.validate().loc[0, 'problem'] == 'overlap'
+
+        df = self.cc.df.copy()
+        df.loc[0, 'v6_end'] = 21
+        df.loc[2, 'v5_start'] = 50
+        df.loc[2, 'v6_start'] = -5
+        assert_raises(AssertionError, ConvertCoordinates, df, 5, 6)
+
+        cc = ConvertCoordinates(df, 5, 6, validate=False)
+        report = cc.validate()
+        assert report['position'].tolist() == [0, 1, 2, 2, 2]
+        assert report['version'].tolist() == ['', 6, '', 5, 6]
+        assert report['problem'].tolist() == [
+            'length_mismatch', 'overlap', 'length_mismatch', 'unsorted', 
+            'negative']
+        assert cc.convert_coordinate(5, '2L:1..10').ranges[1].start == 11
+
+        cc = ConvertCoordinates(df, 5, 6, validate='defer')
+        assert_raises(AssertionError, cc.convert_coordinate, 5, '2L:1..10')
+
+    def test_convert_strs(self):
+        query_strs = ['2L:36..40', '2L:1..10', '2L:36..40', '3L:1..2', 
+            '2L:1..10', '2L:36..40']
+        res = self.cc.convert_strs(5, query_strs)
+        expect = self.cc.convert_arrays(
+            5, GenomicRangeArray.from_strs(query_strs))
+        for name in expect:
+            assert np.array_equal(res[name], expect[name])
+
+        df = self.cc.from_querys_to_DataFrame(5, query_strs)
+        assert df['v6_start'].tolist() == [30, 11, 30, -9, 11, 30]
+        assert df.index.tolist() == [2, 0, 2, -9, 0, 2]
+        assert df.columns.tolist() == [
+            'v5_chr', 'v5_start', 'v5_end', 'v6_chr', 'v6_start', 'v6_end', 
+            'is_inversion']
+        assert isinstance(df['v6_chr'].dtype, pd.CategoricalDtype)
+        assert df['v6_start'].dtype == np.int64
+        assert df['is_inversion'].dtype == 'boolean'
+        assert df['v6_chr'].tolist() == ['2R', '2L', '2R', -9, '2L', '2R']
+        assert df['is_inversion'].tolist() == \
+            [True, False, True, pd.NA, False, True]
+
+        # Same values as the rows of PairedGenomicRanges.to_Series
+        expect = pd.concat([
+            pair.to_Series() for pair in self.cc.convert_coordinates(
+                5, GenomicRangeArray.from_strs(query_strs))
+        ], axis=1).T
+        for col in ['v5_chr', 'v5_start', 'v6_chr', 'v6_end']:
+            assert df[col].tolist() == expect[col].tolist()
+
+    def test_convert_sorted(self):
+        query_coords = GenomicRangeArray.from_strs(
+            ['2L:1..10', '2L:23..27', '2L:36..40', '3L:100..200'])
+        expect = self.cc.convert_arrays(5, query_coords)
+        for assume_sorted in (None, True):
+            res = self.cc.convert_sorted(
+                5, query_coords, assume_sorted=assume_sorted)
+            for name in expect:
+                assert np.array_equal(res[name], expect[name])
+
+        # Unsorted queries are converted by convert_arrays
+        res = self.cc.convert_sorted(5, query_coords[::-1])
+        assert res['ref_start'].tolist() == [-9, 30, 24, 11]
+
+        for assume_sorted in (None, True):
+            res = self.cc.convert_sorted(5, [], [], [], assume_sorted)
+            assert len(res) == 0
+            res = self.cc.convert_sorted(
+                5, ['2L'], [1], [10], assume_sorted)
+            assert res['ref_start'].tolist() == [11]
+
+    def test_convert_positions(self):
+        chromosomes = ['2L', '2L', '2L', '2L', '3L']
+        positions = [5, 38, 25, 15, 5]
+        res = self.cc.convert_positions(5, chromosomes, positions)
+        expect = self.cc.convert_arrays(5, chromosomes, positions, positions)
+
+        assert res.position.tolist() == [15, 32, 26, -9, -9]
+        assert res.chromosome.tolist() == ['2L', '2R', '2R', -9, -9]
+        assert res.is_inversion.tolist() == [0, 1, 0, -9, -9]
+        for name, arr in [('ref_start', res.position), 
+                          ('ref_chromosome', res.chromosome), 
+                          ('conversion_code', res.conversion_code)]:
+            assert np.array_equal(arr, expect[name])
+
+class TestConvertCoordinatesChain:
+    """ Unit tests for ConvertCoordinatesChain and ConvertCoordinates.compose. """
+    def setup(self):
+        self.cc45 = ConvertCoordinates(
+            pd.DataFrame(
+                {
+                    'v4_chr': ['2L', '2L'], 
+                    'v4_start': [1, 101], 
+                    'v4_end': [100, 200], 
+                    'v5_chr': ['2L', '2R'], 
+                    'v5_start': [1001, 1], 
+                    'v5_end': [1100, 100], 
+                    'is_inversion': ['+', '-']
+                }
+            ), 4, 5)
+        self.cc56 = ConvertCoordinates(
+            pd.DataFrame(
+                {
+                    'v6_chr': ['2L', '2L', 'X'], 
+                    'v6_start': [1, 51, 1], 
+                    'v6_end': [50, 150, 100], 
+                    'v5_chr': ['2L', '2L', '2R'], 
+                    'v5_start': [1001, 1051, 1], 
+                    'v5_end': [1050, 1150, 100], 
+                    'is_inversion': ['+', '-', '-']
+                }
+            ), 6, 5)
+        self.chain = ConvertCoordinatesChain([self.cc45, self.cc56])
+
+    def teardown(self):
+        pass
+
+    def test_versions(self):
+        assert self.chain.versions == [4, 5, 6]
+        assert len(self.chain) == 2
+        assert_raises(Exception, self.chain.get_hops, 4, 7)
+
+    def test_compose(self):
+        composed = self.chain.compose(4, 6)
+        assert composed.version1 == 4 and composed.version2 == 6
+        assert composed.df.values.tolist() == [
+            ['2L', 1, 50, '2L', 1, 50, '+'], 
+            ['2L', 51, 100, '2L', 101, 150, '-'], 
+            ['2L', 101, 200, 'X', 1, 100, '+'], 
+        ]
+        assert self.chain.compose(4, 6) is composed
+
+    def test_convert(self):
+        query_strs = ['2L:1..10', '2L:60..70', '2L:45..55', '2L:150..160', 
+            '3L:1..10']
+        query_coords = GenomicRangeArray.from_strs(query_strs)
+        for query_version, ref_version in ((4, 6), (6, 4)):
+            res = self.chain.convert_arrays(
+                query_version, ref_version, query_coords)
+            expect = self.chain.compose(query_version, ref_version)\
+                .convert_arrays(query_version, query_coords)
+            for name in ('ref_chromosome', 'ref_start', 'ref_end', 
+                         'is_inversion', 'conversion_code'):
+                assert np.array_equal(res[name], expect[name])
+
+        assert self.chain.convert_coordinate(4, 6, '2L:60..70') == \
+            PairedGenomicRanges(
+                [4, 6],
+                [GenomicRange('2L', 60, 70), GenomicRange('2L', 131, 141)],
+                True
+            )
+        assert self.chain.convert_coordinate(4, 6, '2L:150..160') == \
+            PairedGenomicRanges(
+                [4, 6],
+                [GenomicRange('2L', 150, 160), GenomicRange('X', 50, 60)],
+                False
+            )
+        assert self.chain.convert_coordinate(4, 6, '2L:45..55').ranges[1] \
+            == GenomicRange(-9, -9, -9)
+
+class TestConvertCoordinatesCache:
+    """ Unit tests for the result cache of ConvertCoordinates. """
+    def setup(self):
+        self.cc = ConvertCoordinates(
+            pd.DataFrame(
+                {
+                    'v5_chr': ['2L', '2L'], 
+                    'v5_start': [1, 20], 
+                    'v5_end': [10, 30], 
+                    'v6_chr': ['2L', '2R'], 
+                    'v6_start': [11, 21], 
+                    'v6_end': [20, 31], 
+                    'is_inversion': ['+', '+']
+                }
+            ), 5, 6)
+
+    def teardown(self):
+        pass
+
+    def test_cache(self):
+        assert self.cc.cache_info().maxsize == 0
+        self.cc.enable_cache(maxsize=2)
+        first = self.cc.convert_coordinate(5, '2L:1..10')
+        assert self.cc.convert_coordinate(5, '2L:1..10') == first
+        self.cc.convert_coordinate(5, '2L:21..25')
+        self.cc.convert_coordinate(6, '2L:11..12')
+        assert self.cc.cache_info() == (1, 3, 1, 2, 2)
+
+        # 2L:1..10 was evicted as the least recently used query
+        assert self.cc.convert_coordinate(5, '2L:1..10') is not first
+        assert self.cc.convert_coordinate(5, '2L:1..10') == first
+
+    def test_invalidate(self):
+        self.cc.enable_cache()
+        assert self.cc.convert_coordinate(5, '2L:1..10').ranges[1].start == 11
+
+        df = self.cc.df.copy()
+        df['v6_start'] += 100
+        df['v6_end'] += 100
+        self.cc.df = df
+        assert self.cc.cache_info().currsize == 0
+        assert self.cc.convert_coordinate(5, '2L:1..10').ranges[1].start == 111
+
+    def test_read_only(self):
+        self.cc.enable_cache()
+        # Modifying a returned result does not change cached results
+        self.cc.convert_coordinate(5, '2L:1..10').ranges[1].start = 0
+        assert self.cc.convert_coordinate(5, '2L:1..10').ranges[1].start == 11
+
+        # Neither does modifying df or the DataFrame given to the constructor
+        df = self.cc.df
+        df.loc[0, 'v6_start'] = 111
+        assert self.cc.df.loc[0, 'v6_start'] == 11
+        df = self.cc.df.copy()
+        cc = ConvertCoordinates(df, 5, 6)
+        cc.enable_cache()
+        assert cc.convert_coordinate(5, '2L:1..10').ranges[1].start == 11
+        df.loc[0, 'v6_start'] = 111
+        assert cc.convert_coordinate(5, '2L:1..10').ranges[1].start == 11
+        assert cc.convert_strs(5, ['2L:1..10'])['ref_start'].tolist() == [11]
+
+    def test_methods_do_not_copy(self):
+        # Only the public df getter copies the table
+        from convert_annotation import classes
+        copies = []
+        copy_DataFrame = classes.copy_DataFrame
+        classes.copy_DataFrame = lambda df: copies.append(df) or df
+        try:
+            assert len(self.cc.filter(v5_chr='2L')) == 2
+            assert len(self.cc.filter(v5_start='gte20')) == 1
+            self.cc.head(2), self.cc.tail(1), self.cc[0], self.cc.shape
+            assert copies == []
+            self.cc.df
+            assert len(copies) == 1
+        finally:
+            classes.copy_DataFrame = copy_DataFrame
+
+class TestUpdateSegments:
+    """ Unit tests for incremental edits of ConvertCoordinates. """
+    def setup(self):
+        self.df = pd.DataFrame(
+            {
+                'v5_chr': ['2L', '2L', '2L', '3R'], 
+                'v5_start': [1, 20, 35, 1], 
+                'v5_end': [10, 30, 45, 40], 
+                'v6_chr': ['2L', '2R', '2R', '3R'], 
+                'v6_start': [11, 21, 25, 101], 
+                'v6_end': [20, 31, 35, 140], 
+                'is_inversion': ['+', '+', '-', '+']
+            }
+        )
+        self.cc = ConvertCoordinates(self.df, 5, 6)
+
+    def teardown(self):
+        pass
+
+    def assert_same_as_rebuilt(self):
+        rebuilt = ConvertCoordinates(self.cc.df.copy(), 5, 6)
+        for version in (5, 6):
+            index, expect = self.cc.indices[version], rebuilt.indices[version]
+            assert set(index) == set(expect)
+            for chromosome in expect:
+                for field in ('starts', 'ends', 'max_ends', 'rows'):
+                    assert np.array_equal(
+                        getattr(index[chromosome], field), 
+                        getattr(expect[chromosome], field))
+
+    def test_update_segments(self):
+        self.cc.enable_cache()
+        assert self.cc.convert_coordinate(5, '2L:36..40').ranges[1].start == 30
+        segment = {
+            'v5_chr': ['2L'], 'v5_start': [35], 'v5_end': [45], 
+            'v6_chr': ['4'], 'v6_start': [1], 'v6_end': [11], 
+            'is_inversion': [False]
+        }
+        self.cc.replace_segments([2], segment)
+        assert self.cc.cache_info().currsize == 0
+        assert self.cc.convert_coordinate(5, '2L:36..40').ranges[1] == \
+            GenomicRange('4', 2, 6)
+        self.assert_same_as_rebuilt()
+
+        self.cc.delete_segments([0])
+        assert self.cc.df.index.tolist() == [1, 2, 3]
+        assert self.cc.convert_strs(5, ['2L:1..10'])['ref_start'][0] == -9
+        assert self.cc.convert_strs(5, ['3R:1..10'])['name'][0] == 3
+        self.assert_same_as_rebuilt()
+
+        segment['v5_start'], segment['v5_end'] = [1], [11]
+        self.cc.insert_segments(segment)
+        assert self.cc.df.index.tolist() == [1, 2, 3, 4]
+        assert self.cc.df['v6_chr'].tolist() == ['2R', '4', '3R', '4']
+        assert self.cc.convert_strs(5, ['2L:1..10'])['name'][0] == 4
+        self.assert_same_as_rebuilt()
+
+        # Segments of different lengths are rejected without changes
+        segment['v6_end'] = [12]
+        assert_raises(AssertionError, self.cc.insert_segments, segment)
+        assert_raises(
+            AssertionError, self.cc.update_segments, delete=[0], replace=[0], 
+            replacements=self.cc.df.iloc[[0]])
+        assert len(self.cc) == 4
+
+    def test_apply_patch(self):
+        def make_patch(new_name):
+            patch = MapPatch(6, 5)
+            patch.delete(1)
+            patch.replace(3, ('3R', 101, 110, '3R', 1, 10, '-'))
+            patch.insert(new_name, ('2R', 1, 10, '2L', 50, 59, '+'))
+            return patch
+
+        patch = make_patch('new')
+        assert_raises(AssertionError, patch.delete, 'new')
+        assert len(patch) == 3
+        # Names of an integer-named table must be integers
+        assert_raises(Exception, self.cc.apply_patch, patch)
+
+        self.cc.apply_patch(make_patch(7))
+        assert self.cc.df.index.tolist() == [0, 2, 3, 7]
+        assert self.cc.df.loc[3, 'v6_end'] == 110
+        assert self.cc.df.loc[7, 'v5_start'] == 50
+        self.assert_same_as_rebuilt()
+
+        patch = MapPatch(5, 6)
+        patch.delete(1)
+        assert_raises(Exception, self.cc.apply_patch, patch)
+
+    def test_insert_existing_name(self):
+        segment = {
+            'v5_chr': ['2L'], 'v5_start': [50], 'v5_end': [59], 
+            'v6_chr': ['4'], 'v6_start': [1], 'v6_end': [10], 
+            'is_inversion': ['+']
+        }
+        assert_raises(
+            AssertionError, self.cc.insert_segments, segment, names=[1])
+        patch = MapPatch(5, 6)
+        patch.insert(3, tuple(v[0] for v in segment.values()))
+        assert_raises(AssertionError, self.cc.apply_patch, patch)
+        segment = {name: values * 2 for name, values in segment.items()}
+        assert_raises(
+            AssertionError, self.cc.insert_segments, segment, names=[8, 8])
+        assert self.cc.df.index.tolist() == [0, 1, 2, 3]
+
+        # A name is free again once its row is deleted
+        self.cc.update_segments(delete=[1], insertions=segment, names=[1, 8])
+        assert self.cc.df.index.tolist() == [0, 2, 3, 1, 8]
+        assert self.cc.get_positions([1, 8]).tolist() == [3, 4]
@@ -0,0 +1,283 @@
+""" Nose tests for functions and classes in formatter module. """
+import os
+import tempfile
+from unittest import SkipTest
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from convert_annotation.classes import ConvertCoordinates, GenomicRange, \
+    GenomicRangeArray, get_conversion_codes
+from convert_annotation.formatter import ResultWriter, ArrowResultWriter, \
+    get_ResultWriter, summarize_conversion_codes, \
+    concat_list_of_PairedGenomicRanges_to_DataFrame, \
+    from_GenomicRange_list_to_DataFrame
+
+QueryResult = namedtuple('QueryResult', ['query', 'reference'])
+
+def get_conversion_code(query, reference, multiple=False):
+    """ Scalar reference of get_conversion_codes. 0: same coordinates, 
+    1: chromosome changed, 2: start changed on the same chromosome, 
+    4: not found, 8: multiple segments found. """
+    code = 0
+    # If multiple segments found
+    if multiple:
+        code += 8
+    # If query coord was found in conversion table
+    elif reference.start != -9:
+        # If segment coordinate changed to different chromosome
+        if query.chromosome != reference.chromosome:
+            code += 1
+        # If segment coordinate was different on the same chromosome
+        elif query.start != reference.start:
+            code += 2
+    # If query segment coord was not found in conversion table
+    else:
+        code += 4
+
+    return code
+
+def from_PairedGenomicRanges_to_DataFrame(paired_gen_coord):
+    """ Per-pair reference of concat_list_of_PairedGenomicRanges_to_DataFrame 
+    for objects with query and reference attributes. """
+    matched_df = from_GenomicRange_list_to_DataFrame(
+        paired_gen_coord.reference)
+    
+    matched_df.rename(
+        columns={
+            'chromosome': 'ref_chromosome',
+            'start': 'ref_start',
+            'end': 'ref_end',
+            'version': 'ref_version'
+        }, 
+        inplace=True)
+    
+    matched_df['query_chromosome'] = paired_gen_coord.query.chromosome
+    matched_df['query_start'] = paired_gen_coord.query.start
+    matched_df['query_end'] = paired_gen_coord.query.end
+    matched_df['query_version'] = paired_gen_coord.query.version
+
+    code = 0
+    if len(matched_df.index) == 1:
+        # If query coord was found in conversion table
+        if paired_gen_coord.reference[0].start != -9:
+            # If segment coordinate changed to different chromosome
+            if paired_gen_coord.query.chromosome != \
+                    paired_gen_coord.reference[0].chromosome:
+                code += 1
+            # If segment coordinate was different on the same chromosome
+            elif paired_gen_coord.query.start != \
+                    paired_gen_coord.reference[0].start:
+                code += 2
+
+        # If query segment coord was not found in conversion table
+        else:
+            code += 4
+
+    # If multiple segments found
+    elif len(matched_df.index) > 1:
+        code += 8
+
+    matched_df['conversion_code'] = code
+
+    columns_order = [
+        'query_chromosome', 'query_start', 'query_end', 'query_version',
+        'ref_chromosome', 'ref_start', 'ref_end', 'ref_version', 
+        'conversion_code'
+    ]
+
+    return matched_df.loc[:, columns_order]
+
+def concat_list_of_PairedGenomicRanges_to_DataFrame_reference(
+        paired_gen_coord_list):
+    """ Reference implementation of 
+    concat_list_of_PairedGenomicRanges_to_DataFrame that converts each pair 
+    by from_PairedGenomicRanges_to_DataFrame. """
+    concat_list = []
+
+    for i, paired_gen_coord in enumerate(paired_gen_coord_list):
+        tmp_df = from_PairedGenomicRanges_to_DataFrame(paired_gen_coord)
+        tmp_df['pair_id'] = i+1
+
+        concat_list.append(tmp_df)
+
+    return pd.concat(concat_list).reset_index(drop=True)
+
+class TestResultWriter:
+    """ Unit tests for ResultWriter. """
+    def setup(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cc = ConvertCoordinates(
+            pd.DataFrame(
+                {
+                    'v5_chr': ['2L', '2L', '2L'], 
+                    'v5_start': [1, 20, 35], 
+                    'v5_end': [10, 30, 45], 
+                    'v6_chr': ['2L', '2R', '2R'], 
+                    'v6_start': [1, 21, 25], 
+                    'v6_end': [10, 31, 35], 
+                    'is_inversion': ['+', '+', '-']
+                }
+            ), 5, 6)
+        self.query_strs = [
+            '2L:1..10', '2L:2..5', '2L:36..40', '2L:23..27', '3L:100..200']
+
+    def teardown(self):
+        self.tmpdir.cleanup()
+
+    def read(self, name):
+        with open(os.path.join(self.tmpdir.name, name)) as f:
+            return f.read()
+
+    def test_append_and_append_result(self):
+        with ResultWriter(
+                os.path.join(self.tmpdir.name, 'pairs.csv'), chunksize=2) \
+                as writer:
+            for query_str in self.query_strs:
+                writer.append(self.cc.convert_coordinate(5, query_str))
+
+        query_coords = self.cc.from_query_strs_to_query_coords(self.query_strs)
+        with ResultWriter(
+                os.path.join(self.tmpdir.name, 'result.csv'), chunksize=3) \
+                as writer:
+            for i in range(0, 5, 2):
+                coords = query_coords[i:i+2]
+                writer.append_result(self.cc.convert_arrays(
+                    5, [c.chromosome for c in coords], 
+                    [c.start for c in coords], [c.end for c in coords]))
+
+        assert self.read('pairs.csv') == self.read('result.csv')
+
+        out_df = pd.read_csv(
+            os.path.join(self.tmpdir.name, 'result.csv'), index_col=0)
+        assert out_df.columns.tolist() == ResultWriter.columns_order
+        assert out_df['conversion_code'].tolist() == [0, 0, 1, 1, 4]
+        assert out_df['pair_id'].tolist() == [1, 2, 3, 4, 5]
+
+    def test_arrow(self):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise SkipTest('pyarrow is not installed.')
+
+        result = self.cc.convert_strs(5, self.query_strs)
+        csv_path = os.path.join(self.tmpdir.name, 'result.csv')
+        with get_ResultWriter(csv_path) as writer:
+            writer.append_result(result)
+        expect = pd.read_csv(csv_path, index_col=0)
+
+        # sep is used whether or not the format is given explicitly
+        for out_format in (None, 'csv'):
+            with get_ResultWriter(csv_path, out_format, sep='|') as writer:
+                writer.append_result(result)
+            assert pd.read_csv(csv_path, sep='|', index_col=0).equals(expect)
+
+        for name in ('result.parquet', 'result.feather', 'result.arrow'):
+            path = os.path.join(self.tmpdir.name, name)
+            with get_ResultWriter(path, chunksize=2) as writer:
+                assert isinstance(writer, ArrowResultWriter)
+                writer.append_result(result.take([0, 1, 2]))
+                writer.append_result(result.take([3, 4]))
+
+            if name.endswith('.parquet'):
+                table = pd.read_parquet(path)
+            else:
+                with pa.memory_map(path) as source:
+                    arrow_table = pa.ipc.open_file(source).read_all()
+                assert arrow_table.num_rows == 5
+                assert pa.types.is_dictionary(
+                    arrow_table.schema.field('ref_chromosome').type)
+                table = arrow_table.to_pandas()
+
+            assert table.columns.tolist() == ResultWriter.columns_order
+            for col in ResultWriter.columns_order:
+                assert table[col].astype(str).tolist() == \
+                    expect[col].astype(str).tolist()
+
+    def test_summarize_conversion_codes(self):
+        result = self.cc.convert_strs(5, self.query_strs)
+        table = summarize_conversion_codes(result)
+
+        assert table.index.tolist() == ['2L', '3L']
+        assert table.columns.tolist() == [
+            'same', 'chromosome_changed', 'shifted', 'not_found', 'multiple', 
+            'total']
+        assert table.loc['2L'].tolist() == [2, 2, 0, 0, 0, 4]
+        assert table.loc['3L'].tolist() == [0, 0, 0, 1, 0, 1]
+
+        table = summarize_conversion_codes(result, by='ref_chromosome')
+        assert table['total'].sum() == 5
+
+    def test_same_as_DataFrame(self):
+        pairs = [
+            QueryResult(
+                GenomicRange('2L', 1, 10, 5), 
+                [GenomicRange('2L', 1, 10, 6)]),
+            QueryResult(
+                GenomicRange('2L', 1, 10, 5), 
+                [GenomicRange('2R', 1, 10, 6)]),
+            QueryResult(
+                GenomicRange('2L', 1, 10, 5), 
+                [GenomicRange('2L', 5, 14, 6)]),
+            QueryResult(
+                GenomicRange('2L', 1, 10, 5), 
+                [GenomicRange(-9, -9, -9, 6)]),
+            QueryResult(
+                GenomicRange('2L', 1, 10, 5), 
+                [GenomicRange('2L', 5, 14, 6), 
+                 GenomicRange('2R', 1, 10, 6)]),
+        ]
+        df = concat_list_of_PairedGenomicRanges_to_DataFrame(pairs)
+        pd.testing.assert_frame_equal(
+            df, concat_list_of_PairedGenomicRanges_to_DataFrame_reference(pairs))
+        assert df['conversion_code'].tolist() == [0, 1, 2, 4, 8, 8]
+
+        path = os.path.join(self.tmpdir.name, 'out.csv')
+        df.to_csv(path)
+        expect = self.read('out.csv')
+
+        with ResultWriter(path, chunksize=4) as writer:
+            writer.extend(pairs)
+        
+        assert self.read('out.csv') == expect
+
+        with ResultWriter(path, chunksize=4) as writer:
+            for pair in pairs:
+                writer.append(pair)
+        
+        assert self.read('out.csv') == expect
+
+    def test_get_conversion_codes(self):
+        query = GenomicRange('2L', 1, 10, 5)
+        refs = [
+            GenomicRange('2L', 1, 10, 6), GenomicRange('2R', 1, 10, 6),
+            GenomicRange('2L', 5, 14, 6), GenomicRange(-9, -9, -9, 6),
+            GenomicRange('2R', 5, 14, 6), GenomicRange(-8, -8, -8, 6),
+        ]
+        multiple = [False, False, False, False, True, True]
+        expect = [
+            get_conversion_code(query, ref, is_multiple) 
+            for ref, is_multiple in zip(refs, multiple)]
+        codes = get_conversion_codes(
+            np.array([query.chromosome] * len(refs), dtype=object), 
+            [query.start] * len(refs), 
+            np.array([ref.chromosome for ref in refs], dtype=object), 
+            [ref.start for ref in refs], multiple)
+
+        assert codes.tolist() == expect == [0, 1, 2, 4, 8, 8]
+        assert len(get_conversion_codes([], [], [], [], [])) == 0
+
+class TestFromGenomicRangeList:
+    """ Unit tests for from_GenomicRange_list_to_DataFrame. """
+    def test_GenomicRangeArray(self):
+        gen_ranges = [
+            GenomicRange('2L', 1, 10, 5), GenomicRange('3R', 5, 6, 5)]
+        expect = from_GenomicRange_list_to_DataFrame(gen_ranges)
+        df = from_GenomicRange_list_to_DataFrame(
+            GenomicRangeArray.from_strs(['2L:1..10', '3R:5..6'], version=5))
+
+        assert df.equals(expect)
+
+        # The version can be given for ranges without one
+        df = from_GenomicRange_list_to_DataFrame(
+            [GenomicRange('2L', 1, 10), GenomicRange('3R', 5, 6)], version=5)
+        assert df.equals(expect)
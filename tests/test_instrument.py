@@ -0,0 +1,53 @@
+""" Nose tests for instrumentation of conversion runs. """
+import os
+import json
+import tempfile
+import numpy as np
+from convert_annotation.instrument import RunStats, NULL_STATS, JSONSink, \
+    format_summary
+
+class TestRunStats:
+    """ Unit tests for RunStats and sinks. """
+    def setup(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.received = []
+        self.json_path = os.path.join(self.tmpdir.name, 'stats.json')
+        self.stats = RunStats([self.received.append, JSONSink(self.json_path)])
+
+    def teardown(self):
+        self.tmpdir.cleanup()
+
+    def test_stage(self):
+        with self.stats.stage('convert'):
+            pass
+        with self.stats.stage('convert'):
+            pass
+        assert list(self.stats.stages) == ['convert']
+        assert self.stats.stages['convert'] >= 0
+
+        assert list(self.stats.iter_stage('parse_queries', [1, 2])) == [1, 2]
+        assert 'parse_queries' in self.stats.stages
+
+    def test_emit(self):
+        self.stats.count_result({'conversion_code': np.array([0, 2, 2, 4, 8])})
+        self.stats.count_result({'conversion_code': np.array([1])})
+        with self.stats.stage('convert'):
+            pass
+        summary = self.stats.emit()
+
+        assert self.received == [summary]
+        assert summary['n_queries'] == 6
+        assert summary['conversion_codes'] == {
+            'same': 1, 'chromosome_changed': 1, 'shifted': 2, 
+            'not_found': 1, 'multiple': 1, 'found': 4}
+        with open(self.json_path) as f:
+            assert json.load(f)['conversion_codes'] == \
+                summary['conversion_codes']
+        assert format_summary(summary).startswith('6 queries in ')
+
+    def test_null_stats(self):
+        with NULL_STATS.stage('convert'):
+            pass
+        items = [1, 2]
+        assert NULL_STATS.iter_stage('parse_queries', items) is items
+        assert NULL_STATS.emit() == {}
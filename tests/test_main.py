@@ -0,0 +1,151 @@
+""" Nose tests for main function. """
+import os
+import sys
+import tempfile
+import subprocess
+import pandas as pd
+from nose.tools import assert_raises
+import convert_annotation
+from convert_annotation.main import main
+from convert_annotation.instrument import RunStats
+from convert_annotation.read import compile_map
+from convert_annotation.__main__ import run, parse_address
+
+class TestMain:
+    """ Unit tests for main. """
+    def setup(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.map_path = os.path.join(self.tmpdir.name, 'map.csv')
+        self.query_path = os.path.join(self.tmpdir.name, 'query.txt')
+        self.out_path = os.path.join(self.tmpdir.name, 'out.csv')
+
+        pd.DataFrame(
+            {
+                'v5_chr': ['2L', '2L', '2L'], 
+                'v5_start': [1, 20, 35], 
+                'v5_end': [10, 30, 45], 
+                'v6_chr': ['2L', '2R', '2R'], 
+                'v6_start': [11, 21, 25], 
+                'v6_end': [20, 31, 35], 
+                'is_inversion': ['+', '+', '-']
+            }
+        ).to_csv(self.map_path, index=False)
+        with open(self.query_path, 'w') as f:
+            f.write('itemnum: 4\n2L:1..10\n2L:36..40\n2L:23..27\n3L:100..200\n')
+
+    def teardown(self):
+        self.tmpdir.cleanup()
+
+    def test_main(self):
+        main(self.map_path, 5, 6, self.query_path, self.out_path, chunksize=3)
+        out_df = pd.read_csv(self.out_path, index_col=0)
+
+        assert out_df.columns.tolist() == [
+            'query_chromosome', 'query_start', 'query_end', 'query_version',
+            'ref_chromosome', 'ref_start', 'ref_end', 'ref_version', 
+            'conversion_code', 'pair_id']
+        assert out_df.index.tolist() == [0, 1, 2, 3]
+        assert out_df['ref_start'].tolist() == [11, 30, 24, -9]
+        assert out_df['ref_end'].tolist() == [20, 34, 28, -9]
+        assert out_df['conversion_code'].tolist() == [2, 1, 1, 4]
+        assert out_df['pair_id'].tolist() == [1, 2, 3, 4]
+
+    def test_main_stats(self):
+        received = []
+        for workers in (1, 2):
+            main(
+                self.map_path, 5, 6, self.query_path, self.out_path, 
+                workers=workers, stats=RunStats([received.append]), 
+                chunksize=3)
+            summary = received[-1]
+            assert summary['n_queries'] == 4
+            assert summary['conversion_codes']['shifted'] == 1
+            assert summary['conversion_codes']['chromosome_changed'] == 2
+            assert summary['conversion_codes']['not_found'] == 1
+            assert set(summary['stages']) == \
+                {'load_map', 'parse_queries', 'convert', 'write'}
+
+    def test_main_workers(self):
+        main(self.map_path, 5, 6, self.query_path, self.out_path, chunksize=3)
+        with open(self.out_path) as f:
+            expect = f.read()
+
+        main(
+            self.map_path, 5, 6, self.query_path, self.out_path, 
+            workers=2, chunksize=1)
+        with open(self.out_path) as f:
+            assert f.read() == expect
+
+        with open(self.query_path, 'a') as f:
+            f.write('2L:1..2\n')
+        assert_raises(
+            AssertionError, main, self.map_path, 5, 6, self.query_path, 
+            self.out_path, workers=2, chunksize=1)
+
+    def test_main_via(self):
+        map_path2 = os.path.join(self.tmpdir.name, 'map2.csv')
+        pd.DataFrame(
+            {
+                'v6_chr': ['2L', '2R'], 
+                'v6_start': [1, 1], 
+                'v6_end': [100, 100], 
+                'v7_chr': ['2L', '3R'], 
+                'v7_start': [101, 1], 
+                'v7_end': [200, 100], 
+                'is_inversion': ['+', '+']
+            }
+        ).to_csv(map_path2, index=False)
+        cache_path = os.path.join(self.tmpdir.name, 'map57')
+
+        for _ in range(2): # the second run loads the cached composed map
+            main(
+                [self.map_path, map_path2], 5, 7, self.query_path, 
+                self.out_path, via=[6], map_cache_path=cache_path)
+            out_df = pd.read_csv(self.out_path, index_col=0)
+            assert out_df['ref_chromosome'].tolist() == ['2L', '3R', '3R', '-9']
+            assert out_df['ref_start'].tolist() == [111, 30, 24, -9]
+            assert out_df['ref_version'].tolist() == [7, 7, 7, 7]
+
+    def test_run(self):
+        main(self.map_path, 5, 6, self.query_path, self.out_path)
+        with open(self.out_path) as f:
+            expect = f.read()
+
+        compiled_path = os.path.join(self.tmpdir.name, 'map56')
+        compile_map(self.map_path, 5, 6, compiled_path)
+        for map_path in (self.map_path, compiled_path):
+            run([map_path, '5', '6', self.query_path, self.out_path, 
+                 '--chunksize', '3'])
+            with open(self.out_path) as f:
+                assert f.read() == expect
+
+        run([self.map_path, '5', '6', self.query_path, self.out_path, 
+             '--sep', '\\t'])
+        with open(self.out_path) as f:
+            assert f.read() == expect.replace(',', '\t')
+
+        assert parse_address('localhost:8000') == ('localhost', 8000)
+        assert parse_address('/tmp/server.sock') == '/tmp/server.sock'
+
+    def test_run_without_pandas(self):
+        # Converting with a compiled map must not import pandas
+        compiled_path = os.path.join(self.tmpdir.name, 'map56')
+        compile_map(self.map_path, 5, 6, compiled_path)
+        code = (
+            'import sys\n'
+            'from convert_annotation.__main__ import run\n'
+            'from convert_annotation import main, server, parallel\n'
+            'assert "pandas" not in sys.modules\n'
+            f'run([{compiled_path!r}, "5", "6", {self.query_path!r}, '
+            f'{self.out_path!r}])\n'
+            'assert "pandas" not in sys.modules\n'
+        )
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(
+            os.path.dirname(os.path.abspath(convert_annotation.__file__))))
+        # The subprocess fails if any assertion fails
+        subprocess.run(
+            [sys.executable, '-c', code], env=env, capture_output=True, 
+            check=True)
+
+        assert pd.read_csv(self.out_path)['ref_start'].tolist() == \
+            [11, 30, 24, -9]
@@ -0,0 +1,68 @@
+""" Nose tests for functions in parallel module. """
+import time
+import numpy as np
+import pandas as pd
+from convert_annotation.classes import ConvertCoordinates, GenomicRangeArray
+from convert_annotation.instrument import RunStats
+from convert_annotation.parallel import convert_parallel, get_pool, imap_convert
+
+class TestConvertParallel:
+    """ Unit tests for convert_parallel. """
+    def setup(self):
+        self.cc = ConvertCoordinates(
+            pd.DataFrame(
+                {
+                    'v5_chr': ['2L', '2L', '2L'], 
+                    'v5_start': [1, 20, 35], 
+                    'v5_end': [10, 30, 45], 
+                    'v6_chr': ['2L', '2R', '2R'], 
+                    'v6_start': [11, 21, 25], 
+                    'v6_end': [20, 31, 35], 
+                    'is_inversion': ['+', '+', '-']
+                }
+            ), 5, 6)
+        self.query_coords = GenomicRangeArray.from_strs(
+            ['2L:1..10', '2L:36..40', '2L:23..27', '3L:100..200', '2L:2..3'] 
+            * 5)
+
+    def teardown(self):
+        pass
+
+    def test_convert_parallel(self):
+        expect = self.cc.convert_arrays(5, self.query_coords)
+        res = convert_parallel(self.cc, 5, self.query_coords, workers=3)
+
+        assert len(res) == len(expect)
+        for name in expect:
+            assert np.array_equal(res[name], expect[name])
+
+    def test_imap_convert(self):
+        read = []
+        def chunks():
+            for i in range(9):
+                read.append(i)
+                yield ['2L:1..10', f'2L:{i + 1}..{i + 2}']
+
+        with get_pool(self.cc, 5, 2) as pool:
+            results = imap_convert(pool, chunks(), max_pending=3)
+            for i, result in enumerate(results):
+                # Chunks are read only a bounded window ahead of results
+                assert len(read) <= i + 3
+                assert result['ref_start'].tolist() == [11, i + 11]
+        assert i == 8
+
+    def test_imap_convert_stats(self):
+        def chunks():
+            for i in range(3):
+                time.sleep(0.1)
+                yield ['2L:1..10']
+
+        # Reading chunks is timed apart from waiting for workers
+        stats = RunStats()
+        with get_pool(self.cc, 5, 2) as pool:
+            results = list(imap_convert(
+                pool, stats.iter_stage('parse_queries', chunks()), 
+                max_pending=2, stats=stats))
+        assert len(results) == 3
+        assert stats.stages['parse_queries'] >= 0.3
+        assert stats.stages['convert'] < 0.3
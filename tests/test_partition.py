@@ -0,0 +1,117 @@
+""" Nose tests for partitioned maps. """
+import os
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from nose.tools import assert_raises
+from convert_annotation.read import from_CSV_to_ConvertCoordinates
+from convert_annotation.partition import partition_map, \
+    load_partitioned_map, read_partitioned_header
+from convert_annotation.main import load_map
+
+class TestPartitionedMap:
+    """ Unit tests for partition_map and PartitionedConvertCoordinates. """
+    def setup(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.map_path = os.path.join(self.tmpdir.name, 'map.csv')
+        self.out_path = os.path.join(self.tmpdir.name, 'map56')
+        pd.DataFrame(
+            {
+                'v5_chr': ['2L', '2L', '2L', '3R', '3R'],
+                'v5_start': [20, 1, 35, 1, 50],
+                'v5_end': [30, 10, 45, 40, 60],
+                'v6_chr': ['2R', '2L', '2R', '3R', '2L'],
+                'v6_start': [21, 11, 25, 101, 200],
+                'v6_end': [31, 20, 35, 140, 210],
+                'is_inversion': ['+', '+', '-', '+', '-']
+            }
+        ).to_csv(self.map_path, index=False)
+        partition_map(self.map_path, 5, 6, self.out_path)
+        self.cc = from_CSV_to_ConvertCoordinates(self.map_path, 5, 6)
+        self.querys = [
+            '2L:1..10', '3R:55..58', '2L:36..40', '4:1..2', '2L:23..27',
+            '3R:5..9', '2L:1..10']
+
+    def teardown(self):
+        self.tmpdir.cleanup()
+
+    def test_partition_map(self):
+        header = read_partitioned_header(self.out_path)
+        assert header['versions'] == [5, 6]
+        assert header['n_rows'] == 5
+        assert header['chromosomes'] == {'5': ['2L', '3R'], '6': ['2R', '2L', '3R']}
+        assert header['bounds'] == {'5': [0, 3, 5], '6': [0, 2, 4, 5]}
+        assert read_partitioned_header(self.tmpdir.name) is None
+
+        pc = load_partitioned_map(self.out_path)
+        assert (pc.version1, pc.version2, len(pc)) == (5, 6, 5)
+        assert_raises(Exception, load_partitioned_map, self.out_path, 5, 7)
+        assert isinstance(
+            load_map(self.out_path, 5, 6), type(pc))
+
+    def test_convert(self):
+        pc = load_partitioned_map(self.out_path, 5, 6)
+        for version, querys in [(5, self.querys), (6, ['2L:205..206', '2R:30..33'])]:
+            expect = self.cc.convert_strs(version, querys)
+            result = pc.convert_strs(version, querys)
+            for name in expect.column_names:
+                assert np.array_equal(result[name], expect[name]), name
+            for query in querys:
+                assert pc.convert_coordinate(version, query) == \
+                    self.cc.convert_coordinate(version, query)
+
+        result = pc.convert_positions(5, ['2L', '3R', '4'], [25, 55, 1])
+        assert result.chromosome.tolist() == ['2R', '2L', -9]
+        assert result.position.tolist() == [26, 205, -9]
+        assert result.conversion_code.tolist() == [1, 1, 4]
+        # Rows refer to the original table as in ConvertCoordinates
+        assert result.row.tolist() == [0, 4, -9]
+        for version, chromosomes, positions in [
+                (5, ['2L', '2L', '3R', '4', '2L'], [5, 40, 1, 1, 25]),
+                (6, ['2R', '2R', '2L', '3R'], [21, 30, 15, 120])]:
+            expect = self.cc.convert_positions(version, chromosomes, positions)
+            result = pc.convert_positions(version, chromosomes, positions)
+            for name in expect._fields:
+                assert np.array_equal(
+                    getattr(result, name), getattr(expect, name)), name
+
+    def test_lazy_loading(self):
+        pc = load_partitioned_map(self.out_path, 5, 6)
+        assert pc.partition_info().loaded == 0
+        pc.convert_strs(5, ['2L:1..10', '4:1..2'])
+        assert pc.partition_info().loaded == 1
+        pc.convert_strs(5, ['3R:5..9'])
+        info = pc.partition_info()
+        assert (info.loads, info.evictions, info.loaded) == (2, 0, 2)
+
+        # Only the most recently used chromosome is kept within a small budget
+        pc = load_partitioned_map(self.out_path, 5, 6, memory_budget=1)
+        for query in ['2L:1..10', '3R:5..9', '2L:1..10']:
+            pc.convert_strs(5, [query])
+        info = pc.partition_info()
+        assert (info.loads, info.evictions, info.loaded) == (3, 2, 1)
+        assert list(pc._partitions) == [(5, '2L')]
+
+    def test_threads(self):
+        # Loads and evictions from many threads keep results and sizes right
+        pc = load_partitioned_map(self.out_path, 5, 6, memory_budget=1)
+        expect = self.cc.convert_strs(5, self.querys)
+        errors = []
+        def run():
+            try:
+                for _ in range(50):
+                    result = pc.convert_strs(5, self.querys)
+                    assert result['ref_start'].tolist() == \
+                        expect['ref_start'].tolist()
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        info = pc.partition_info()
+        assert info.loaded == 1 and info.loads == info.evictions + 1
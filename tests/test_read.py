@@ -0,0 +1,243 @@
+""" Nose tests for functions in read module. """
+import os
+import gzip
+import tempfile
+import numpy as np
+import pandas as pd
+from nose.tools import assert_raises
+from convert_annotation.read import iter_query_chunks, parse_query_list, \
+    parse_chain, from_chain_to_ConvertCoordinates, \
+    from_CSV_to_ConvertCoordinates, compile_map, load_compiled_map, \
+    read_compiled_header, file_sha1, is_compiled_map_current, write_patch, \
+    read_patch, patch_compiled_map
+from convert_annotation.classes import MapPatch, CategoricalArray
+
+class TestParseQueryList:
+    """ Unit tests for iter_query_chunks and parse_query_list. """
+    def setup(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'query.txt')
+        with open(self.path, 'w') as f:
+            f.write('/* test queries */\nitemnum: 5\n')
+            f.write('2L:1..10\n2L:23..27\n3L:100..200\n2R:5..9\n2R:1..2\n')
+
+    def teardown(self):
+        self.tmpdir.cleanup()
+
+    def test_parse_query_list(self):
+        assert parse_query_list(self.path) == [
+            '2L:1..10', '2L:23..27', '3L:100..200', '2R:5..9', '2R:1..2']
+
+    def test_iter_query_chunks(self):
+        assert list(iter_query_chunks(self.path, chunksize=2)) == [
+            ['2L:1..10', '2L:23..27'], ['3L:100..200', '2R:5..9'], ['2R:1..2']]
+
+    def test_wrong_itemnum(self):
+        with open(self.path, 'a') as f:
+            f.write('X:1..2\n')
+        chunks = iter_query_chunks(self.path, chunksize=2)
+        # Item number is checked only after the last chunk
+        assert len(next(chunks)) == 2
+        assert_raises(AssertionError, list, chunks)
+        assert_raises(AssertionError, parse_query_list, self.path)
+
+class TestCompiledMap:
+    """ Unit tests for compile_map and load_compiled_map. """
+    def setup(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmpdir.name, 'map.csv')
+        self.map_path = os.path.join(self.tmpdir.name, 'map')
+        pd.DataFrame(
+            {
+                'v5_chr': ['2L', '2L', '2L'], 
+                'v5_start': [1, 20, 35], 
+                'v5_end': [10, 30, 45], 
+                'v6_chr': ['2L', '2R', '2R'], 
+                'v6_start': [11, 21, 25], 
+                'v6_end': [20, 31, 35], 
+                'is_inversion': ['+', '+', '-']
+            }
+        ).to_csv(self.csv_path, index=False)
+
+    def teardown(self):
+        self.tmpdir.cleanup()
+
+    def test_load_compiled_map(self):
+        compile_map(self.csv_path, 5, 6, self.map_path, 'test map')
+        header = read_compiled_header(self.map_path)
+        assert header['versions'] == [5, 6]
+        assert header['source_sha1'] == file_sha1(self.csv_path)
+
+        cc = from_CSV_to_ConvertCoordinates(self.csv_path, 5, 6)
+        compiled = load_compiled_map(self.map_path)
+        assert compiled.description == 'test map'
+        assert compiled.version1 == 5 and compiled.version2 == 6
+
+        # Chromosomes stay as codes and are decoded for the rows looked up
+        chromosomes = compiled.get_arrays(6)[0]
+        assert isinstance(chromosomes, CategoricalArray)
+        assert chromosomes[np.array([2, 0])].tolist() == ['2R', '2L']
+        assert chromosomes[1] == '2R' and chromosomes.tolist() == \
+            cc.df['v6_chr'].tolist()
+        assert compiled.get_inversions().tolist() == [False, False, True]
+
+        assert compiled.df.index.tolist() == [0, 1, 2]
+        assert compiled.df['is_inversion'].tolist() == ['+', '+', '-']
+        assert compiled.get_rows(6, '2R', 25, 30).index.tolist() == [1, 2]
+
+        query_strs = ['2L:1..10', '2L:36..40', '2L:23..27', '3L:100..200']
+        for query_str in query_strs:
+            assert compiled.convert_coordinate(5, query_str) == \
+                cc.convert_coordinate(5, query_str)
+        expect = cc.convert_arrays(
+            6, ['2L', '2R', '2R'], [11, 30, 25], [15, 31, 30])
+        res = compiled.convert_arrays(
+            6, ['2L', '2R', '2R'], [11, 30, 25], [15, 31, 30])
+        for name in expect:
+            assert np.array_equal(res[name], expect[name])
+
+        assert_raises(Exception, load_compiled_map, self.map_path, 4, 6)
+
+    def test_cache_path(self):
+        cc = from_CSV_to_ConvertCoordinates(
+            self.csv_path, 5, 6, cache_path=self.map_path)
+        assert read_compiled_header(self.map_path) is not None
+        assert cc.convert_coordinate(5, '2L:1..10').ranges[1].start == 11
+
+        # The map is compiled again when the CSV file changes
+        df = pd.read_csv(self.csv_path)
+        df['v6_start'] += 1
+        df['v6_end'] += 1
+        df.to_csv(self.csv_path, index=False)
+        cc = from_CSV_to_ConvertCoordinates(
+            self.csv_path, 5, 6, cache_path=self.map_path)
+        assert cc.convert_coordinate(5, '2L:1..10').ranges[1].start == 12
+
+class TestPatch:
+    """ Unit tests for patch files and patch_compiled_map. """
+    def setup(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmpdir.name, 'map.csv')
+        self.map_path = os.path.join(self.tmpdir.name, 'map')
+        pd.DataFrame(
+            {
+                'v5_chr': ['2L', '2L', '2L'], 
+                'v5_start': [1, 20, 35], 
+                'v5_end': [10, 30, 45], 
+                'v6_chr': ['2L', '2R', '2R'], 
+                'v6_start': [11, 21, 25], 
+                'v6_end': [20, 31, 35], 
+                'is_inversion': ['+', '+', '-']
+            }
+        ).to_csv(self.csv_path, index=False)
+        compile_map(self.csv_path, 5, 6, self.map_path)
+
+        self.patch = MapPatch(5, 6)
+        self.patch.delete(0)
+        self.patch.replace(2, ('2L', 35, 45, '3R', 1, 11, '+'))
+        self.patch.insert(3, ('2L', 1, 10, '2L', 111, 120, '+'))
+
+    def teardown(self):
+        self.tmpdir.cleanup()
+
+    def test_read_patch(self):
+        for name in ('patch.tsv', 'patch.tsv.gz'):
+            path = os.path.join(self.tmpdir.name, name)
+            write_patch(self.patch, path)
+            patch = read_patch(path)
+            assert (patch.version1, patch.version2) == ('5', '6')
+            assert patch.deletions == ['0']
+            assert list(patch.replacements.items()) == \
+                [('2', ('2L', 35, 45, '3R', 1, 11, '+'))]
+            assert list(patch.insertions) == ['3']
+
+        with open(path[:-3], 'a') as f:
+            f.write('# comment\n\n*\t1\n')
+        assert_raises(Exception, read_patch, path[:-3])
+        assert_raises(Exception, read_patch, self.csv_path)
+
+    def test_patch_compiled_map(self):
+        patch_path = os.path.join(self.tmpdir.name, 'patch.tsv')
+        out_path = os.path.join(self.tmpdir.name, 'patched')
+        write_patch(self.patch, patch_path)
+        patch_compiled_map(self.map_path, patch_path, out_path)
+        patch_compiled_map(self.map_path, patch_path)
+
+        for path in (out_path, self.map_path):
+            header = read_compiled_header(path)
+            assert header['patches'] == [file_sha1(patch_path)]
+            assert not is_compiled_map_current(
+                path, 5, 6, file_sha1(self.csv_path))
+            cc = load_compiled_map(path)
+            assert cc.get_names().tolist() == [1, 2, 3]
+            res = cc.convert_strs(5, ['2L:1..10', '2L:36..40', '2L:21..22'])
+            assert res['ref_chromosome'].tolist() == ['2L', '3R', '2R']
+            assert res['ref_start'].tolist() == [111, 2, 22]
+
+        # The patch cannot be applied again as segment 0 is gone
+        assert_raises(Exception, patch_compiled_map, out_path, patch_path)
+
+class TestChain:
+    """ Unit tests for parse_chain and from_chain_to_ConvertCoordinates. """
+    def setup(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.chain_path = os.path.join(self.tmpdir.name, 'a.chain.gz')
+        with gzip.open(self.chain_path, 'wt') as f:
+            f.write(
+                'chain 1000 chr1 1000 + 0 100 chrA 500 + 10 105 1\n'
+                '50 10 5\n'
+                '40\n'
+                '\n'
+                'chain 500 chr2 1000 + 100 130 chrB 300 - 0 30 2\n'
+                '30\n'
+            )
+
+    def teardown(self):
+        self.tmpdir.cleanup()
+
+    def test_parse_chain(self):
+        blocks = parse_chain(self.chain_path)
+        assert blocks['t_chr'].tolist() == ['chr1', 'chr1', 'chr2']
+        assert blocks['t_start'].tolist() == [0, 60, 100]
+        assert blocks['q_start'].tolist() == [10, 65, 270]
+        assert blocks['size'].tolist() == [50, 40, 30]
+        assert blocks['chain_id'].tolist() == [1, 1, 2]
+
+    def test_from_chain_to_ConvertCoordinates(self):
+        cache_path = os.path.join(self.tmpdir.name, 'compiled')
+        for path in (None, cache_path, cache_path):
+            cc = from_chain_to_ConvertCoordinates(
+                self.chain_path, 'hg1', 'hg2', cache_path=path)
+            res = cc.convert_strs(
+                'hg1', ['chr1:1..50', 'chr1:61..62', 'chr1:50..61', 
+                        'chr2:101..101'])
+            assert res['ref_chromosome'].tolist() == \
+                ['chrA', 'chrA', -9, 'chrB']
+            assert res['ref_start'].tolist() == [11, 66, -9, 300]
+            assert res['ref_end'].tolist() == [60, 67, -9, 300]
+            assert res['is_inversion'].tolist() == [0, 0, -9, 1]
+            assert res['name'].tolist() == [0, 1, -9, 2]
+            assert cc.get_column('chain_id').tolist() == [1, 1, 2]
+
+        res = cc.convert_strs('hg2', ['chrB:271..280'])
+        assert res['ref_start'].tolist() == [121]
+        assert res['ref_end'].tolist() == [130]
+
+    def test_patch_chain_map(self):
+        # Blocks have unique names, so chain maps can be patched
+        cache_path = os.path.join(self.tmpdir.name, 'compiled')
+        patch_path = os.path.join(self.tmpdir.name, 'patch.tsv')
+        from_chain_to_ConvertCoordinates(
+            self.chain_path, 'hg1', 'hg2', cache_path=cache_path)
+        patch = MapPatch('hg1', 'hg2')
+        patch.replace(1, ['chr1', 61, 100, 'chrC', 1, 40, '+'])
+        patch.insert(3, ['chr3', 1, 10, 'chrD', 1, 10, '+'])
+        write_patch(patch, patch_path)
+        patch_compiled_map(cache_path, patch_path)
+
+        cc = load_compiled_map(cache_path)
+        assert cc.get_names().tolist() == [0, 1, 2, 3]
+        # Chain ids of new segments are unknown
+        assert cc.get_column('chain_id').tolist() == [1, -9, 2, -9]
+        res = cc.convert_strs('hg1', ['chr1:61..62', 'chr3:2..3'])
+        assert res['ref_chromosome'].tolist() == ['chrC', 'chrD']
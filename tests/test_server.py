@@ -0,0 +1,143 @@
+""" Nose tests for ConversionServer and its client. """
+import os
+import asyncio
+import tempfile
+import threading
+import pandas as pd
+from nose.tools import assert_raises
+from convert_annotation import main as main_module
+from convert_annotation.read import compile_map
+from convert_annotation.partition import partition_map
+from convert_annotation.server import ConversionServer, ConversionClient, main
+
+class TestConversionServer:
+    """ Unit tests for ConversionServer, ConversionClient and main. """
+    def setup(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.map_path = os.path.join(self.tmpdir.name, 'map.csv')
+        self.query_path = os.path.join(self.tmpdir.name, 'query.txt')
+        self.address = os.path.join(self.tmpdir.name, 'server.sock')
+
+        pd.DataFrame(
+            {
+                'v5_chr': ['2L', '2L', '2L'], 
+                'v5_start': [1, 20, 35], 
+                'v5_end': [10, 30, 45], 
+                'v6_chr': ['2L', '2R', '2R'], 
+                'v6_start': [11, 21, 25], 
+                'v6_end': [20, 31, 35], 
+                'is_inversion': ['+', '+', '-']
+            }
+        ).to_csv(self.map_path, index=False)
+        with open(self.query_path, 'w') as f:
+            f.write('itemnum: 5\n2L:1..10\n2L:36..40\n2L:23..27\n3L:100..200\n'
+                '2L:1..10\n')
+
+        self.server = ConversionServer()
+        started = threading.Event()
+        def run():
+            async def serve():
+                await self.server.start(self.address)
+                started.set()
+                await self.server._server.serve_forever()
+            try:
+                asyncio.run(serve())
+            except asyncio.CancelledError:
+                pass
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait(10)
+
+    def teardown(self):
+        with ConversionClient(self.address) as client:
+            client.request({'command': 'shutdown'})
+        self.thread.join(10)
+        self.tmpdir.cleanup()
+
+    def test_main(self):
+        expect_path = os.path.join(self.tmpdir.name, 'expect.csv')
+        out_path = os.path.join(self.tmpdir.name, 'out.csv')
+        main_module.main(self.map_path, 5, 6, self.query_path, expect_path)
+        main(
+            self.map_path, 5, 6, self.query_path, out_path, 
+            address=self.address, chunksize=2)
+
+        with open(expect_path) as f1, open(out_path) as f2:
+            assert f1.read() == f2.read()
+        assert len(self.server.maps) == 1
+
+    def test_client(self):
+        with ConversionClient(self.address) as client:
+            assert client.request({'command': 'ping'})['status'] == 'ok'
+            res = client.convert_strs(self.map_path, 6, 5, ['2R:25..30'])
+            assert res['conversion_code'].tolist() == [8]
+            assert_raises(
+                Exception, client.convert_strs, self.map_path, 7, 5, 
+                ['2R:25..30'])
+
+    def test_maps(self):
+        compiled_path = os.path.join(self.tmpdir.name, 'map56')
+        map_path2 = os.path.join(self.tmpdir.name, 'map2.csv')
+        compile_map(self.map_path, 5, 6, compiled_path)
+        pd.DataFrame(
+            {
+                'v6_chr': ['2L', '2R'], 'v6_start': [1, 1], 
+                'v6_end': [100, 100], 'v7_chr': ['2L', '3R'], 
+                'v7_start': [101, 1], 'v7_end': [200, 100], 
+                'is_inversion': ['+', '+']
+            }
+        ).to_csv(map_path2, index=False)
+
+        with ConversionClient(self.address) as client:
+            res = client.convert_strs(compiled_path, 5, 6, ['2L:1..10'])
+            assert res['ref_start'].tolist() == [11]
+            res = client.convert_strs(
+                [self.map_path, map_path2], 5, 7, ['2L:1..10'], via=[6])
+            assert res['ref_start'].tolist() == [111]
+
+            # Clients cannot choose where the server writes files
+            assert_raises(Exception, client.request, {
+                'map': self.map_path, 'query_version': 5, 'ref_version': 6, 
+                'querys': [], 'map_cache_path': compiled_path})
+            assert_raises(Exception, client.request, [1])
+        assert_raises(
+            Exception, main, self.map_path, 5, 6, self.query_path, 
+            self.query_path, address=self.address, workers=2)
+
+        # A map requested by many threads at once is loaded once
+        server = ConversionServer()
+        loaded = []
+        threads = [
+            threading.Thread(target=lambda: loaded.append(
+                server.load(self.map_path, 5, 6)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len({id(cc) for cc in loaded}) == 1
+
+    def test_concurrent_requests(self):
+        # Requests for one partitioned map from many threads are converted 
+        # one at a time
+        partitioned_path = os.path.join(self.tmpdir.name, 'map56_partitioned')
+        partition_map(self.map_path, 6, 5, partitioned_path)
+        server = ConversionServer(memory_budget=1)
+        request = {
+            'map': partitioned_path, 'query_version': 6, 'ref_version': 5, 
+            'querys': ['2L:11..20', '2R:21..22', '2L:12..13', '2R:34..35']}
+        expect = server.handle_request(request)
+        responses = []
+        def run():
+            for _ in range(20):
+                responses.append(server.handle_request(request))
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert expect['columns']['ref_start'] == [1, 20, 2, 35]
+        assert all(response == expect for response in responses)
+        assert len(responses) == 160